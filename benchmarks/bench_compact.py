@@ -0,0 +1,80 @@
+"""Benchmark --compact.
+
+Generates a document for a repository of many small Python and JavaScript
+files, without and with compaction, and reports the time and the savings.
+
+Usage:
+    python benchmarks/bench_compact.py [--files 50000] [--cpu-workers 0]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from llmd.generator import MarkdownGenerator
+
+PYTHON = '''# Copyright (c) Example Corp.
+# Licensed under the Apache License, Version 2.0.
+"""Handlers for module {i}."""
+
+
+def handler_{i}(request):
+    """Handle a request.
+
+    Returns the value plus an offset.
+    """
+    # Offset is the module number
+    return request.value + {i}  # see docs
+'''
+
+JAVASCRIPT = '''/*
+ * Copyright (c) Example Corp.
+ * Licensed under the Apache License, Version 2.0.
+ */
+
+// Handler for module {i}
+export function handler{i}(request) {{
+    return request.value + {i}; // see docs
+}}
+'''
+
+
+def make_repo(root: Path, count: int) -> list:
+    """Create count small modules, alternating Python and JavaScript."""
+    files = []
+    for i in range(count):
+        template, suffix = (PYTHON, 'py') if i % 2 else (JAVASCRIPT, 'js')
+        path = root / "src" / f"pkg_{i % 100:02d}" / f"module_{i:05d}.{suffix}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(template.format(i=i) * 4)
+        files.append(path)
+    return sorted(files)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=50000)
+    parser.add_argument('--cpu-workers', type=int, default=0)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix='llmd_bench_'))
+    try:
+        files = make_repo(root, args.files)
+        output = root / "out" / "llm-context.md"
+        print(f"{args.files} files, {args.cpu_workers} CPU workers")
+
+        for compact in (False, True):
+            generator = MarkdownGenerator({'compact': compact, 'cpu_workers': args.cpu_workers})
+            start = time.perf_counter()
+            size = generator.generate_to_file(files, root, output)
+            elapsed = time.perf_counter() - start
+            label = "compact" if compact else "plain"
+            print(f"{label:<8} {elapsed:8.3f}s  {size:,} bytes  saved {generator.compact_saved_bytes:,} bytes")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
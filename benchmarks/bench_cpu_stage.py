@@ -0,0 +1,59 @@
+"""Benchmark the process-pool CPU stage.
+
+Generates a token-counted document for a repository of many small files,
+with transforms on the reader threads and then on 1, 2, 4, ... worker
+processes (up to the number of usable CPUs).
+
+Usage:
+    python benchmarks/bench_cpu_stage.py [--files 20000] [--tokenizer heuristic]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from llmd.generator import MarkdownGenerator
+from llmd.scheduler import available_cpus
+
+
+def make_repo(root: Path, count: int) -> list:
+    """Create count Python modules of a few KB each."""
+    files = []
+    for i in range(count):
+        path = root / "src" / f"pkg_{i % 50:02d}" / f"module_{i:05d}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"def handler_{i}(request, *args):\n    return request.value + {i}  # ok\n" * 60)
+        files.append(path)
+    return sorted(files)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--tokenizer', default='heuristic')
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix='llmd_bench_'))
+    try:
+        files = make_repo(root, args.files)
+        output = root / "out" / "llm-context.md"
+        print(f"{args.files} files, tokenizer {args.tokenizer}, {available_cpus()} usable CPUs")
+
+        counts = [0]
+        while counts[-1] < available_cpus():
+            counts.append(max(1, counts[-1] * 2))
+        for cpu_workers in counts:
+            generator = MarkdownGenerator({'tokenizer': args.tokenizer, 'cpu_workers': cpu_workers})
+            start = time.perf_counter()
+            generator.generate_to_file(files, root, output)
+            elapsed = time.perf_counter() - start
+            label = "inline" if cpu_workers == 0 else f"{cpu_workers} procs"
+            print(f"{label:<10} {elapsed:8.3f}s  {generator.total_tokens:,} tokens")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
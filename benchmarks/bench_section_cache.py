@@ -0,0 +1,57 @@
+"""Benchmark regeneration with the on-disk section cache.
+
+Runs the generator on a repository of many small files three times:
+
+- uncached: no cache, every file read and rendered
+- cold:     cache enabled but empty, so sections are also stored
+- warm:     nothing changed, every section comes from the cache
+
+Usage:
+    python benchmarks/bench_section_cache.py [--files 20000] [--tokenizer heuristic]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from llmd.generator import MarkdownGenerator
+
+
+def make_repo(root: Path, count: int) -> list:
+    """Create count small Python modules spread over a few directories."""
+    files = []
+    for i in range(count):
+        path = root / "src" / f"pkg_{i % 50:02d}" / f"module_{i:05d}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"def handler_{i}(request):\n    return request.value + {i}\n" * 20)
+        files.append(path)
+    return sorted(files)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--tokenizer', default=None)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix='llmd_bench_'))
+    try:
+        files = make_repo(root, args.files)
+        output = root / "out" / "llm-context.md"
+        options = {'tokenizer': args.tokenizer} if args.tokenizer else {}
+        print(f"{args.files} files")
+
+        for label, extra in [("uncached", {}), ("cold", {'cache': True}), ("warm", {'cache': True})]:
+            generator = MarkdownGenerator({**options, **extra})
+            start = time.perf_counter()
+            generator.generate_to_file(files, root, output)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<10} {elapsed:8.3f}s  hits {generator.cache_hits:>7}  misses {generator.cache_misses:>7}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
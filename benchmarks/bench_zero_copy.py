@@ -0,0 +1,87 @@
+"""Benchmark the zero-copy output path on multi-MB files.
+
+Compares three ways of producing the same document:
+
+- legacy:    build the whole document as a str and write it with write_text
+- in-memory: stream sections, but read every body into memory
+- zero-copy: stream sections and splice large bodies from disk
+
+Usage:
+    python benchmarks/bench_zero_copy.py [--files 16] [--size-mb 8]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from llmd.generator import MarkdownGenerator
+
+
+def make_repo(root: Path, count: int, size_mb: int) -> list:
+    """Create count files of roughly size_mb megabytes of UTF-8 text."""
+    line = "def handler(request):  # naïve implementation → fine for benchmarks\n".encode('utf-8')
+    body = line * (size_mb * 1024 * 1024 // len(line))
+    files = []
+    for i in range(count):
+        path = root / "src" / f"module_{i:03d}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        files.append(path)
+    return files
+
+
+def run(label: str, func) -> None:
+    """Time func and report its peak traced Python allocation."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = written / (1024 * 1024)
+    print(f"{label:<10} {elapsed:8.3f}s  {mb / elapsed:9.1f} MB/s  peak alloc {peak / (1024 * 1024):8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--size-mb', type=int, default=8)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix='llmd_bench_'))
+    try:
+        files = make_repo(root, args.files, args.size_mb)
+        output = root / "out" / "llm-context.md"
+        print(f"{args.files} files x {args.size_mb} MB")
+
+        def legacy():
+            generator = MarkdownGenerator()
+            generator.max_file_size = float('inf')
+            content = generator.generate(files, root)
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(content, encoding='utf-8')
+            return output.stat().st_size
+
+        def in_memory():
+            generator = MarkdownGenerator()
+            generator.max_file_size = float('inf')
+            generator.zero_copy_threshold = float('inf')
+            return generator.generate_to_file(files, root, output)
+
+        def zero_copy():
+            generator = MarkdownGenerator()
+            generator.max_file_size = float('inf')
+            return generator.generate_to_file(files, root, output)
+
+        run("legacy", legacy)
+        run("in-memory", in_memory)
+        run("zero-copy", zero_copy)
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+import math
+import os
+import pathspec
+
+from .tokenizer import Tokenizer
+
+# Average bytes per token for source code, used when no count is known
+BYTES_PER_TOKEN = 4
+
+# File names treated as entry points (compared case-insensitively)
+ENTRY_POINT_NAMES = {
+    '__main__.py', 'main.py', 'app.py', 'cli.py', 'manage.py', 'setup.py',
+    'pyproject.toml', 'package.json', 'cargo.toml', 'go.mod',
+    'index.js', 'index.ts', 'main.js', 'main.ts', 'main.go', 'main.rs', 'lib.rs',
+    'makefile', 'dockerfile',
+}
+
+# Score components; an INCLUDE hit outranks everything else
+INCLUDE_SCORE = 1000.0
+README_SCORE = 100.0
+ENTRY_POINT_SCORE = 50.0
+SMALL_FILE_SCORE = 20.0
+RECENT_SCORE = 20.0
+
+
+@dataclass
+class BudgetCandidate:
+    """A file competing for the token budget."""
+    rel_path: str
+    size: int
+    mtime: float
+    # Known or estimated tokens for the rendered section
+    tokens: int
+    # Whether tokens is an exact (cached) count rather than an estimate
+    exact: bool = False
+    score: float = 0.0
+
+
+@dataclass
+class BudgetPlan:
+    """Result of fitting candidates into a token budget."""
+    max_tokens: int
+    # Candidate indices, in their original order
+    selected: List[int]
+    omitted: List[int]
+    # Sum of candidate tokens over the selected files
+    planned_tokens: int
+    # Tokens set aside for the header and TOC
+    reserved: int = 0
+
+
+def estimate_tokens(size: int, bytes_per_token: float = BYTES_PER_TOKEN) -> int:
+    """Estimate the tokens in a file body from its size in bytes."""
+    return math.ceil(size / bytes_per_token)
+
+
+def calibrate_bytes_per_token(samples: Iterable[bytes], tokenizer: Tokenizer) -> float:
+    """Bytes per token the tokenizer measures on some sample file contents.
+
+    Falls back to BYTES_PER_TOKEN when the samples are empty. The ratio is
+    never above the default, so a sample of unusually dense files cannot
+    make the estimates more optimistic than they already are.
+    """
+    size = tokens = 0
+    for sample in samples:
+        size += len(sample)
+        tokens += tokenizer.count(sample)
+    if not tokens:
+        return BYTES_PER_TOKEN
+    return min(BYTES_PER_TOKEN, max(1.0, size / tokens))
+
+
+def score_candidates(candidates: Sequence[BudgetCandidate], include_patterns: Optional[List[str]] = None) -> None:
+    """Assign each candidate a priority score (higher is kept first).
+
+    Files matching an INCLUDE pattern come first, then READMEs (shallowest
+    first) and entry points. Among the rest, smaller and more recently
+    modified files win. Recency is scored by rank, so one very old or
+    very new file does not flatten the scale for everyone else.
+    """
+    spec = pathspec.PathSpec.from_lines('gitwildmatch', include_patterns) if include_patterns else None
+
+    # Files with the same mtime share a rank
+    mtimes = sorted({candidate.mtime for candidate in candidates})
+    ranks = {mtime: rank / max(1, len(mtimes) - 1) for rank, mtime in enumerate(mtimes)}
+    recency = [ranks[candidate.mtime] for candidate in candidates]
+
+    for candidate, recent in zip(candidates, recency):
+        rel_path = candidate.rel_path.replace(os.sep, '/')
+        name = rel_path.rsplit('/', 1)[-1].lower()
+        depth = rel_path.count('/')
+
+        score = 0.0
+        if spec is not None and spec.match_file(rel_path):
+            score += INCLUDE_SCORE
+        if name.startswith('readme'):
+            score += README_SCORE - depth
+        elif name in ENTRY_POINT_NAMES:
+            score += ENTRY_POINT_SCORE - depth
+        # Full score for empty files, half at 1k tokens, falling off logarithmically
+        score += SMALL_FILE_SCORE / (1 + math.log2(1 + candidate.tokens / 1000))
+        score += RECENT_SCORE * recent
+        candidate.score = score
+
+
+def plan_budget(candidates: Sequence[BudgetCandidate], max_tokens: int, reserved: int = 0) -> BudgetPlan:
+    """Greedily keep the highest-scoring files that still fit.
+
+    A file that does not fit is skipped rather than ending the selection,
+    so smaller lower-priority files can still use the remaining budget.
+    ``reserved`` covers the header and TOC.
+    """
+    remaining = max_tokens - reserved
+    order = sorted(range(len(candidates)), key=lambda i: (-candidates[i].score, candidates[i].rel_path))
+
+    keep = set()
+    for index in order:
+        tokens = candidates[index].tokens
+        if tokens <= remaining:
+            keep.add(index)
+            remaining -= tokens
+
+    selected = [i for i in range(len(candidates)) if i in keep]
+    omitted = [i for i in range(len(candidates)) if i not in keep]
+    planned = sum(candidates[i].tokens for i in selected)
+    return BudgetPlan(max_tokens, selected, omitted, planned, reserved)
+
+
+class BudgetEnforcer:
+    """Keep the selected files within the budget as their exact counts come in.
+
+    The plan is made from estimates, so files are admitted one at a time
+    with their rendered token count. While the exact tokens admitted so far
+    plus the estimates of the files still to come exceed the budget, the
+    lowest-priority file among the current and the pending ones is dropped.
+    Admitted files are never dropped, so the admitted total stays within
+    the budget whatever the estimates were.
+    """
+
+    def __init__(self, candidates: Sequence[BudgetCandidate], plan: BudgetPlan):
+        self.candidates = candidates
+        self.available = plan.max_tokens - plan.reserved
+        self.pending: Set[int] = set(plan.selected)
+        self.pending_tokens = sum(candidates[i].tokens for i in plan.selected)
+        self.used = 0
+        # Candidate indices dropped, in the order they were dropped
+        self.dropped: List[int] = []
+
+    def _order(self, index: int) -> Tuple[float, str]:
+        """Sort key of plan_budget: files sorting last are dropped first."""
+        candidate = self.candidates[index]
+        return -candidate.score, candidate.rel_path
+
+    def admit(self, index: int, tokens: int) -> bool:
+        """Account for a selected file's exact tokens; False if it must be left out.
+
+        Files dropped earlier to make room are also reported as False.
+        """
+        if index not in self.pending:
+            return False
+        self.pending.discard(index)
+        self.pending_tokens -= self.candidates[index].tokens
+        while self.used + tokens + self.pending_tokens > self.available:
+            lowest = max(self.pending, key=self._order, default=None)
+            if lowest is None or self._order(index) > self._order(lowest):
+                self.dropped.append(index)
+                return False
+            self.pending.discard(lowest)
+            self.pending_tokens -= self.candidates[lowest].tokens
+            self.dropped.append(lowest)
+        self.used += tokens
+        return True
+
+
+def toc_entry_tokens(rel_path: Path) -> int:
+    """Rough tokens for one TOC line: number, link text and anchor."""
+    return 6 + estimate_tokens(2 * len(str(rel_path)))
@@ -0,0 +1,261 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import mmap
+import os
+import threading
+from .writer import AtomicFileWriter
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Bump when the on-disk layout changes
+CACHE_VERSION = 1
+
+# Default cache directory, relative to the repository root
+DEFAULT_CACHE_DIR = '.llmd-cache'
+
+# Entries not used for this many runs are dropped when the index is saved
+MAX_IDLE_RUNS = 20
+
+# Index entry fields, stored as a JSON list to keep the index compact
+_SIZE, _MTIME_NS, _INODE, _OFFSET, _LENGTH, _KIND, _CONTENT_HASH, _SOURCE_HASH, _TOKENS, _LAST_RUN = range(10)
+
+
+@dataclass
+class CachedSection:
+    """A rendered section read back from the cache."""
+    # 'bytes': blob is the whole section; 'span': blob is the heading and the
+    # body is copied from the source file as before
+    kind: str
+    blob: bytes
+    content_hash: Optional[bytes]
+    source_hash: Optional[bytes]
+    tokens: Dict[str, int]
+
+
+class SectionCache:
+    """On-disk cache of rendered file sections and their token counts.
+
+    Entries are keyed by relative path and validated against the file's
+    size, mtime_ns and inode, so a warm run costs one stat per file plus a
+    lookup. Section bytes live in a single append-only pack file that is
+    memory-mapped for reading; the index is a JSON file rewritten atomically
+    at the end of each run. The pack is compacted once more than half of
+    it is unreachable.
+
+    Runs may share a cache directory. Appends, saves and loads hold a lock
+    file (with flock, where available), and each append records where the
+    pack really ends rather than where this run last left it. A run whose
+    pack was compacted away by another run does not save its index, since
+    its offsets refer to the old pack.
+
+    ``render_key`` describes the settings that affect rendering; a cache
+    written with a different key is discarded.
+    """
+
+    def __init__(self, directory: Path, render_key: str):
+        self.directory = directory
+        self.render_key = render_key
+        self.index_path = directory / 'index.json'
+        self.pack_path = directory / 'sections.pack'
+        self.lock_path = directory / 'lock'
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Any]] = {}
+        self._run = 1
+        self._pack_size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._append: Optional[BinaryIO] = None
+        self._lock_file: Optional[BinaryIO] = None
+        # (st_dev, st_ino) of the pack the entries' offsets refer to
+        self._pack_id: Optional[Tuple[int, int]] = None
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        """Read the index and map the pack; start empty if either is unusable."""
+        if not self.directory.is_dir():
+            return
+        # A shared lock, so another run cannot compact the pack between
+        # reading the index and mapping the pack
+        with self._locked(shared=True):
+            try:
+                index = json.loads(self.index_path.read_text(encoding='utf-8'))
+                if index.get('version') != CACHE_VERSION or index.get('render_key') != self.render_key:
+                    return
+                entries = index['entries']
+                run = int(index['run']) + 1
+                pack = open(self.pack_path, 'rb')
+            except (OSError, ValueError, KeyError, TypeError):
+                return
+            with pack:
+                st = os.fstat(pack.fileno())
+                if st.st_size:
+                    self._map = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+        # Entries pointing past the end of the pack are unusable
+        self._entries = {rel: entry for rel, entry in entries.items()
+                         if isinstance(entry, list) and len(entry) == 10
+                         and entry[_OFFSET] + entry[_LENGTH] <= st.st_size}
+        self._run = run
+        self._pack_size = st.st_size
+        self._pack_id = (st.st_dev, st.st_ino)
+
+    @contextmanager
+    def _locked(self, shared: bool = False) -> Iterator[None]:
+        """Hold the cache directory's lock file (a no-op without flock)."""
+        try:
+            f = open(self.lock_path, 'ab') if fcntl is not None else None
+        except OSError:
+            # A read-only cache directory can still be read without the lock
+            f = None
+        if f is None:
+            yield
+            return
+        with f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def get(self, rel_path: str, st: os.stat_result,
+            accept: Optional[Callable[[CachedSection], bool]] = None) -> Optional[CachedSection]:
+        """Return the cached section if the file is unchanged since it was stored.
+
+        ``accept`` can reject an entry that is current but unusable (for
+        example, missing a token count); rejections count as misses.
+        """
+        entry = self._entries.get(rel_path)
+        cached = None
+        if (entry is not None and self._map is not None and entry[_SIZE] == st.st_size
+                and entry[_MTIME_NS] == st.st_mtime_ns and entry[_INODE] == st.st_ino
+                and entry[_OFFSET] + entry[_LENGTH] <= len(self._map)):
+            offset = entry[_OFFSET]
+            cached = CachedSection(
+                entry[_KIND],
+                self._map[offset:offset + entry[_LENGTH]],
+                bytes.fromhex(entry[_CONTENT_HASH]) if entry[_CONTENT_HASH] else None,
+                bytes.fromhex(entry[_SOURCE_HASH]) if entry[_SOURCE_HASH] else None,
+                dict(entry[_TOKENS]),
+            )
+            if accept is not None and not accept(cached):
+                cached = None
+
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if entry[_LAST_RUN] != self._run:
+                entry[_LAST_RUN] = self._run
+                self._dirty = True
+        return cached
+
+    def peek_tokens(self, rel_path: str, st: os.stat_result, tokenizer_name: str) -> Optional[int]:
+        """Cached token count for an unchanged file, without counting a hit."""
+        entry = self._entries.get(rel_path)
+        if (entry is None or entry[_SIZE] != st.st_size or entry[_MTIME_NS] != st.st_mtime_ns
+                or entry[_INODE] != st.st_ino):
+            return None
+        return entry[_TOKENS].get(tokenizer_name)
+
+    def put(self, rel_path: str, st: os.stat_result, kind: str, blob: bytes, content_hash: Optional[bytes],
+            source_hash: Optional[bytes], tokens: Dict[str, int]) -> None:
+        """Store a freshly rendered section (safe to call from worker threads)."""
+        with self._lock:
+            if self._append is None:
+                self._open_append()
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                # Other runs may have appended since this run last did
+                offset = self._append.seek(0, os.SEEK_END)
+                self._append.write(blob)
+                self._append.flush()
+            finally:
+                if self._lock_file is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._pack_size = offset + len(blob)
+            self._entries[rel_path] = [
+                st.st_size, st.st_mtime_ns, st.st_ino, offset, len(blob), kind,
+                content_hash.hex() if content_hash else None,
+                source_hash.hex() if source_hash else None,
+                dict(tokens), self._run,
+            ]
+            self._dirty = True
+
+    def _open_append(self) -> None:
+        """Open the pack and the lock file for appending."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._write_gitignore()
+        if fcntl is not None:
+            self._lock_file = open(self.lock_path, 'ab')
+        self._append = open(self.pack_path, 'ab')
+        st = os.fstat(self._append.fileno())
+        if self._pack_id is not None and self._pack_id != (st.st_dev, st.st_ino):
+            # Another run compacted the pack since the index was loaded
+            self._entries = {}
+        self._pack_id = (st.st_dev, st.st_ino)
+
+    def save(self) -> None:
+        """Write the index, pruning idle entries and compacting the pack if needed."""
+        with self._lock:
+            if self._append is not None:
+                self._append.close()
+                self._append = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._locked():
+                try:
+                    st = self.pack_path.stat()
+                except OSError:
+                    return
+                if self._pack_id != (st.st_dev, st.st_ino):
+                    # Another run compacted the pack; these offsets refer to the old one
+                    return
+                self._pack_size = st.st_size
+                self._entries = {rel: entry for rel, entry in self._entries.items()
+                                 if self._run - entry[_LAST_RUN] < MAX_IDLE_RUNS}
+                live = sum(entry[_LENGTH] for entry in self._entries.values())
+                if self._pack_size > 2 * live:
+                    self._compact()
+                index = {'version': CACHE_VERSION, 'render_key': self.render_key, 'run': self._run,
+                         'entries': self._entries}
+                with AtomicFileWriter(self.index_path) as writer:
+                    writer.write_text(json.dumps(index, separators=(',', ':')))
+
+    def close(self) -> None:
+        """Release the pack mapping."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _compact(self) -> None:
+        """Rewrite the pack with only the entries still in the index."""
+        ordered = sorted(self._entries.values(), key=lambda entry: entry[_OFFSET])
+        offset = 0
+        with open(self.pack_path, 'rb') as src, AtomicFileWriter(self.pack_path) as writer:
+            for entry in ordered:
+                src.seek(entry[_OFFSET])
+                writer.write(src.read(entry[_LENGTH]))
+                entry[_OFFSET] = offset
+                offset += entry[_LENGTH]
+        self._pack_size = offset
+        st = self.pack_path.stat()
+        self._pack_id = (st.st_dev, st.st_ino)
+        # The old mapping still refers to the replaced file
+        self.close()
+
+    def _write_gitignore(self) -> None:
+        """Keep the cache out of version control."""
+        gitignore = self.directory / '.gitignore'
+        if not gitignore.exists():
+            gitignore.write_text('*\n')
@@ -12,6 +12,11 @@ from importlib.metadata import version, PackageNotFoundError
 from .scanner import RepoScanner
 from .parser import GitignoreParser, LlmMdParser, PatternSequence
 from .generator import MarkdownGenerator
+from .compression import COMPRESSIONS, COMPRESSION_SUFFIXES, compression_for_path
+from .formats import FORMAT_SUFFIXES, OUTPUT_FORMATS, format_for_path
+from .generated import GENERATED_POLICIES
+from .scheduler import READ_ORDERS
+from .vcs import changed_files, directory_siblings
 
 # Global variable for test support - this is a hack but necessary for Click testing
 _test_args_override = None
@@ -309,12 +314,118 @@ class PathCommand(click.Command):
 @click.option('-v', '--verbose', is_flag=True, help='Enable verbose output')
 @click.option('--dry-run', is_flag=True, help='Show which files would be included without generating output')
 @click.option('--profile', is_flag=True, help='Enable performance profiling')
+# Generation tuning options
+@click.option('--read-order', type=click.Choice(READ_ORDERS, case_sensitive=False), default=None,
+              help='Order in which files are read: largest first (size), on-disk locality (inode, extent), '
+                   'path order, or auto (default). Output order is unchanged.')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None,
+              help='Number of reader threads (default: based on usable CPUs, including cgroup quotas)')
+@click.option('--cpu-workers', default=None, metavar='N|auto',
+              help='Run CPU-heavy steps (validation, hashing, token counting) on N worker processes; '
+                   "'auto' uses one per usable CPU, 0 runs them on the reader threads (default)")
+@click.option('--auto-tune/--no-auto-tune', default=None,
+              help='Adjust read concurrency during the run based on measured throughput')
+@click.option('--tokenizer', 'tokenizer', default=None, metavar='SPEC',
+              help="Count tokens per file: 'heuristic' for a fast estimate, or the path to a "
+                   "BPE vocabulary file (tiktoken format) for exact counts")
+@click.option('--max-tokens', type=click.IntRange(min=1), default=None, metavar='N',
+              help='Keep the highest-priority files that fit in N tokens; the rest are listed as omitted '
+                   '(INCLUDE matches, READMEs and entry points first, then small and recently changed files)')
+@click.option('--shard-size', default=None, metavar='SIZE',
+              help="Split the output into parts of at most SIZE (e.g. 2MB, 500KB or '100k tokens'); "
+                   "the output path becomes an index of the parts")
+@click.option('--cache/--no-cache', 'use_cache', default=None,
+              help='Reuse rendered sections of unchanged files from .llmd-cache/ in the repository')
+@click.option('--cache-verify', is_flag=True, default=None,
+              help='With --cache, confirm cache hits by hashing file contents instead of trusting stat data')
+@click.option('--incremental', is_flag=True, default=None,
+              help='Copy sections of unchanged files from the previous output instead of re-reading them; '
+                   'the result is identical to a full regeneration')
+@click.option('--dedupe', is_flag=True, default=None,
+              help='Emit files with identical contents once; later copies become "identical to" stubs')
+@click.option('--near-duplicates', is_flag=True, default=None,
+              help='Emit files similar to an earlier file as a unified diff against it')
+@click.option('--similarity', type=click.FloatRange(0, 1, min_open=True), default=None,
+              help='With --near-duplicates, the similarity (0-1) from which files are diffed (default: 0.8)')
+@click.option('--compact', is_flag=True, default=None,
+              help='Minify file bodies: strip comments, docstrings and license headers, collapse blank lines')
+@click.option('--outline', is_flag=True, default=None,
+              help='Render Python, JavaScript, TypeScript, Go and Rust files as outlines: imports and '
+                   'signatures without bodies')
+@click.option('--outline-pattern', 'outline_patterns', multiple=True, metavar='PATTERN',
+              help='Render only files matching PATTERN as outlines (can be used multiple times; implies --outline)')
+@click.option('--outline-docstrings/--no-outline-docstrings', default=None,
+              help='Keep the first line of docstrings in Python outlines (default: keep)')
+@click.option('--max-file-size', 'max_file_sizes', multiple=True, metavar='SIZE|PATTERN=SIZE',
+              help='Size above which files count as large (default: 10MB); PATTERN=SIZE sets it for matching '
+                   'files (can be used multiple times)')
+@click.option('--large-files', type=click.Choice(['omit', 'excerpt'], case_sensitive=False), default=None,
+              help='What to do with large files: omit them, or show their first and last lines (default: omit)')
+@click.option('--excerpt-head', default=None, metavar='N',
+              help="Start of large files to show with --large-files excerpt, in lines or bytes "
+                   "(e.g. 200, '200 lines' or 64KB; default: 200 lines)")
+@click.option('--excerpt-tail', default=None, metavar='N',
+              help='End of large files to show with --large-files excerpt (default: 50 lines)')
+@click.option('--excerpt-line-numbers/--no-excerpt-line-numbers', default=None,
+              help='Number the lines of large-file excerpts (default: on)')
+@click.option('--format', 'output_format', type=click.Choice(list(OUTPUT_FORMATS), case_sensitive=False),
+              default=None,
+              help='Output format: markdown sections, or one record per file as JSON lines or XML documents '
+                   '(default: chosen by the output suffix, .jsonl or .xml; otherwise markdown)')
+@click.option('--index', 'write_index', is_flag=True, default=None,
+              help='Also write llm-context.index.json with the byte offset, length, line range, tokens and '
+                   'content hash of every section')
+@click.option('--compress', type=click.Choice(list(COMPRESSIONS), case_sensitive=False), default=None,
+              help='Compress the output as it is written, adding the .gz, .xz or .zst suffix if missing '
+                   '(default: chosen by the output suffix)')
+@click.option('--generated', type=click.Choice(list(GENERATED_POLICIES), case_sensitive=False), default=None,
+              help='What to do with generated and vendored files, found through .gitattributes '
+                   '(linguist-generated, linguist-vendored, -diff) or markers such as "DO NOT EDIT" '
+                   'near the top: include them, stub them or drop them (default: include)')
+@click.option('--since', 'since', metavar='REF', default=None,
+              help='Only include files changed since REF (committed since its merge base with HEAD, uncommitted '
+                   'or untracked), as reported by git; the repository is not walked')
+@click.option('--changed', is_flag=True, default=False,
+              help='Only include files with uncommitted changes and untracked files (same as --since HEAD)')
+@click.option('--siblings', is_flag=True, default=False,
+              help='With --since or --changed, also include the other files in the directories of changed files')
+@click.option('--stable', is_flag=True, default=None,
+              help='Keep the start of the output identical across runs for prompt caching: files that changed '
+                   'least recently (by git history, else mtime) come first, and the generation time, totals and '
+                   'TOC move to the end')
+@click.option('--repo-map', 'repo_map', is_flag=True, default=None,
+              help='Add a map of the repository before the TOC: directories with file counts, sizes and token '
+                   'estimates, including directories whose files are excluded')
+@click.option('--repo-map-depth', type=click.IntRange(min=1), default=None,
+              help='Directory levels shown in the repository map (default: 3)')
+@click.option('--repo-map-collapse', type=click.IntRange(min=1), default=None,
+              help='Subdirectories shown per directory in the repository map; the rest share a summary line '
+                   '(default: 10)')
+@click.option('--redact', is_flag=True, default=None,
+              help='Replace secrets in file bodies with [REDACTED:kind]: known key and token formats, quoted '
+                   'password assignments and long random-looking strings')
+@click.option('--redact-pattern', 'redact_patterns', multiple=True, metavar='NAME=REGEX',
+              help='Also redact matches of REGEX, reported as NAME (can be used multiple times; implies --redact)')
+@click.option('--redact-entropy', type=click.FloatRange(0, min_open=True), default=None, metavar='BITS',
+              help='With --redact, the entropy in bits per character from which long random-looking strings '
+                   'are redacted (default: 4.5)')
 def main(ctx, output: Path, github_url: Optional[str], whitelist_patterns: tuple, blacklist_patterns: tuple, 
          include: tuple, exclude: tuple,
          include_gitignore: Optional[bool], include_gitignore_alias: bool,
          include_hidden: Optional[bool], include_hidden_alias: bool,
          include_binary: Optional[bool], include_binary_alias: bool,
-         quiet: bool, verbose: bool, dry_run: bool, profile: bool):
+         quiet: bool, verbose: bool, dry_run: bool, profile: bool,
+         read_order: Optional[str], jobs: Optional[int], cpu_workers: Optional[str], auto_tune: Optional[bool],
+         tokenizer: Optional[str], max_tokens: Optional[int], shard_size: Optional[str],
+         use_cache: Optional[bool], cache_verify: Optional[bool], incremental: Optional[bool],
+         dedupe: Optional[bool], near_duplicates: Optional[bool], similarity: Optional[float],
+         compact: Optional[bool], outline: Optional[bool], outline_patterns: tuple,
+         outline_docstrings: Optional[bool], max_file_sizes: tuple, large_files: Optional[str],
+         excerpt_head: Optional[str], excerpt_tail: Optional[str], excerpt_line_numbers: Optional[bool],
+         output_format: Optional[str], write_index: Optional[bool], compress: Optional[str],
+         generated: Optional[str], since: Optional[str], changed: bool, siblings: bool, stable: Optional[bool],
+         repo_map: Optional[bool], repo_map_depth: Optional[int], repo_map_collapse: Optional[int],
+         redact: Optional[bool], redact_patterns: tuple, redact_entropy: Optional[float]):
     """Generate LLM context from a repository.
     
     PATH: Repository path (default: current directory)
@@ -476,10 +587,31 @@ def main(ctx, output: Path, github_url: Optional[str], whitelist_patterns: tuple
     
         # Create scanner with filtering rules
         # In dry-run mode or quiet mode, suppress verbose output from scanner
-        scanner = RepoScanner(repo_path, gitignore_parser, llm_parser, verbose=verbose and not dry_run and not quiet)
-    
-        # Scan files
-        files = scanner.scan()
+        try:
+            scanner = RepoScanner(repo_path, gitignore_parser, llm_parser, verbose=verbose and not dry_run and not quiet,
+                                  generated=generated.lower() if generated is not None else None, use_cache=use_cache,
+                                  repo_map=repo_map)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+    
+        # Scan files: all of them, or only those git reports as changed
+        if since is not None and changed:
+            raise click.UsageError("Options --since and --changed are mutually exclusive.")
+        if siblings and since is None and not changed:
+            raise click.UsageError("Option --siblings requires --since or --changed.")
+        if since is not None or changed:
+            try:
+                changed_paths = changed_files(repo_path, since if since is not None else 'HEAD',
+                                              option='since' if since is not None else 'changed')
+            except ValueError as e:
+                raise click.UsageError(str(e))
+            if siblings:
+                changed_paths = directory_siblings(repo_path, changed_paths)
+            if verbose and not quiet:
+                click.echo(f"Changed files{' and siblings' if siblings else ''}: {len(changed_paths)}")
+            files = scanner.scan([repo_path / rel_path for rel_path in changed_paths])
+        else:
+            files = scanner.scan()
     
         if not files:
             click.echo("No files found matching the criteria.", err=True)
@@ -521,7 +653,9 @@ def main(ctx, output: Path, github_url: Optional[str], whitelist_patterns: tuple
         
             click.echo(f"\nFiles to include ({len(files)} total):")
             for file in files:
-                click.echo(f"  +{file.relative_to(repo_path)}")
+                rel_path = str(file.relative_to(repo_path))
+                note = f" (generated: {scanner.generated[rel_path]})" if rel_path in scanner.generated else ""
+                click.echo(f"  +{rel_path}{note}")
         
             return
     
@@ -551,19 +685,171 @@ def main(ctx, output: Path, github_url: Optional[str], whitelist_patterns: tuple
             else:
                 click.echo(f"CLI mode active, using default output path: {final_output}")
         
-        # Generate markdown
-        generator = MarkdownGenerator()
-        content = generator.generate(files, repo_path)
+        # Generator settings: llm.md OPTIONS, overridden by explicit CLI flags
+        generator_options = llm_parser.get_options()
+        if output_format is not None:
+            output_format = output_format.lower()
+            generator_options['format'] = output_format
+            if final_output == output and not cli_output_explicit:
+                # The default output path gets the format's suffix
+                final_output = final_output.with_suffix(FORMAT_SUFFIXES[output_format])
+        elif 'format' not in generator_options:
+            generator_options['format'] = format_for_path(final_output, COMPRESSION_SUFFIXES.values())
+        if write_index:
+            generator_options['index'] = True
+        if compress is not None:
+            compress = compress.lower()
+            generator_options['compress'] = compress
+            suffix = COMPRESSION_SUFFIXES[compress]
+            if final_output.suffix.lower() != suffix:
+                final_output = final_output.with_name(final_output.name + suffix)
+        elif 'compress' not in generator_options:
+            # Resolved here rather than by the generator so that conflicts
+            # with other options are reported as usage errors
+            generator_options['compress'] = compression_for_path(final_output) or False
+        if read_order is not None:
+            generator_options['read_order'] = read_order.lower()
+        if jobs is not None:
+            generator_options['workers'] = jobs
+        if cpu_workers is not None:
+            value = cpu_workers.strip().lower()
+            generator_options['cpu_workers'] = int(value) if value.isdigit() else value
+        if auto_tune is not None:
+            generator_options['auto_tune'] = auto_tune
+        if tokenizer is not None:
+            generator_options['tokenizer'] = tokenizer
+        if max_tokens is not None:
+            generator_options['max_tokens'] = max_tokens
+        if shard_size is not None:
+            generator_options['shard_size'] = shard_size
+        if use_cache is not None:
+            generator_options['cache'] = use_cache
+        if cache_verify:
+            generator_options['cache_verify'] = True
+        if incremental:
+            generator_options['incremental'] = True
+        if dedupe:
+            generator_options['dedupe'] = True
+        if near_duplicates or similarity is not None:
+            generator_options['near_duplicates'] = similarity if similarity is not None else True
+        if compact:
+            generator_options['compact'] = True
+        if outline_patterns:
+            generator_options['outline'] = list(outline_patterns)
+        elif outline:
+            generator_options['outline'] = True
+        if outline_docstrings is not None:
+            generator_options['outline_docstrings'] = outline_docstrings
+        if max_file_sizes:
+            generator_options['max_file_size'] = list(max_file_sizes)
+        if large_files is not None:
+            generator_options['large_files'] = large_files.lower()
+        if excerpt_head is not None:
+            generator_options['excerpt_head'] = excerpt_head
+        if excerpt_tail is not None:
+            generator_options['excerpt_tail'] = excerpt_tail
+        if excerpt_line_numbers is not None:
+            generator_options['excerpt_line_numbers'] = excerpt_line_numbers
+        if stable:
+            generator_options['stable'] = True
+        if repo_map:
+            generator_options['repo_map'] = True
+        if repo_map_depth is not None:
+            generator_options['repo_map_depth'] = repo_map_depth
+        if repo_map_collapse is not None:
+            generator_options['repo_map_collapse'] = repo_map_collapse
+        if redact or redact_patterns:
+            generator_options['redact'] = True
+        if redact_patterns:
+            generator_options['redact_patterns'] = list(redact_patterns)
+        if redact_entropy is not None:
+            generator_options['redact_entropy'] = redact_entropy
+        
+        try:
+            generator = MarkdownGenerator(generator_options, include_patterns=llm_parser.get_include_patterns(),
+                                          generated=scanner.generated if scanner.generated_policy == 'stub' else None,
+                                          inventory=scanner.inventory() if generator_options.get('repo_map') else None)
+        except ValueError as e:
+            raise click.UsageError(str(e))
         
-        # Write output
-        final_output.parent.mkdir(parents=True, exist_ok=True)
-        final_output.write_text(content, encoding='utf-8')
+        # Generate markdown, streaming sections straight to the output file
+        total_bytes = generator.generate_to_file(files, repo_path, final_output)
         if not quiet:
             click.echo(f"✓ Generated context file: {final_output}")
+            if generator.parts:
+                click.echo(f"  Split into {len(generator.parts)} parts: "
+                           f"{generator.parts[0].name} ... {generator.parts[-1].name}")
+            if generator.omitted:
+                click.echo(f"  Omitted {len(generator.omitted)} files to fit the {generator.max_tokens:,}-token budget")
+            duplicates = generator.duplicates
+            if duplicates:
+                saved = f"{generator.dedupe_saved_bytes:,} bytes"
+                if generator.tokenizer is not None:
+                    saved += f", {generator.dedupe_saved_tokens:,} tokens"
+                click.echo(f"  Deduplicated {len(duplicates)} identical files, saving {saved}")
+            near_duplicates = generator.near_duplicates
+            if near_duplicates:
+                saved = f"{generator.near_duplicate_saved_bytes:,} bytes"
+                if generator.tokenizer is not None:
+                    saved += f", {generator.near_duplicate_saved_tokens:,} tokens"
+                click.echo(f"  Collapsed {len(near_duplicates)} near-duplicate files into diffs, saving {saved}")
+            compacted = [section for section in generator.sections if section.compacted_bytes]
+            if compacted:
+                saved = f"{generator.compact_saved_bytes:,} bytes"
+                if generator.tokenizer is not None:
+                    saved += f", {generator.compact_saved_tokens:,} tokens"
+                click.echo(f"  Compacted {len(compacted)} files, saving {saved}")
+            outlined = sum(1 for section in generator.sections if section.outlined)
+            if outlined:
+                click.echo(f"  Outlined {outlined} files")
+            redactions = generator.redactions
+            if redactions:
+                total = sum(sum(counts.values()) for counts in redactions.values())
+                click.echo(f"  Redacted {total} secrets in {len(redactions)} files")
+            if generator.index_path is not None:
+                click.echo(f"  Section index: {generator.index_path}")
         
         if verbose and not quiet:
-            click.echo(f"  Total size: {len(content):,} characters")
+            click.echo(f"  Total size: {total_bytes:,} bytes")
+            if generator.uncompressed_bytes:
+                click.echo(f"  Uncompressed size: {generator.uncompressed_bytes:,} bytes")
+            click.echo(f"  Reader threads: {generator.max_workers}")
+            if generator.cpu_workers:
+                click.echo(f"  CPU worker processes: {generator.cpu_workers}")
+            if generator.concurrency is not None:
+                steps = ' -> '.join(str(limit) for limit in generator.concurrency.history)
+                click.echo(f"  Auto-tuned read concurrency: {steps}")
             click.echo(f"  Files included: {len(files)}")
+            if generator.use_cache:
+                click.echo(f"  Section cache: {generator.cache_hits} hits, {generator.cache_misses} misses")
+            if generator.outline and not generator.cpu_workers:
+                click.echo(f"  Outline cache: {generator.outline_hits} hits, {generator.outline_misses} misses")
+            if generator.incremental:
+                click.echo(f"  Incremental: reused {generator.reused_sections} of {len(generator.sections)} sections")
+            if generator.tokenizer is not None:
+                click.echo(f"  Total tokens: {generator.total_tokens:,} ({generator.tokenizer.label})")
+                largest = sorted(generator.sections, key=lambda section: section.tokens or 0, reverse=True)[:5]
+                click.echo("  Largest files by tokens:")
+                for section in largest:
+                    click.echo(f"    {section.tokens or 0:>10,}  {section.rel_path}")
+            compacted = [section for section in generator.sections if section.compacted_bytes]
+            if compacted:
+                largest = sorted(compacted, key=lambda section: section.compacted_bytes, reverse=True)[:5]
+                click.echo("  Most compacted files:")
+                for section in largest:
+                    saved = f"{section.compacted_bytes:>10,} bytes"
+                    if section.compacted_tokens is not None:
+                        saved += f"  {section.compacted_tokens:>8,} tokens"
+                    click.echo(f"    {saved}  {section.rel_path}")
+            if generator.redactions:
+                click.echo("  Redacted files:")
+                for rel_path, counts in generator.redactions.items():
+                    kinds = ', '.join(f"{count} {name}" for name, count in sorted(counts.items()))
+                    click.echo(f"    {rel_path}: {kinds}")
+            if generator.omitted:
+                click.echo("  Omitted files:")
+                for file in generator.omitted:
+                    click.echo(f"    {file.relative_to(repo_path)}")
 
     finally:
         # Clean up temporary repository if it was created
@@ -0,0 +1,167 @@
+from typing import Dict, List, Optional, Pattern
+import re
+
+# String literal patterns, matched first so comment markers inside strings
+# are left alone
+_C_STRINGS = [rb'"(?:\\.|[^"\\\n])*"', rb"'(?:\\.|[^'\\\n])*'", rb'`(?:\\.|[^`\\])*`']
+_PY_STRINGS = [
+    rb'[rRbBuUfF]{0,2}"""[\s\S]*?"""', rb"[rRbBuUfF]{0,2}'''[\s\S]*?'''",
+    rb'[rRbBuUfF]{0,2}"(?:\\.|[^"\\\n])*"', rb"[rRbBuUfF]{0,2}'(?:\\.|[^'\\\n])*'",
+]
+
+# JavaScript regex literals are kept like strings, so a // or /* inside one
+# is not taken for a comment. A / only opens one after an operator, an
+# opening bracket or a keyword; after a name, number or closing bracket it
+# is a division.
+_JS_REGEX = (
+    rb'(?:(?<=[(,=:\[!&|?{};~^+\-*%<>])|(?<=\breturn)|(?<=\btypeof)|(?<=\bcase)|(?<=\byield))'
+    rb'[ \t]*/(?![/*])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*'
+)
+_JS_STRINGS = _C_STRINGS + [_JS_REGEX]
+
+_SQL_STRINGS = [rb"'(?:''|[^'])*'", rb'"(?:""|[^"])*"']
+_LUA_STRINGS = [rb'"(?:\\.|[^"\\\n])*"', rb"'(?:\\.|[^'\\\n])*'", rb'\[(?P<lualevel>=*)\[[\s\S]*?\](?P=lualevel)\]']
+
+# Comment patterns
+_C_COMMENTS = [rb'//[^\n]*', rb'/\*[\s\S]*?\*/']
+_BLOCK_COMMENTS = [rb'/\*[\s\S]*?\*/']
+_HASH_COMMENTS = [rb'#[^\n]*']
+_SQL_COMMENTS = [rb'--[^\n]*', rb'/\*[\s\S]*?\*/']
+_LUA_COMMENTS = [rb'--\[(?P<luacomment>=*)\[[\s\S]*?\](?P=luacomment)\]', rb'--[^\n]*']
+_MARKUP_COMMENTS = [rb'<!--[\s\S]*?-->']
+
+# Python docstring candidate: a triple-quoted string alone on its lines
+_DOCSTRING = rb'^[ \t]*[rRuU]?(?:"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\')[ \t]*(?:\n|\Z)'
+
+# Line opening a def or class body, or closing a multi-line signature
+_BLOCK_HEADER = re.compile(rb'^[ \t]*(?:(?:async[ \t]+)?def|class)\b|^[ \t]*\)')
+_ENDS_WITH_COLON = re.compile(rb':[ \t]*(?:#[^\n]*)?$')
+
+
+def _rules(strings: List[bytes] = (), comments: List[bytes] = (), inline_comments: bool = True,
+           docstrings: bool = False, trailing_whitespace: bool = True) -> Pattern[bytes]:
+    """Combine a language's patterns into one precompiled scanner.
+
+    Alternatives are tried left to right at each position: docstrings,
+    strings (kept), whole comment lines (removed with the blank lines after
+    them), comments after code, trailing whitespace and runs of blank lines.
+    """
+    alternatives = []
+    if docstrings:
+        alternatives.append(rb'(?P<docstring>' + _DOCSTRING + rb')')
+    if strings:
+        alternatives.append(rb'(?P<string>' + b'|'.join(strings) + rb')')
+    if comments:
+        comment = b'(?:' + b'|'.join(comments) + b')'
+        alternatives.append(rb'(?P<commentline>^[ \t]*' + comment + rb'[ \t]*(?:\n(?:[ \t]*\n)*|\Z))')
+        if inline_comments:
+            # Group names must be unique, so rename those in the second copy
+            inline = re.sub(rb'\(\?P([<=])(\w+)', rb'(?P\1\2_inline', comment)
+            alternatives.append(rb'(?P<comment>[ \t]*' + inline + rb')')
+    if trailing_whitespace:
+        alternatives.append(rb'(?P<space>[ \t]+(?=\n|\Z))')
+    alternatives.append(rb'(?P<blank>\n(?:[ \t]*\n){2,})')
+    return re.compile(b'|'.join(alternatives), re.MULTILINE)
+
+
+_C_LIKE = _rules(_C_STRINGS, _C_COMMENTS)
+_JS_LIKE = _rules(_JS_STRINGS, _C_COMMENTS)
+_HASH_LINES = _rules(comments=_HASH_COMMENTS, inline_comments=False)
+_MARKUP = _rules(comments=_MARKUP_COMMENTS)
+
+# Rules by _get_language result. Languages whose comment syntax is ambiguous
+# without a real parser (shell heredocs, YAML block scalars) only lose whole
+# comment lines; everything else gets whitespace cleanup only.
+LANGUAGE_RULES: Dict[str, Pattern[bytes]] = {
+    'python': _rules(_PY_STRINGS, _HASH_COMMENTS, docstrings=True),
+    **{language: _JS_LIKE for language in ('javascript', 'typescript', 'jsx', 'tsx')},
+    **{language: _C_LIKE for language in (
+        'java', 'c', 'cpp', 'csharp', 'go', 'rust', 'php',
+        'swift', 'kotlin', 'scala', 'objc', 'scss', 'less',
+    )},
+    'css': _rules(_C_STRINGS[:2], _BLOCK_COMMENTS),
+    'sql': _rules(_SQL_STRINGS, _SQL_COMMENTS),
+    'lua': _rules(_LUA_STRINGS, _LUA_COMMENTS),
+    **{language: _MARKUP for language in ('html', 'xml', 'vue', 'svelte')},
+    # Trailing double spaces are line breaks in Markdown
+    'markdown': _rules(comments=_MARKUP_COMMENTS, trailing_whitespace=False),
+    **{language: _HASH_LINES for language in (
+        'ruby', 'perl', 'bash', 'fish', 'r', 'yaml', 'toml', 'cmake', 'makefile', 'dockerfile',
+        'powershell', 'conf', 'gitignore', 'dockerignore',
+    )},
+    'ini': _rules(comments=[rb'[#;][^\n]*'], inline_comments=False),
+}
+
+_WHITESPACE_ONLY = _rules()
+
+
+def compact(body: bytes, language: str) -> bytes:
+    """Minify a UTF-8 file body using the rules for its language.
+
+    Strips comments (and with them license headers) and Python docstrings
+    where that cannot change the meaning of the code, drops trailing
+    whitespace and collapses runs of blank lines. Expects LF newlines.
+    """
+    scanner = LANGUAGE_RULES.get(language, _WHITESPACE_ONLY)
+
+    def replace(match) -> bytes:
+        kind = match.lastgroup
+        if kind == 'string':
+            return match.group()
+        if kind == 'docstring':
+            return _strip_docstring(body, match)
+        if kind == 'commentline':
+            # Keep shebang lines
+            return match.group() if match.start() == 0 and body.startswith(b'#!') else b''
+        if kind == 'blank':
+            return b'\n\n'
+        return b''
+
+    result = scanner.sub(replace, body).strip(b'\n')
+    return result + b'\n' if result else result
+
+
+def _strip_docstring(text: bytes, match) -> bytes:
+    """Remove a docstring candidate if it really is a docstring.
+
+    It must be the first statement of the module, or follow a def/class
+    header. A body left empty gets ``pass``.
+    """
+    line = match.group()
+    previous = _previous_code_line(text, match.start())
+    if previous is None:
+        return b''
+    if not (_BLOCK_HEADER.match(previous) and _ENDS_WITH_COLON.search(previous)):
+        return line
+    indent = len(line) - len(line.lstrip(b' \t'))
+    following = _next_code_indent(text, match.end())
+    if following is None or following < indent:
+        return line[:indent] + b'pass\n'
+    return b''
+
+
+def _previous_code_line(text: bytes, pos: int) -> Optional[bytes]:
+    """The last line before pos (a line start) that is not blank or a comment."""
+    end = pos
+    while end > 0:
+        start = text.rfind(b'\n', 0, end - 1) + 1
+        line = text[start:end - 1]
+        stripped = line.strip()
+        if stripped and not stripped.startswith(b'#'):
+            return line
+        end = start
+    return None
+
+
+def _next_code_indent(text: bytes, pos: int) -> Optional[int]:
+    """Indentation of the first line from pos on that is not blank or a comment."""
+    while pos < len(text):
+        end = text.find(b'\n', pos)
+        if end < 0:
+            end = len(text)
+        line = text[pos:end]
+        stripped = line.lstrip()
+        if stripped and not stripped.startswith(b'#'):
+            return len(line) - len(stripped)
+        pos = end + 1
+    return None
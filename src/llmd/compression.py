@@ -0,0 +1,246 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Deque, Optional, Union
+import lzma
+import struct
+import zlib
+
+from .scheduler import available_cpus
+from .writer import StreamWriter
+
+COMPRESSIONS = ('gzip', 'xz', 'zstd')
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'xz': 6, 'zstd': 3}
+MAX_LEVELS = {'gzip': 9, 'xz': 9, 'zstd': 22}
+
+# Deflate can only refer back 32KB, so small gzip blocks lose almost nothing;
+# xz and zstd windows are larger, so their blocks are too
+_BLOCK_SIZES = {'gzip': 1024 * 1024, 'xz': 4 * 1024 * 1024, 'zstd': 4 * 1024 * 1024}
+_DEFLATE_WINDOW = 32 * 1024
+
+
+def compression_for_path(path: Path) -> Optional[str]:
+    """The compression selected by an output path's suffix, if any."""
+    suffix = path.suffix.lower()
+    for compression, known in COMPRESSION_SUFFIXES.items():
+        if suffix == known:
+            return compression
+    return None
+
+
+def parse_compression(value: Union[bool, str]) -> Optional[str]:
+    """Parse the ``compress`` option: a compression name, true for gzip, or false."""
+    if value is True:
+        return 'gzip'
+    if value is False or (isinstance(value, str) and value.strip().lower() in ('', 'false', 'none')):
+        return None
+    name = str(value).strip().lower()
+    if name == 'true':
+        return 'gzip'
+    if name not in COMPRESSIONS:
+        raise ValueError(f"Invalid compress '{value}'. Expected one of: {', '.join(COMPRESSIONS)}")
+    if name == 'zstd' and _zstd_compress(DEFAULT_LEVELS['zstd']) is None:
+        raise ValueError("Invalid compress 'zstd': it needs Python 3.14 or the zstandard package.")
+    return name
+
+
+def check_compress_level(compression: str, level: int) -> None:
+    """Reject a compression level outside the range of the compression's codec."""
+    if level > MAX_LEVELS[compression]:
+        raise ValueError(f"Invalid compress_level '{level}'. Expected 0-{MAX_LEVELS[compression]} for {compression}.")
+
+
+def _zstd_compress(level: int):
+    """A function compressing one zstd frame, or None when zstd is unavailable."""
+    try:
+        from compression import zstd  # Python 3.14+
+        return lambda data: zstd.compress(data, level)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    # Compressor objects are not thread-safe, so every block gets its own
+    return lambda data: zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class _Codec:
+    """Compresses independent blocks that concatenate into one valid file."""
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def header(self) -> bytes:
+        return b''
+
+    def update(self, block: bytes) -> Any:
+        """See every block in order; returns what compress needs to know of the earlier ones."""
+        return None
+
+    def compress(self, block: bytes, context: Any, last: bool) -> bytes:
+        """Compress one block; runs on a worker thread."""
+        raise NotImplementedError
+
+    def trailer(self) -> bytes:
+        return b''
+
+
+class _GzipCodec(_Codec):
+    """One gzip member made of independently deflated blocks (as pigz does).
+
+    Every block but the last ends on a byte boundary with a sync flush, and
+    is primed with the 32KB of data before it, so the ratio is that of a
+    single deflate stream.
+    """
+
+    def __init__(self, level: int):
+        super().__init__(level)
+        self.crc = 0
+        self.size = 0
+        self.window = b''
+
+    def header(self) -> bytes:
+        # No name and a zero mtime keep the output reproducible
+        return b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+    def update(self, block: bytes) -> bytes:
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        window = self.window
+        self.window = (window + block[-_DEFLATE_WINDOW:])[-_DEFLATE_WINDOW:]
+        return window
+
+    def compress(self, block: bytes, window: bytes, last: bool) -> bytes:
+        if window:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=window)
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+        return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    def trailer(self) -> bytes:
+        return struct.pack('<II', self.crc, self.size & 0xffffffff)
+
+
+class _FrameCodec(_Codec):
+    """Concatenated xz streams or zstd frames, which decompress as one file."""
+
+    def __init__(self, level: int, compress):
+        super().__init__(level)
+        self._compress = compress
+        self._blocks = 0
+
+    def update(self, block: bytes) -> bool:
+        self._blocks += 1
+        return self._blocks == 1
+
+    def compress(self, block: bytes, first: bool, last: bool) -> bytes:
+        # An empty output still needs one (empty) frame
+        if not block and not first:
+            return b''
+        return self._compress(block)
+
+
+def _make_codec(compression: str, level: int) -> _Codec:
+    if compression == 'gzip':
+        return _GzipCodec(level)
+    if compression == 'xz':
+        return _FrameCodec(level, lambda data: lzma.compress(data, lzma.FORMAT_XZ, preset=level))
+    compress = _zstd_compress(level)
+    if compress is None:
+        raise ValueError("Invalid compress 'zstd': it needs Python 3.14 or the zstandard package.")
+    return _FrameCodec(level, compress)
+
+
+class CompressedWriter(StreamWriter):
+    """Compress everything written into another writer, in parallel blocks.
+
+    Output is cut into fixed-size blocks that are compressed on a thread pool
+    (zlib, lzma and zstd release the GIL) while the generator keeps writing;
+    compressed blocks are written in order, with at most two per thread in
+    flight. Block boundaries depend only on the data, so the output is the
+    same for any number of threads. ``bytes_written`` counts uncompressed
+    bytes. File spans are read and compressed rather than copied by the
+    kernel.
+    """
+
+    def __init__(self, target: StreamWriter, compression: str, level: Optional[int] = None,
+                 block_size: Optional[int] = None, threads: Optional[int] = None):
+        super().__init__(None)
+        self.target = target
+        self.compression = compression
+        self._codec = _make_codec(compression, DEFAULT_LEVELS[compression] if level is None else level)
+        self.block_size = block_size or _BLOCK_SIZES[compression]
+        self.threads = threads or min(4, available_cpus())
+        self._buffer = bytearray()
+        self._pending: Deque[Future] = deque()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        target.write(self._codec.header())
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.block_size:
+            offset = 0
+            while len(self._buffer) - offset >= self.block_size:
+                self._submit(bytes(self._buffer[offset:offset + self.block_size]), last=False)
+                offset += self.block_size
+            del self._buffer[:offset]
+
+    def copy_from(self, src: BinaryIO, offset: int, length: int) -> None:
+        if hasattr(src, 'flush'):
+            src.flush()
+        src.seek(offset)
+        while length > 0:
+            chunk = src.read(min(self.block_size, length))
+            if not chunk:
+                break
+            self.write(chunk)
+            length -= len(chunk)
+
+    def close(self) -> None:
+        """Compress the last block and write the trailer."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            self._buffer = bytearray()
+            while self._pending:
+                self.target.write(self._pending.popleft().result())
+            self.target.write(self._codec.trailer())
+        finally:
+            self._shutdown(cancel=False)
+
+    def abort(self) -> None:
+        """Stop compressing; the target is left incomplete."""
+        self._closed = True
+        self._pending.clear()
+        self._shutdown(cancel=True)
+
+    def _submit(self, block: bytes, last: bool) -> None:
+        context = self._codec.update(block)
+        if self.threads <= 1:
+            self.target.write(self._codec.compress(block, context, last))
+            return
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='llmd-compress')
+        self._pending.append(self._pool.submit(self._codec.compress, block, context, last))
+        while len(self._pending) > self.threads * 2:
+            self.target.write(self._pending.popleft().result())
+
+    def _shutdown(self, cancel: bool) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+            self._pool = None
+
+    def __enter__(self) -> 'CompressedWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
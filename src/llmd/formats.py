@@ -0,0 +1,184 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+import codecs
+import json
+import re
+
+from .writer import FileSpan, StreamWriter
+
+OUTPUT_FORMATS = ('markdown', 'jsonl', 'xml')
+FORMAT_SUFFIXES = {'markdown': '.md', 'jsonl': '.jsonl', 'xml': '.xml'}
+
+_SUFFIX_FORMATS = {'.md': 'markdown', '.markdown': 'markdown', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.xml': 'xml'}
+_READ_CHUNK_SIZE = 1024 * 1024
+
+# Characters XML 1.0 cannot represent at all, even as character references
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def parse_output_format(value: str) -> str:
+    """Parse the ``format`` option."""
+    name = str(value).strip().lower()
+    if name == 'md':
+        name = 'markdown'
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format '{value}'. Expected one of: {', '.join(OUTPUT_FORMATS)}")
+    return name
+
+
+def format_for_path(path: Path, compression_suffixes: Iterable[str] = ()) -> str:
+    """The format selected by an output path's suffix (after any compression suffix); markdown by default."""
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] in compression_suffixes:
+        suffixes.pop()
+    return _SUFFIX_FORMATS.get(suffixes[-1], 'markdown') if suffixes else 'markdown'
+
+
+def xml_escape(text: str, quote: bool = False) -> str:
+    """Escape text for an XML element (or, with quote, a double-quoted attribute).
+
+    Carriage returns become character references so parsers do not turn
+    them into newlines; characters XML cannot carry become U+FFFD.
+    """
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    if quote:
+        text = text.replace('"', '&quot;').replace('\n', '&#10;').replace('\t', '&#9;')
+    if '\r' in text:
+        text = text.replace('\r', '&#13;')
+    if _XML_INVALID.search(text):
+        text = _XML_INVALID.sub('\ufffd', text)
+    return text
+
+
+class RecordFormat:
+    """A format that writes each file as one self-contained record.
+
+    Records are written from the same sections as markdown, but only the
+    file body is kept and it is escaped for the format, so contents such
+    as code fences cannot break the structure. Bodies spliced from disk
+    are read and escaped in chunks.
+    """
+
+    name = ''
+
+    def document_start(self, attributes: Dict[str, Any]) -> bytes:
+        """Bytes before the first record."""
+        return b''
+
+    def document_end(self, omitted: List[str]) -> bytes:
+        """Bytes after the last record; omitted lists files left out by the token budget."""
+        return b''
+
+    def record_start(self, fields: Dict[str, Any]) -> bytes:
+        """Bytes before an escaped body."""
+        raise NotImplementedError
+
+    def record_end(self) -> bytes:
+        """Bytes after an escaped body."""
+        raise NotImplementedError
+
+    def escape(self, text: str) -> str:
+        """Escape a piece of a body."""
+        raise NotImplementedError
+
+    def write_record(self, writer: StreamWriter, fields: Dict[str, Any],
+                     body: List[Union[bytes, FileSpan]]) -> int:
+        """Write a record with a body made of literal bytes and file spans.
+
+        Returns the number of line breaks written.
+        """
+        newlines = 0
+
+        def write(data: bytes) -> None:
+            nonlocal newlines
+            writer.write(data)
+            newlines += data.count(b'\n')
+
+        write(self.record_start(fields))
+        # Chunks of spans can end inside a UTF-8 character
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        for part in body:
+            for chunk in _chunks(part):
+                text = decoder.decode(chunk)
+                if text:
+                    write(self.escape(text).encode('utf-8'))
+        text = decoder.decode(b'', final=True)
+        if text:
+            write(self.escape(text).encode('utf-8'))
+        write(self.record_end())
+        return newlines
+
+
+class JsonlFormat(RecordFormat):
+    """One JSON object per line: the record fields, then ``content``."""
+
+    name = 'jsonl'
+
+    def record_start(self, fields: Dict[str, Any]) -> bytes:
+        head = json.dumps(fields, ensure_ascii=False)
+        return (head[:-1] + (', ' if fields else '') + '"content": "').encode('utf-8')
+
+    def record_end(self) -> bytes:
+        return b'"}\n'
+
+    def escape(self, text: str) -> str:
+        return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+class XmlFormat(RecordFormat):
+    """A ``<documents>`` element holding one ``<document path=...>`` per file."""
+
+    name = 'xml'
+
+    def document_start(self, attributes: Dict[str, Any]) -> bytes:
+        return f'<?xml version="1.0" encoding="UTF-8"?>\n<documents{_xml_attributes(attributes)}>\n'.encode('utf-8')
+
+    def document_end(self, omitted: List[str]) -> bytes:
+        lines = [f'<omitted path="{xml_escape(path, quote=True)}"/>\n' for path in omitted]
+        return (''.join(lines) + '</documents>\n').encode('utf-8')
+
+    def record_start(self, fields: Dict[str, Any]) -> bytes:
+        return f'<document{_xml_attributes(fields)}>'.encode('utf-8')
+
+    def record_end(self) -> bytes:
+        return b'</document>\n'
+
+    def escape(self, text: str) -> str:
+        return xml_escape(text)
+
+
+def get_record_format(name: str) -> Optional[RecordFormat]:
+    """The record format for a format name, or None for markdown."""
+    if name == 'jsonl':
+        return JsonlFormat()
+    if name == 'xml':
+        return XmlFormat()
+    return None
+
+
+def _xml_attributes(attributes: Dict[str, Any]) -> str:
+    """Attributes with a value, as ``name="value"`` pairs."""
+    return ''.join(f' {name}="{xml_escape(_xml_value(value), quote=True)}"'
+                   for name, value in attributes.items() if value is not None)
+
+
+def _xml_value(value: Any) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _chunks(part: Union[bytes, FileSpan]) -> Iterable[bytes]:
+    """The bytes of a body part, reading spans a chunk at a time."""
+    if isinstance(part, bytes):
+        yield part
+        return
+    with open(part.path, 'rb') as f:
+        f.seek(part.offset)
+        remaining = part.length
+        while remaining > 0:
+            chunk = f.read(min(_READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            yield chunk
+            remaining -= len(chunk)
@@ -0,0 +1,190 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import re
+import threading
+import pathspec
+
+from .writer import AtomicFileWriter
+
+GENERATED_POLICIES = ('include', 'stub', 'drop')
+
+# Cache file for marker verdicts, inside the cache directory
+GENERATED_CACHE_FILE = 'generated.json'
+
+# Bump when the markers or the cache layout change
+GENERATED_VERSION = 1
+
+# Bytes read from the start of a file when looking for a marker
+MARKER_READ_SIZE = 1024
+
+# Markers generators put in a comment near the top of their output, e.g.
+# Go's "Code generated by ... DO NOT EDIT." or Facebook's @generated. Only
+# comment lines count, so code that merely mentions a marker is not flagged.
+_MARKER_PATTERN = re.compile(
+    rb'^[ \t]*(?:#|//|/\*|\*|<!--|--|;|%)[^\n]*?(?:@generated|DO NOT EDIT|Code generated by)',
+    re.MULTILINE,
+)
+
+# Attributes that mark a file as generated: the attribute, the state that
+# marks it, and the reason reported
+_ATTRIBUTE_REASONS = (
+    ('linguist-generated', True, 'linguist-generated'),
+    ('linguist-vendored', True, 'linguist-vendored'),
+    ('diff', False, '-diff'),
+)
+
+
+def parse_generated_policy(value: str) -> str:
+    """Parse the ``generated`` option."""
+    name = str(value).strip().lower()
+    if name not in GENERATED_POLICIES:
+        raise ValueError(f"Invalid generated '{value}'. Expected one of: {', '.join(GENERATED_POLICIES)}")
+    return name
+
+
+def has_generated_marker(prefix: bytes) -> bool:
+    """Whether the start of a file carries a generated-code marker."""
+    return _MARKER_PATTERN.search(prefix) is not None
+
+
+def _attribute_state(token: str) -> Tuple[str, Optional[bool]]:
+    """The attribute a .gitattributes token sets, and to what (None for unspecified)."""
+    if token.startswith('!'):
+        return token[1:], None
+    if token.startswith('-'):
+        return token[1:], False
+    if '=' in token:
+        name, value = token.split('=', 1)
+        return name, value.lower() not in ('false', '0', 'no')
+    return token, True
+
+
+class GitAttributes:
+    """The attributes of .gitattributes files that mark files as generated.
+
+    Honours ``linguist-generated`` and ``linguist-vendored`` (as GitHub's
+    linguist does) and ``-diff``, including through the ``binary`` macro.
+    The root file and the files of nested directories are read once each,
+    when a path under them is first looked up. As in git, the last matching
+    line wins and deeper files override shallower ones.
+    """
+
+    def __init__(self, repo_path: Path):
+        self.repo_path = repo_path
+        # Rules of the .gitattributes file of each directory (relative, '' for the root)
+        self._rules: Dict[str, List[Tuple[pathspec.PathSpec, Dict[str, Optional[bool]]]]] = {}
+        self._lock = threading.Lock()
+
+    def reason(self, rel_path: str) -> Optional[str]:
+        """Why the attributes mark a file as generated, or None."""
+        state: Dict[str, Optional[bool]] = {}
+        parts = rel_path.replace(os.sep, '/').split('/')
+        for depth in range(len(parts)):
+            directory = '/'.join(parts[:depth])
+            relative = '/'.join(parts[depth:])
+            for spec, attributes in self._directory_rules(directory):
+                if spec.match_file(relative):
+                    state.update(attributes)
+        for attribute, marked, reason in _ATTRIBUTE_REASONS:
+            if state.get(attribute) is marked:
+                return reason
+        return None
+
+    def _directory_rules(self, directory: str) -> List[Tuple[pathspec.PathSpec, Dict[str, Optional[bool]]]]:
+        rules = self._rules.get(directory)
+        if rules is None:
+            rules = self._load(self.repo_path / directory / '.gitattributes')
+            with self._lock:
+                self._rules[directory] = rules
+        return rules
+
+    def _load(self, path: Path) -> List[Tuple[pathspec.PathSpec, Dict[str, Optional[bool]]]]:
+        try:
+            lines = path.read_text(encoding='utf-8', errors='replace').splitlines()
+        except OSError:
+            return []
+        rules = []
+        for line in lines:
+            tokens = line.split()
+            # Comments, macro definitions and quoted patterns are skipped
+            if not tokens or tokens[0].startswith(('#', '[attr]', '"')):
+                continue
+            attributes: Dict[str, Optional[bool]] = {}
+            for token in tokens[1:]:
+                if token == 'binary':
+                    attributes.update({'diff': False, 'merge': False, 'text': False})
+                    continue
+                name, value = _attribute_state(token)
+                attributes[name] = value
+            if any(name in attributes for name, _, _ in _ATTRIBUTE_REASONS):
+                rules.append((pathspec.PathSpec.from_lines('gitwildmatch', [tokens[0]]), attributes))
+        return rules
+
+
+class GeneratedFileDetector:
+    """Decide which files are generated, from .gitattributes and markers.
+
+    Attributes are checked first; other files have their first
+    ``MARKER_READ_SIZE`` bytes searched for a marker. Marker verdicts are
+    kept by (inode, mtime_ns), and with a path they are loaded from and
+    saved to a JSON file so unchanged files are not read again on later
+    runs. Only verdicts of files seen in the current run are saved.
+    """
+
+    def __init__(self, repo_path: Path, cache_path: Optional[Path] = None):
+        self.repo_path = repo_path
+        self.cache_path = cache_path
+        self.attributes = GitAttributes(repo_path)
+        self.reads = 0
+        self._lock = threading.Lock()
+        self._stored: Dict[str, bool] = {}
+        self._used: Dict[str, bool] = {}
+        if cache_path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8'))
+            if data.get('version') != GENERATED_VERSION:
+                return
+            self._stored = {key: bool(verdict) for key, verdict in data['verdicts'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self._stored = {}
+
+    def reason(self, file: Path, rel_path: str) -> Optional[str]:
+        """Why a file counts as generated, or None if it does not."""
+        reason = self.attributes.reason(rel_path)
+        if reason is not None:
+            return reason
+        try:
+            st = file.stat()
+        except OSError:
+            return None
+        key = f"{st.st_ino}:{st.st_mtime_ns}"
+        with self._lock:
+            verdict = self._used.get(key)
+            if verdict is None:
+                verdict = self._stored.get(key)
+        if verdict is None:
+            try:
+                with open(file, 'rb') as f:
+                    verdict = has_generated_marker(f.read(MARKER_READ_SIZE))
+            except OSError:
+                return None
+            with self._lock:
+                self.reads += 1
+        with self._lock:
+            self._used[key] = verdict
+        return 'marker' if verdict else None
+
+    def save(self) -> None:
+        """Write the verdicts of this run, if there is a path."""
+        if self.cache_path is None:
+            return
+        with self._lock:
+            data = {'version': GENERATED_VERSION, 'verdicts': {key: int(v) for key, v in self._used.items()}}
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with AtomicFileWriter(self.cache_path) as writer:
+            writer.write_text(json.dumps(data, separators=(',', ':')))
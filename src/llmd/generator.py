@@ -1,102 +1,1756 @@
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import List
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import datetime
-import multiprocessing
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import io
+import itertools
+import os
+import tempfile
+import threading
+import pathspec
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from . import __version__
+from .budget import (BYTES_PER_TOKEN, BudgetCandidate, BudgetEnforcer, BudgetPlan, calibrate_bytes_per_token,
+                     estimate_tokens, plan_budget, score_candidates, toc_entry_tokens)
+from .cache import DEFAULT_CACHE_DIR, CachedSection, SectionCache
+from .compression import (COMPRESSION_SUFFIXES, CompressedWriter, check_compress_level, compression_for_path,
+                          parse_compression)
+from .formats import RecordFormat, format_for_path, get_record_format, parse_output_format
+from .index import IndexEntry, OutputIndex
+from .largefiles import LargeFilePolicy
+from .manifest import SectionManifest
+from .outline import OUTLINE_CACHE_FILE, OUTLINE_LANGUAGES, OutlineCache
+from .redact import parse_entropy_threshold, parse_redact_patterns
+from .repomap import DEFAULT_MAP_COLLAPSE, DEFAULT_MAP_DEPTH, RepoInventory, render_repo_map
+from .scheduler import (
+    READ_ORDERS, AdaptiveConcurrency, WindowedScheduler, available_cpus, default_workers, is_rotational,
+    physical_offset,
+)
+from .similarity import DEFAULT_THRESHOLD, BodyCache, NearDuplicateIndex, minhash_signature, unified_diff
+from .shards import ShardLimit, parse_shard_size, part_path, stale_parts
+from .tokenizer import Tokenizer, TokenCache, get_tokenizer
+from .transforms import CpuStage, TransformJob, TransformResult, TransformSettings, Transformer
+from .vcs import last_commit_times, modified_files
+from .writer import AtomicFileWriter, FileSpan, StreamWriter
+
+# A rendered section is a list of parts: literal bytes, or a byte range of a
+# source file that the writer copies straight from disk
+SectionPart = Union[bytes, FileSpan]
+
+
+@dataclass
+class FileSection:
+    """A rendered file section plus what was learned while rendering it."""
+    rel_path: str
+    parts: List[SectionPart] = field(default_factory=list)
+    # Tokens in the whole section, when a tokenizer is configured
+    tokens: Optional[int] = None
+    # Digest of the emitted file body, when it was hashed
+    content_hash: Optional[bytes] = None
+    # Digest of the file as read from disk, when the whole file was read
+    source_hash: Optional[bytes] = None
+    # Heading text when it differs from rel_path (pieces of a split file)
+    title: Optional[str] = None
+    # Stat of the file the section was rendered from
+    stat: Optional[os.stat_result] = None
+    # Earlier file with identical contents, when this section is a stub
+    duplicate_of: Optional[str] = None
+    # Earlier similar file, when this section is a diff against it
+    similar_to: Optional[str] = None
+    # MinHash signature of the body, for near-duplicate detection
+    signature: Optional[bytes] = None
+    # Bytes and tokens removed from the body by compaction
+    compacted_bytes: int = 0
+    compacted_tokens: Optional[int] = None
+    # The body is an outline of the file (not known for reused sections)
+    outlined: bool = False
+    # Line breaks in the file span of a section spliced from disk, when
+    # they were counted while validating it
+    span_newlines: Optional[int] = None
+    # Secrets replaced in the body, per signature name (not known for
+    # reused sections)
+    redactions: Optional[Dict[str, int]] = None
+
+
+@dataclass
+class _FileRead:
+    """A file read by an I/O thread, waiting for its CPU transforms."""
+    rel_path: str
+    head: bytes
+    file: Path
+    size: int = 0
+    # Work for the CPU stage, or None when body is already final
+    job: Optional[TransformJob] = None
+    body: bytes = b''
+
+
+@dataclass
+class _Extent:
+    """Where a section was written, relative to the start of the section stream."""
+    offset: int
+    length: int
+    # Line breaks in the stream before the section and within it (counted
+    # only when an index is written)
+    line: int = 0
+    newlines: int = 0
+    # Tokens of what was written: the section, or a record's content
+    tokens: Optional[int] = None
+
+
+@dataclass
+class _OutputPart:
+    """One shard of sharded output, spooled until it is complete."""
+    index: int
+    path: Path
+    spool: BinaryIO
+    writer: StreamWriter
+    sections: List[FileSection] = field(default_factory=list)
+    extents: List[_Extent] = field(default_factory=list)
+    # Size so far in the shard limit's unit, including header and TOC
+    size: int = 0
+    # Line breaks in the spooled sections so far
+    lines: int = 0
+    # Where the spooled sections start in the part, once its head is written
+    sections_start: int = 0
+    head_lines: int = 0
 
 
 class MarkdownGenerator:
     """Generate markdown output with table of contents."""
     
-    def __init__(self):
-        # Use thread pool for I/O-bound operations
-        self.max_workers = min(32, (multiprocessing.cpu_count() or 1) * 4)
+    # Separator placed between document sections
+    SECTION_SEPARATOR = '\n\n'
+    
+    # Closing code fence of a file section
+    SECTION_TAIL = b"\n```"
+    
+    BINARY_NOTICE = b"[Binary or non-UTF-8 file - content omitted]"
+    TOO_LARGE_NOTICE = b"[File too large - content omitted]"
+    # Files, and bytes from the start of each, sampled to calibrate token estimates
+    CALIBRATION_FILES = 16
+    CALIBRATION_BYTES = 16 * 1024
+    
+    def __init__(self, options: Optional[Dict[str, Any]] = None, include_patterns: Optional[List[str]] = None,
+                 generated: Optional[Dict[str, str]] = None, inventory: Optional[RepoInventory] = None):
+        # Generation settings, using the same keys as the llm.md OPTIONS section
+        self.options = dict(options or {})
+        # INCLUDE patterns, used to prioritise files under a token budget
+        self.include_patterns = list(include_patterns or [])
+        # Generated files to render as stubs, by relative path, with the
+        # reason the scanner found (see RepoScanner.generated)
+        self.generated = dict(generated or {})
+        # Optionally put a map of the repository (directories with file
+        # counts, sizes and token estimates) before the TOC. It is built from
+        # the scanner's inventory (RepoScanner.inventory), or from the stat
+        # data of the selected files alone without one.
+        self.repo_map = bool(self.options.get('repo_map', False))
+        self.repo_map_depth = self._positive_int_option('repo_map_depth', DEFAULT_MAP_DEPTH)
+        self.repo_map_collapse = self._positive_int_option('repo_map_collapse', DEFAULT_MAP_COLLAPSE)
+        self.inventory = inventory
+        self._repo_map: Optional[str] = None
+        # Stable output keeps the start of the document byte-identical across
+        # runs, so prompt caches can reuse it: the generation time, repository
+        # path, totals, map and TOC move to the end, and files that changed
+        # least recently come first
+        self.stable = bool(self.options.get('stable', False))
+        
+        # Use thread pool for I/O-bound operations, sized from the CPUs this
+        # process may actually use (affinity mask and cgroup quota)
+        workers = self.options.get('workers')
+        if workers is None:
+            self.max_workers = default_workers()
+        elif isinstance(workers, int) and not isinstance(workers, bool) and workers > 0:
+            self.max_workers = workers
+        else:
+            raise ValueError(f"Invalid workers '{workers}'. Expected a positive integer.")
+        # CPU-bound transforms (validation, hashing, token counting) run on the
+        # reader threads, or on this many worker processes; 'auto' uses one
+        # per usable CPU
+        cpu_workers = self.options.get('cpu_workers', 0)
+        if cpu_workers == 'auto':
+            self.cpu_workers = available_cpus()
+        elif isinstance(cpu_workers, int) and not isinstance(cpu_workers, bool) and cpu_workers >= 0:
+            self.cpu_workers = cpu_workers
+        else:
+            raise ValueError(f"Invalid cpu_workers '{cpu_workers}'. Expected a non-negative integer or 'auto'.")
+        self._cpu_stage: Optional[CpuStage] = None
+        self._inline_transformer: Optional[Transformer] = None
+        # Optionally ramp read concurrency up or down from measured throughput
+        self.auto_tune = bool(self.options.get('auto_tune', False))
+        self.concurrency: Optional[AdaptiveConcurrency] = None
+        # Bound the work in flight (running reads plus completed sections
+        # waiting in the reorder buffer) so memory does not grow with repo size
+        self.max_in_flight = max(self.max_workers, self.cpu_workers) * 4
+        self.max_in_flight_bytes = 64 * 1024 * 1024
+        # Files up to small_file_size are read in batches so that one executor
+        # task covers many files; see _plan_read_units
+        self.small_file_size = 4096
+        self.batch_target_bytes = 256 * 1024
+        self.max_batch_files = 256
+        # Files above their size threshold (max_file_size, or a per-pattern
+        # rule) are omitted or excerpted; files above zero_copy_threshold are
+        # validated in chunks and spliced into the output from disk
+        self.large_files = LargeFilePolicy.from_options(self.options)
+        self.zero_copy_threshold = 1_000_000
+        self.validate_chunk_size = 1024 * 1024
+        # Order in which reads are submitted (output order never changes)
+        self.read_order = str(self.options.get('read_order', 'auto')).lower()
+        if self.read_order not in READ_ORDERS:
+            raise ValueError(f"Invalid read_order '{self.read_order}'. Expected one of: {', '.join(READ_ORDERS)}")
+        # Optional token budget: keep the highest-priority files that fit
+        max_tokens = self.options.get('max_tokens')
+        if max_tokens is not None and (not isinstance(max_tokens, int) or isinstance(max_tokens, bool)
+                                       or max_tokens <= 0):
+            raise ValueError(f"Invalid max_tokens '{max_tokens}'. Expected a positive integer.")
+        self.max_tokens: Optional[int] = max_tokens
+        # Optional sharding into size- or token-bounded parts
+        shard_size = self.options.get('shard_size')
+        self.shard_limit: Optional[ShardLimit] = parse_shard_size(shard_size) if shard_size is not None else None
+        # Paths of the parts written by the last sharded run
+        self.parts: List[Path] = []
+        # Optional token counting; body counts are cached by content hash so
+        # identical files are only counted once. A budget or a token-bounded
+        # shard size needs counts.
+        needs_tokens = max_tokens or (self.shard_limit is not None and self.shard_limit.unit == 'tokens')
+        tokenizer = self.options.get('tokenizer') or ('heuristic' if needs_tokens else None)
+        self.tokenizer_spec: Optional[str] = str(tokenizer) if tokenizer else None
+        self.tokenizer: Optional[Tokenizer] = get_tokenizer(self.tokenizer_spec) if tokenizer else None
+        self.token_cache = TokenCache()
+        # Section token counts by (rel_path, size, mtime_ns), so budget
+        # planning can use exact counts for files that were rendered before
+        self._known_tokens: Dict[Tuple[str, int, int], int] = {}
+        # Optional on-disk cache of rendered sections, opened per run
+        self.use_cache = bool(self.options.get('cache', False))
+        self.cache_dir = str(self.options.get('cache_dir', DEFAULT_CACHE_DIR))
+        self.cache_verify = bool(self.options.get('cache_verify', False))
+        self.section_cache: Optional[SectionCache] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Incremental mode: copy unchanged sections from the previous output,
+        # located through a manifest written next to it
+        self.incremental = bool(self.options.get('incremental', False))
+        if self.incremental and self.shard_limit is not None:
+            raise ValueError("Invalid incremental option: it cannot be combined with shard_size.")
+        self._previous: Optional[SectionManifest] = None
+        self.reused_sections = 0
+        # Optionally compress the output (gzip, xz or zstd) as it is written;
+        # by default the output path's suffix (.gz, .xz, .zst) decides
+        compress = self.options.get('compress')
+        self._infer_compression = compress is None
+        self.compression: Optional[str] = parse_compression(compress) if compress is not None else None
+        compress_level = self.options.get('compress_level')
+        if compress_level is not None and (not isinstance(compress_level, int) or isinstance(compress_level, bool)
+                                           or compress_level < 0):
+            raise ValueError(f"Invalid compress_level '{compress_level}'. Expected a non-negative integer.")
+        self.compress_level: Optional[int] = compress_level
+        self._check_compression(self.compression)
+        # Uncompressed size of the last compressed output
+        self.uncompressed_bytes = 0
+        # Optionally write llm-context.index.json next to the output, with
+        # the byte and line range of every section
+        self.write_index = bool(self.options.get('index', False))
+        self.index_path: Optional[Path] = None
+        # Output format: markdown sections, or one record per file (JSON
+        # lines or XML); by default the output path's suffix decides
+        output_format = self.options.get('format')
+        self._infer_format = output_format is None
+        self._set_output_format(parse_output_format(output_format) if output_format is not None else 'markdown')
+        self._reuse_lock = threading.Lock()
+        # Optionally emit files with identical contents once; later copies
+        # become stubs pointing at the first
+        self.dedupe = bool(self.options.get('dedupe', False))
+        self.dedupe_saved_bytes = 0
+        self.dedupe_saved_tokens = 0
+        # Optionally emit files similar to an earlier file as a diff against
+        # it; True uses the default similarity threshold
+        near = self.options.get('near_duplicates', False)
+        if near is True:
+            near = DEFAULT_THRESHOLD
+        if near is not False and near is not None and (
+                isinstance(near, bool) or not isinstance(near, (int, float)) or not 0 < near <= 1):
+            raise ValueError(f"Invalid near_duplicates '{near}'. Expected true, false or a similarity in (0, 1].")
+        self.near_duplicate_threshold: Optional[float] = float(near) if near else None
+        self.near_duplicate_saved_bytes = 0
+        self.near_duplicate_saved_tokens = 0
+        # Bodies kept for diffing against later near-duplicates
+        self.near_duplicate_memory = 32 * 1024 * 1024
+        # Optionally minify file bodies with per-language rules (llmd.compact)
+        self.compact = bool(self.options.get('compact', False))
+        # Optionally render supported source files as outlines: True for
+        # every such file, or patterns (a list, or a comma-separated string)
+        # selecting the files to outline
+        outline = self.options.get('outline', False)
+        if isinstance(outline, str):
+            outline = [pattern.strip() for pattern in outline.split(',') if pattern.strip()]
+        if not isinstance(outline, (bool, list, tuple)) or (
+                isinstance(outline, (list, tuple)) and not all(isinstance(p, str) for p in outline)):
+            raise ValueError(f"Invalid outline '{outline}'. Expected true, false or a list of patterns.")
+        self.outline_patterns: Optional[List[str]] = list(outline) if not isinstance(outline, bool) else None
+        self.outline = bool(outline)
+        self._outline_spec = (pathspec.PathSpec.from_lines('gitwildmatch', self.outline_patterns)
+                              if self.outline_patterns else None)
+        self.outline_docstrings = bool(self.options.get('outline_docstrings', True))
+        self.outline_cache: Optional[OutlineCache] = None
+        # Optionally replace secrets in file bodies (llmd.redact): known
+        # signatures, extra NAME=REGEX patterns and a high-entropy heuristic
+        self.redact = bool(self.options.get('redact', False))
+        patterns = self.options.get('redact_patterns')
+        self.redact_patterns = parse_redact_patterns(patterns) if patterns else ()
+        self.redact_entropy = parse_entropy_threshold(self.options.get('redact_entropy'))
+        # Outline cache lookups of the last run (made on this process only)
+        self.outline_hits = 0
+        self.outline_misses = 0
+        # Per-file results of the last run, without their bodies
+        self.sections: List[FileSection] = []
+        # Budget plan of the last run and the files it left out
+        self.budget: Optional[BudgetPlan] = None
+        self.omitted: List[Path] = []
+        # Enforces the plan on exact counts while rendering, and the files it planned for
+        self._budget_enforcer: Optional[BudgetEnforcer] = None
+        self._budget_files: List[Path] = []
+        # Bytes per token measured by the tokenizer on this run's files
+        self._bytes_per_token: float = BYTES_PER_TOKEN
+    
+    def _positive_int_option(self, name: str, default: int) -> int:
+        value = self.options.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"Invalid {name} '{value}'. Expected a positive integer.")
+        return value
+    
+    @property
+    def max_file_size(self) -> float:
+        """Default size above which files count as large."""
+        return self.large_files.max_file_size
+    
+    @max_file_size.setter
+    def max_file_size(self, value: float) -> None:
+        self.large_files.max_file_size = value
+    
+    @property
+    def duplicates(self) -> Dict[str, str]:
+        """Files of the last run emitted as stubs, mapped to the file they duplicate."""
+        return {section.rel_path: section.duplicate_of for section in self.sections if section.duplicate_of}
+    
+    @property
+    def near_duplicates(self) -> Dict[str, str]:
+        """Files of the last run emitted as diffs, mapped to the file they were diffed against."""
+        return {section.rel_path: section.similar_to for section in self.sections if section.similar_to}
+    
+    @property
+    def compact_saved_bytes(self) -> int:
+        """Bytes removed by compaction in the last run."""
+        return sum(section.compacted_bytes for section in self.sections)
+    
+    @property
+    def compact_saved_tokens(self) -> Optional[int]:
+        """Tokens removed by compaction in the last run, if counted."""
+        if self.tokenizer is None:
+            return None
+        return sum(section.compacted_tokens or 0 for section in self.sections)
+    
+    @property
+    def redactions(self) -> Dict[str, Dict[str, int]]:
+        """Files of the last run with secrets redacted, mapped to the count per signature."""
+        return {section.rel_path: section.redactions for section in self.sections if section.redactions}
+    
+    @property
+    def total_tokens(self) -> Optional[int]:
+        """Tokens in all file sections of the last run, if counted."""
+        if self.tokenizer is None:
+            return None
+        return sum(section.tokens or 0 for section in self.sections)
     
     def generate(self, files: List[Path], repo_path: Path) -> str:
         """Optimized generation with parallel file reading."""
-        sections = []
+        self.sections = []
+        files, stats = self._select_files(files, repo_path)
+        if self._record_format is not None:
+            buffer = io.BytesIO()
+            writer = StreamWriter(buffer)
+            self._write_head(writer, files, repo_path)
+            self._write_file_sections(writer, files, repo_path, stats)
+            self._write_tail(writer, self._rendered_files(files), repo_path)
+            return buffer.getvalue().decode('utf-8')
+        bodies = []
+        for section in self._iter_file_sections(files, repo_path, stats):
+            bodies.append(self._materialize(section.parts).decode('utf-8'))
+            self._record(section)
+        files = self._rendered_files(files)
+        return self.SECTION_SEPARATOR.join(self._document_head(files, repo_path) + bodies
+                                           + self._document_foot(files, repo_path))
+    
+    def generate_to_file(self, files: List[Path], repo_path: Path, output_path: Path) -> int:
+        """Stream the document to output_path and return the number of bytes written.
+        
+        Sections are written in order as they complete, so peak memory is
+        bounded by the reorder window rather than the size of the output.
+        Large file bodies are copied from disk by the kernel where possible.
+        The file is written to a temporary path and atomically renamed,
+        except when an incremental run can patch it in place; see
+        _patch_in_place.
+        
+        When the header or TOC report per-file results (token counts), the
+        file sections are streamed to a spool file next to the output first
+        and copied in after the header and TOC have been written.
+        
+        With a shard size configured, output_path becomes an index of the
+        parts; see _generate_shards.
+
+        With compression (the compress option, or a .gz/.xz/.zst suffix),
+        the document is compressed in parallel blocks as it is written; the
+        return value is then the compressed size.
         
-        # Add header
-        header = self._generate_header(repo_path, len(files))
-        sections.append(header)
+        The format option (or a .jsonl/.xml suffix) writes one record per
+        file instead of markdown; see llmd.formats.
+        """
+        compression = compression_for_path(output_path) if self._infer_compression else self.compression
+        self._check_compression(compression)
+        if self._infer_format:
+            self._set_output_format(format_for_path(output_path, COMPRESSION_SUFFIXES.values()))
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.sections = []
+        self.parts = []
+        self.reused_sections = 0
+        self.uncompressed_bytes = 0
+        self.index_path = None
+        if self.incremental:
+            # Loaded before planning so the budget can use its token counts
+            self._previous = SectionManifest.load(output_path, self._render_key())
+        try:
+            files, stats = self._select_files(files, repo_path)
+            if self.shard_limit is not None:
+                return self._generate_shards(files, stats, repo_path, output_path)
+            
+            # Where each section landed within the section stream
+            extents: List[_Extent] = []
+            sections: Optional[Iterator[FileSection]] = None
+            patched = None
+            if self._previous is not None and self._record_format is None:
+                patched, sections = self._patch_in_place(files, repo_path, stats, output_path, extents)
+            if patched is not None:
+                sections_start, head_lines, size = patched
+            else:
+                with (AtomicFileWriter(output_path) as file_writer,
+                      self._compressor(file_writer, compression) as writer):
+                    if not self._head_needs_results():
+                        head_lines = self._write_head(writer, files, repo_path)
+                        sections_start = writer.bytes_written
+                        self._write_file_sections(writer, files, repo_path, stats, extents, sections)
+                        self._write_tail(writer, self._rendered_files(files), repo_path)
+                    else:
+                        with tempfile.TemporaryFile(dir=output_path.parent) as spool_file:
+                            spool = StreamWriter(spool_file)
+                            self._write_file_sections(spool, files, repo_path, stats, extents, sections)
+                            head_lines = self._write_head(writer, self._rendered_files(files), repo_path)
+                            sections_start = writer.bytes_written
+                            writer.copy_from(spool_file, 0, spool.bytes_written)
+                size = file_writer.bytes_written
+        finally:
+            self._previous = None
+        
+        if self.incremental:
+            self._save_manifest(output_path, sections_start, extents)
+        if self.write_index:
+            index = OutputIndex(output_path, self.output_format, compression)
+            self._add_index_entries(index, self.sections, extents, sections_start, head_lines)
+            self.index_path = index.save()
+        if compression is not None:
+            self.uncompressed_bytes = writer.bytes_written
+        return size
+    
+    def _check_compression(self, compression: Optional[str]) -> None:
+        """Reject compression with the outputs it cannot be combined with, or at a level it does not have."""
+        if compression is None:
+            return
+        if self.shard_limit is not None:
+            raise ValueError(f"Invalid compress '{compression}': it cannot be combined with shard_size.")
+        if self.incremental:
+            raise ValueError(f"Invalid compress '{compression}': it cannot be combined with incremental.")
+        if self.compress_level is not None:
+            check_compress_level(compression, self.compress_level)
+    
+    def _set_output_format(self, output_format: str) -> None:
+        """Use an output format for the following runs."""
+        self._check_format(output_format)
+        self.output_format = output_format
+        self._record_format: Optional[RecordFormat] = get_record_format(output_format)
+    
+    def _check_format(self, output_format: str) -> None:
+        """Reject record formats with the outputs that only exist as markdown."""
+        if output_format == 'markdown':
+            return
+        if self.shard_limit is not None:
+            raise ValueError(f"Invalid format '{output_format}': it cannot be combined with shard_size.")
+        if self.incremental:
+            raise ValueError(f"Invalid format '{output_format}': it cannot be combined with incremental.")
+    
+    def _compressor(self, writer: AtomicFileWriter, compression: Optional[str]):
+        """Context manager for the writer sections go to: writer itself, or a compressor feeding it."""
+        if compression is None:
+            return nullcontext(writer)
+        return CompressedWriter(writer, compression, level=self.compress_level)
+    
+    def _add_index_entries(self, index: OutputIndex, sections: List[FileSection], extents: List[_Extent],
+                           sections_start: int, head_lines: int, part: Optional[str] = None) -> None:
+        """Add the sections written after a head of head_lines line breaks to the output index."""
+        # A record ends with a line break, which does not start another line of it
+        trailing = 1 if self._record_format is not None else 0
+        for section, extent in zip(sections, extents):
+            start_line = head_lines + extent.line + 1
+            index.add(IndexEntry(
+                section.rel_path, sections_start + extent.offset, extent.length,
+                start_line, start_line + max(extent.newlines - trailing, 0),
+                extent.tokens, section.content_hash, section.title, part,
+            ))
+    
+    def _patch_in_place(self, files: List[Path], repo_path: Path, stats: Optional[List[Optional[os.stat_result]]],
+                        output_path: Path, extents: List[_Extent]
+                        ) -> Tuple[Optional[Tuple[int, int, int]], Iterator[FileSection]]:
+        """Update the previous output in place if every section still fits where it was.
+        
+        That is the case when the same files are rendered in the same order,
+        each changed file renders to as many bytes as its previous section,
+        and the header and TOC (or stable foot) keep their length too. Only
+        those are then written; unchanged sections are not touched.
+        
+        Returns (sections_start, head_lines, size) if the output was patched.
+        Otherwise returns None and the sections rendered so far followed by
+        the rest, which the caller writes as a new output, copying unchanged
+        sections from the previous one. Patching is not atomic: if it is
+        interrupted, the output no longer matches its manifest, so the next
+        run regenerates it in full.
+        """
+        separator = self.SECTION_SEPARATOR.encode('utf-8')
+        rendered = self._iter_file_sections(files, repo_path, stats)
+        sections: List[FileSection] = []
+        changed: List[Tuple[int, bytes]] = []
+        start = end = None
+        for section in rendered:
+            sections.append(section)
+            extent = self._previous.extent(section.rel_path)
+            if extent is None:
+                break
+            offset, length = extent
+            if start is None:
+                start = end = offset - len(separator)
+            if offset != end + len(separator):
+                break
+            parts = section.parts
+            if (len(parts) == 1 and isinstance(parts[0], FileSpan) and parts[0].path == output_path
+                    and parts[0].offset == offset):
+                size = parts[0].length
+            else:
+                body = self._materialize(parts)
+                size = len(body)
+                changed.append((offset, body))
+            if size != length:
+                break
+            end = offset + length
+        else:
+            if start is not None:
+                patched = self._write_patches(sections, files, repo_path, output_path, start, end, changed, extents)
+                if patched is not None:
+                    return patched, iter(())
+        return None, itertools.chain(sections, rendered)
+    
+    def _write_patches(self, sections: List[FileSection], files: List[Path], repo_path: Path, output_path: Path,
+                       start: int, end: int, changed: List[Tuple[int, bytes]], extents: List[_Extent]
+                       ) -> Optional[Tuple[int, int, int]]:
+        """Write the changed sections and the new head and tail over the previous output.
+        
+        Returns None, writing nothing, if the head or tail changed length.
+        """
+        for section in sections:
+            self._record(section)
+        rendered_files = self._rendered_files(files)
+        head = self.SECTION_SEPARATOR.join(self._document_head(rendered_files, repo_path)).encode('utf-8')
+        tail = b''
+        if self.stable:
+            foot = self._document_foot(rendered_files, repo_path)
+            tail = (self.SECTION_SEPARATOR + self.SECTION_SEPARATOR.join(foot)).encode('utf-8')
+        try:
+            size = output_path.stat().st_size
+        except OSError:
+            size = None
+        if len(head) != start or size != end + len(tail):
+            self.sections = []
+            return None
+        
+        with open(output_path, 'r+b') as f:
+            f.write(head)
+            for offset, body in changed:
+                f.seek(offset)
+                f.write(body)
+            f.seek(end)
+            f.write(tail)
+        
+        separator_newlines = self.SECTION_SEPARATOR.count('\n')
+        offset = start
+        line = 0
+        for section in sections:
+            offset += len(self.SECTION_SEPARATOR)
+            line += separator_newlines
+            length = self._parts_size(section.parts)
+            newlines = self._section_newlines(section) if self.write_index else 0
+            extents.append(_Extent(offset - start, length, line, newlines, section.tokens))
+            offset += length
+            line += newlines
+        return start, head.count(b'\n'), size
+    
+    def _save_manifest(self, output_path: Path, sections_start: int, extents: List[_Extent]) -> None:
+        """Record where every section of the new output starts, for the next incremental run."""
+        manifest = SectionManifest(output_path, self._render_key())
+        for section, extent in zip(self.sections, extents):
+            # Like the section cache, skip error sections: they have no source hash.
+            # Stubs and diffs depend on other files, so they are always re-rendered.
+            if (section.stat is not None and section.source_hash is not None
+                    and not section.duplicate_of and not section.similar_to):
+                manifest.add(section.rel_path, sections_start + extent.offset, extent.length, section.stat,
+                             section.tokens, section.content_hash, section.source_hash)
+        try:
+            manifest.save()
+        except OSError:
+            # Without a manifest the next run simply regenerates everything
+            pass
+    
+    def _render_key(self) -> str:
+        """Settings that change how a file section is rendered.
+        
+        Cached and previously written sections are only reused when this
+        matches.
+        """
+        tokenizer = self.tokenizer.name if self.tokenizer else 'none'
+        key = f"llmd {__version__}; {self.large_files.describe()}; tokenizer={tokenizer}"
+        if self.compact:
+            key += "; compact"
+        if self.outline:
+            patterns = ','.join(self.outline_patterns) if self.outline_patterns else 'all'
+            key += f"; outline={patterns}; outline_docstrings={self.outline_docstrings}"
+        if self.redact:
+            patterns = ','.join(f"{name}={pattern}" for name, pattern in self.redact_patterns)
+            key += f"; redact={patterns}; redact_entropy={self.redact_entropy}"
+        return key
+    
+    def _generate_shards(self, files: List[Path], stats: Optional[List[Optional[os.stat_result]]],
+                         repo_path: Path, output_path: Path) -> int:
+        """Write the document as parts of at most shard_limit each, plus an index.
         
-        # Generate TOC
-        toc = self._generate_toc(files, repo_path)
-        sections.append(toc)
+        Sections are assigned to parts in order. A section that would push a
+        part over the limit starts the next part; a section too large for any
+        part on its own is split into pieces by lines. Each finished part is
+        spooled, then written (header, TOC, sections) on a background thread
+        while the next part is being filled. Parts are committed together
+        once all of them are written, and the index is written last.
+        """
+        separator = self.SECTION_SEPARATOR.encode('utf-8')
+        separator_newlines = separator.count(b'\n')
+        limit = self.shard_limit.amount
+        head_size = self._shard_head_size(repo_path)
+        filled: List[_OutputPart] = []
+        finished: List[Any] = []
+        current: Optional[_OutputPart] = None
+        writers: List[AtomicFileWriter] = []
+        
+        with ThreadPoolExecutor(max_workers=min(4, self.max_workers)) as pool:
+            try:
+                for section in self._iter_file_sections(files, repo_path, stats):
+                    self._record(section)
+                    for piece in self._split_for_shard(section, repo_path, limit - head_size):
+                        size = self._shard_units(piece)
+                        if current is not None and current.sections and current.size + size > limit:
+                            filled.append(current)
+                            finished.append(pool.submit(self._write_part, current, repo_path, output_path))
+                            current = None
+                        if current is None:
+                            index = len(finished) + 1
+                            spool = tempfile.TemporaryFile(dir=output_path.parent)
+                            current = _OutputPart(index, part_path(output_path, index), spool,
+                                                  StreamWriter(spool), size=head_size)
+                        current.writer.write(separator)
+                        current.lines += separator_newlines
+                        offset = current.writer.bytes_written
+                        current.writer.write_parts(piece.parts)
+                        newlines = self._section_newlines(piece) if self.write_index else 0
+                        current.extents.append(_Extent(offset, current.writer.bytes_written - offset,
+                                                       current.lines, newlines, piece.tokens))
+                        current.lines += newlines
+                        current.sections.append(replace(piece, parts=[]))
+                        current.size += size
+                if current is not None:
+                    filled.append(current)
+                    finished.append(pool.submit(self._write_part, current, repo_path, output_path))
+                    current = None
+                for future in finished:
+                    writers.append(future.result())
+            except BaseException:
+                if current is not None:
+                    current.spool.close()
+                for future in finished:
+                    try:
+                        future.result().abort()
+                    except Exception:
+                        pass
+                raise
+        
+        for writer in writers:
+            writer.commit()
+        self.parts = [writer.path for writer in writers]
+        for stale in stale_parts(output_path, len(self.parts)):
+            stale.unlink()
+        
+        with AtomicFileWriter(output_path) as index_writer:
+            index_writer.write_text(self._generate_index(self._rendered_files(files), repo_path, filled, writers))
+        if self.write_index:
+            index = OutputIndex(output_path, self.output_format)
+            for part, writer in zip(filled, writers):
+                self._add_index_entries(index, part.sections, part.extents, part.sections_start, part.head_lines,
+                                        part=writer.path.name)
+            self.index_path = index.save()
+        return sum(writer.bytes_written for writer in writers) + index_writer.bytes_written
+    
+    def _write_part(self, part: _OutputPart, repo_path: Path, output_path: Path) -> AtomicFileWriter:
+        """Write one part (header, TOC, spooled sections) without committing it."""
+        writer = AtomicFileWriter(part.path)
+        try:
+            head = [
+                self._generate_header(repo_path, len(part.sections), self._sum_tokens(part.sections),
+                                      part_note=f"Part: {part.index} (index: [{output_path.name}]({output_path.name}))"),
+                self._generate_section_toc(part.sections),
+            ]
+            text = self.SECTION_SEPARATOR.join(head)
+            writer.write_text(text)
+            part.sections_start, part.head_lines = writer.bytes_written, text.count('\n')
+            writer.copy_from(part.spool, 0, part.writer.bytes_written)
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            part.spool.close()
+        return writer
+    
+    def _shard_units(self, section: FileSection) -> int:
+        """What a section adds to a part, in the shard limit's unit, including its TOC line."""
+        title = section.title or section.rel_path
+        entry = f"99999. [{title}](#{self._generate_anchor(title)})"
+        entry += self._toc_note(section)
+        if self.shard_limit.unit == 'tokens':
+            return (section.tokens or 0) + self.tokenizer.count_text(entry + " (99,999,999 tokens)\n")
+        body = self._parts_size(section.parts)
+        if section.tokens is not None:
+            entry += " (99,999,999 tokens)"
+        return body + len(self.SECTION_SEPARATOR) + len(entry.encode('utf-8')) + 1
+    
+    def _shard_head_size(self, repo_path: Path) -> int:
+        """Upper bound of a part's header and TOC heading, in the shard limit's unit."""
+        header = self._generate_header(repo_path, 99999, 0 if self.tokenizer else None,
+                                       part_note="Part: 99999 (index: [llm-context.md](llm-context.md))")
+        head = header + self.SECTION_SEPARATOR + "## Table of Contents\n"
+        if self.shard_limit.unit == 'tokens':
+            # Leave room for a longer tokens figure in the header
+            return self.tokenizer.count_text(head) + 8
+        return len(head.encode('utf-8')) + 32
+    
+    def _split_for_shard(self, section: FileSection, repo_path: Path, capacity: int) -> List[FileSection]:
+        """Split a section that cannot fit in any part into pieces, by lines.
+        
+        Each piece is a complete section titled "path (part k of n)"; joined
+        back together the piece bodies give the original file. Sections that
+        fit, and notices or errors that are not a code block, are returned
+        unchanged.
+        """
+        if self._shard_units(section) <= capacity:
+            return [section]
+        
+        language = self._get_language(Path(section.rel_path))
+        head = self._section_head(section.rel_path, language)
+        tail = self.SECTION_TAIL
+        data = self._materialize(section.parts)
+        if not data.startswith(head) or not data.endswith(tail):
+            return [section]
+        body = data[len(head):len(data) - len(tail)]
+        
+        if self.shard_limit.unit == 'tokens':
+            measure = self.tokenizer.count
+        else:
+            measure = len
+        probe_head = self._section_head(f"{section.rel_path} (part 9999 of 9999)", language)
+        probe = FileSection(section.rel_path, [probe_head + tail],
+                            self.tokenizer.count(probe_head + tail) if self.tokenizer else None,
+                            title=f"{section.rel_path} (part 9999 of 9999)")
+        body_capacity = max(1, capacity - self._shard_units(probe))
+        
+        chunks: List[List[bytes]] = []
+        chunk: List[bytes] = []
+        used = 0
+        for line in body.splitlines(keepends=True):
+            cost = measure(line)
+            if chunk and used + cost > body_capacity:
+                chunks.append(chunk)
+                chunk, used = [], 0
+            chunk.append(line)
+            used += cost
+        if chunk:
+            chunks.append(chunk)
+        if len(chunks) <= 1:
+            return [section]
+        
+        pieces = []
+        for k, lines in enumerate(chunks, 1):
+            text = b''.join(lines)
+            # The newline between pieces is supplied by the closing fence
+            if k < len(chunks) and text.endswith(b'\n'):
+                text = text[:-1]
+            title = f"{section.rel_path} (part {k} of {len(chunks)})"
+            piece = self._section_head(title, language) + text + tail
+            tokens = self.tokenizer.count(piece) if self.tokenizer else None
+            pieces.append(FileSection(section.rel_path, [piece], tokens, section.content_hash, title=title))
+        return pieces
+    
+    def _sum_tokens(self, sections: List[FileSection]) -> Optional[int]:
+        """Total tokens of some sections, if counted."""
+        if self.tokenizer is None:
+            return None
+        return sum(section.tokens or 0 for section in sections)
+    
+    def _generate_index(self, files: List[Path], repo_path: Path, parts: List[_OutputPart],
+                        writers: List[AtomicFileWriter]) -> str:
+        """The master index: document header plus the parts and their files."""
+        header = self._generate_header(repo_path, len(files), self.total_tokens, len(self.omitted),
+                                       part_note=f"Parts: {len(writers)}")
+        lines = ["## Parts\n"]
+        for part, writer in zip(parts, writers):
+            name = writer.path.name
+            sections = part.sections
+            file_count = len({section.rel_path for section in sections})
+            summary = f"{file_count} file{'s' if file_count != 1 else ''}, {writer.bytes_written:,} bytes"
+            tokens = self._sum_tokens(sections)
+            if tokens is not None:
+                summary += f", {tokens:,} tokens"
+            lines.append(f"{part.index}. [{name}]({name}) ({summary})")
+            for section in sections:
+                lines.append(f"   - {section.title or section.rel_path}")
+        if self.omitted:
+            lines.append(f"\nOmitted to fit the {self.max_tokens:,}-token budget:\n")
+            for file in self.omitted:
+                lines.append(f"- {file.relative_to(repo_path)}")
+        head = [header, self._repo_map] if self._repo_map is not None else [header]
+        foot = []
+        if self.stable:
+            foot.append("---\n\n" + self._header_fields(repo_path, len(files), self.total_tokens, len(self.omitted),
+                                                        part_note=f"Parts: {len(writers)}"))
+        return self.SECTION_SEPARATOR.join(head + ['\n'.join(lines)] + foot)
+    
+    def _select_files(self, files: List[Path], repo_path: Path
+                      ) -> Tuple[List[Path], Optional[List[Optional[os.stat_result]]]]:
+        """Apply the token budget, returning the files to render and their stats.
+        
+        Planning uses stat data: section sizes are exact where a count for
+        the same (path, size, mtime) is known, and estimated from the file
+        size otherwise, at the bytes per token the tokenizer measures on the
+        first bytes of a few of the files. Estimates can still be low, so
+        the plan is enforced on exact counts while rendering; see
+        _enforce_budget.
+        """
+        self.budget = None
+        self.omitted = []
+        self._budget_enforcer = None
+        self._repo_map = self._render_repo_map(files, repo_path) if self.repo_map else None
+        if self.max_tokens is None:
+            return self._stable_order(files, None, repo_path) if self.stable else (files, None)
+        self._open_cache(repo_path)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            stats = self._stat_files(files, executor)
+        
+        rel_paths = [str(file.relative_to(repo_path)) for file in files]
+        self._bytes_per_token = self._calibrate_estimates(files, rel_paths, stats)
+        candidates = []
+        for rel_path, st in zip(rel_paths, stats):
+            tokens, exact = self._section_token_estimate(rel_path, st)
+            candidates.append(BudgetCandidate(rel_path, st.st_size if st else 0, st.st_mtime if st else 0.0,
+                                              tokens, exact))
+        score_candidates(candidates, self.include_patterns)
+        
+        # Header, TOC lines and separators are charged before any file
+        reserved = 64 + sum(toc_entry_tokens(Path(c.rel_path)) for c in candidates)
+        if self._repo_map is not None:
+            reserved += estimate_tokens(len(self._repo_map.encode('utf-8')))
+        self.budget = plan_budget(candidates, self.max_tokens, reserved)
+        self._budget_enforcer = BudgetEnforcer(candidates, self.budget)
+        self._budget_files = files
+        self.omitted = [files[i] for i in self.budget.omitted]
+        files, stats = [files[i] for i in self.budget.selected], [stats[i] for i in self.budget.selected]
+        return self._stable_order(files, stats, repo_path) if self.stable else (files, stats)
+    
+    def _rendered_files(self, files: List[Path]) -> List[Path]:
+        """The files of a run without those the budget dropped while rendering."""
+        if self._budget_enforcer is None or not self._budget_enforcer.dropped:
+            return files
+        omitted = set(self.omitted)
+        return [file for file in files if file not in omitted]
+    
+    def _calibrate_estimates(self, files: List[Path], rel_paths: List[str],
+                             stats: List[Optional[os.stat_result]]) -> float:
+        """Bytes per token for the size estimates, measured on a sample of the files.
+        
+        Only files whose count is not known and whose body is the file
+        itself are sampled, spread evenly over the list.
+        """
+        sampled = [i for i, (rel_path, st) in enumerate(zip(rel_paths, stats))
+                   if st is not None and st.st_size and not self._section_token_estimate(rel_path, st)[1]
+                   and rel_path not in self.generated and not self.large_files.is_large(rel_path, st.st_size)]
+        step = max(1, len(sampled) // self.CALIBRATION_FILES)
+        samples = []
+        for i in sampled[::step][:self.CALIBRATION_FILES]:
+            try:
+                with open(files[i], 'rb') as f:
+                    samples.append(f.read(self.CALIBRATION_BYTES))
+            except OSError:
+                continue
+        return calibrate_bytes_per_token(samples, self.tokenizer)
+    
+    def _stable_order(self, files: List[Path], stats: Optional[List[Optional[os.stat_result]]], repo_path: Path
+                      ) -> Tuple[List[Path], Optional[List[Optional[os.stat_result]]]]:
+        """Order files from least to most recently changed, for stable output.
+        
+        Committed files come first, by the time of the last commit touching
+        them; files with uncommitted changes, untracked files and files
+        outside git follow, by mtime. Ties keep path order.
+        """
+        rel_paths = [file.relative_to(repo_path).as_posix() for file in files]
+        commit_times = last_commit_times(repo_path, rel_paths)
+        dirty = modified_files(repo_path) if commit_times else set()
+        if stats is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                stats = self._stat_files(files, executor)
+        keys = []
+        for rel_path, st in zip(rel_paths, stats):
+            if rel_path in commit_times and rel_path not in dirty:
+                keys.append((0, commit_times[rel_path]))
+            else:
+                keys.append((1, st.st_mtime_ns if st else 0))
+        order = sorted(range(len(files)), key=keys.__getitem__)
+        return [files[i] for i in order], [stats[i] for i in order]
+    
+    def _render_repo_map(self, files: List[Path], repo_path: Path) -> str:
+        """The repository map, marking the files selected by the scan."""
+        rel_paths = [file.relative_to(repo_path).as_posix() for file in files]
+        if self.inventory is None:
+            inventory = RepoInventory.from_files(files, repo_path)
+        else:
+            # Selected files in directories the inventory did not walk are added
+            missing = [file for file, rel_path in zip(files, rel_paths) if rel_path not in self.inventory.files]
+            inventory = self.inventory
+            if missing:
+                inventory = RepoInventory({**self.inventory.files, **RepoInventory.from_files(missing, repo_path).files},
+                                          self.inventory.skipped)
+        return render_repo_map(inventory, set(rel_paths), repo_path.resolve().name,
+                               self.repo_map_depth, self.repo_map_collapse)
+    
+    def _section_token_estimate(self, rel_path: str, st: Optional[os.stat_result]) -> Tuple[int, bool]:
+        """Tokens a file's section will take, and whether the number is exact."""
+        if st is None:
+            return 0, False
+        known = self._known_tokens.get((rel_path, st.st_size, st.st_mtime_ns))
+        if known is None and self._previous is not None:
+            previous = self._previous.lookup(rel_path, st)
+            known = previous.tokens if previous else None
+        if known is None and self.section_cache is not None:
+            known = self.section_cache.peek_tokens(rel_path, st, self.tokenizer.name)
+        if known is not None:
+            return known, True
+        body = st.st_size
+        if rel_path in self.generated:
+            body = len(self._generated_notice(self.generated[rel_path]))
+        elif self.large_files.is_large(rel_path, st.st_size):
+            body = self.large_files.estimated_size(st.st_size) or len(self.TOO_LARGE_NOTICE)
+        # Heading, language tag and code fence
+        framing = 8 + estimate_tokens(len(rel_path), self._bytes_per_token)
+        return framing + estimate_tokens(body, self._bytes_per_token), False
+    
+    def _head_needs_results(self) -> bool:
+        """Whether the header or TOC depend on the rendered file sections."""
+        if self._record_format is not None or self.stable:
+            return False
+        return self.tokenizer is not None or self.dedupe or self.near_duplicate_threshold is not None
+    
+    def _document_head(self, files: List[Path], repo_path: Path) -> List[str]:
+        """The header and TOC, using results recorded in self.sections.
+        
+        Stable output only has the title here; the rest is in _document_foot.
+        """
+        if self.stable:
+            return [self._generate_title(repo_path)]
+        head = [self._generate_header(repo_path, len(files), self.total_tokens, len(self.omitted))]
+        if self._repo_map is not None:
+            head.append(self._repo_map)
+        head.append(self._generate_toc(files, repo_path, self.sections if self._head_needs_results() else None,
+                                       self.omitted))
+        return head
+    
+    def _document_foot(self, files: List[Path], repo_path: Path) -> List[str]:
+        """What stable output has after the sections: the header fields, map and TOC."""
+        if not self.stable:
+            return []
+        foot = ["---\n\n" + self._header_fields(repo_path, len(files), self.total_tokens, len(self.omitted))]
+        if self._repo_map is not None:
+            foot.append(self._repo_map)
+        foot.append(self._generate_toc(files, repo_path, self.sections, self.omitted))
+        return foot
+    
+    def _write_head(self, writer: StreamWriter, files: List[Path], repo_path: Path) -> int:
+        """Write the header and TOC (or what precedes the records of a record format).
+        
+        Returns the number of line breaks written.
+        """
+        if self._record_format is not None:
+            attributes: Dict[str, Any] = {'repository': repo_path.name}
+            if not self.stable:
+                attributes['generated'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                attributes['files'] = len(files)
+            head = self._record_format.document_start(attributes)
+        else:
+            head = self.SECTION_SEPARATOR.join(self._document_head(files, repo_path)).encode('utf-8')
+        writer.write(head)
+        return head.count(b'\n')
+    
+    def _write_tail(self, writer: StreamWriter, files: List[Path], repo_path: Path) -> None:
+        """Write what follows the last record of a record format, or the foot of stable markdown."""
+        if self._record_format is not None:
+            writer.write(self._record_format.document_end(
+                [str(file.relative_to(repo_path)) for file in self.omitted]))
+        elif self.stable:
+            foot = self._document_foot(files, repo_path)
+            writer.write((self.SECTION_SEPARATOR + self.SECTION_SEPARATOR.join(foot)).encode('utf-8'))
+    
+    def _write_file_sections(self, writer: StreamWriter, files: List[Path], repo_path: Path,
+                             stats: Optional[List[Optional[os.stat_result]]] = None,
+                             extents: Optional[List[_Extent]] = None,
+                             sections: Optional[Iterator[FileSection]] = None) -> None:
+        """Write every file section, each preceded by the section separator.
+        
+        With a record format, each section is written as a record instead.
+        If extents is given, where each section was written relative to the
+        first separator is appended to it. If sections is given, it is
+        written instead of rendering the files.
+        """
+        separator = self.SECTION_SEPARATOR.encode('utf-8')
+        separator_newlines = separator.count(b'\n')
+        records = self._record_format
+        start = writer.bytes_written
+        line = 0
+        if sections is None:
+            sections = self._iter_file_sections(files, repo_path, stats)
+        for section in sections:
+            if records is None:
+                writer.write(separator)
+                line += separator_newlines
+            offset = writer.bytes_written
+            if records is None:
+                writer.write_parts(section.parts)
+                newlines = self._section_newlines(section) if self.write_index else 0
+                tokens = section.tokens
+            else:
+                newlines, tokens = self._write_record(records, writer, section)
+            if extents is not None:
+                extents.append(_Extent(offset - start, writer.bytes_written - offset, line, newlines, tokens))
+            line += newlines
+            self._record(section)
+    
+    def _write_record(self, records: RecordFormat, writer: StreamWriter, section: FileSection
+                      ) -> Tuple[int, Optional[int]]:
+        """Write a section as a record: its file body plus what is known about the file.
+        
+        Returns the line breaks written and the tokens of the content.
+        """
+        head, language, body = self._split_section(section)
+        tokens = section.tokens
+        if tokens is not None:
+            tokens -= self._framing_tokens(head, self.SECTION_TAIL)
+        fields: Dict[str, Any] = {
+            'path': section.rel_path,
+            'language': language,
+            'size': section.stat.st_size if section.stat is not None else None,
+            'tokens': tokens,
+        }
+        if section.duplicate_of:
+            fields['duplicate_of'] = section.duplicate_of
+        if section.similar_to:
+            fields['similar_to'] = section.similar_to
+        if section.outlined:
+            fields['outline'] = True
+        if section.rel_path in self.generated:
+            fields['generated'] = self.generated[section.rel_path]
+        if section.redactions:
+            fields['redactions'] = sum(section.redactions.values())
+        return records.write_record(writer, fields, body), tokens
+    
+    def _section_newlines(self, section: FileSection) -> int:
+        """Line breaks in a rendered section.
         
-        # Process files in parallel
-        file_sections = self._process_files_parallel(files, repo_path)
-        sections.extend(file_sections)
+        Spans of files validated in this run were counted on the way; spans
+        reused from the section cache or a previous output are read back.
+        """
+        count = 0
+        spans = []
+        for part in section.parts:
+            if isinstance(part, bytes):
+                count += part.count(b'\n')
+            else:
+                spans.append(part)
+        if len(spans) == 1 and section.span_newlines is not None:
+            return count + section.span_newlines
+        return count + sum(span.count_newlines() for span in spans)
+    
+    def _split_section(self, section: FileSection) -> Tuple[bytes, str, List[SectionPart]]:
+        """The heading, language and body parts of a rendered section.
         
-        return '\n\n'.join(sections)
+        Sections start with their heading as literal bytes and end with the
+        closing fence, with the body (bytes or a span of the file) between.
+        """
+        parts = list(section.parts)
+        first = parts[0]
+        fence = first.index(b"\n\n```") + len(b"\n\n```")
+        end = first.index(b"\n", fence) + 1
+        parts[0] = first[end:]
+        last = parts[-1]
+        parts[-1] = last[:len(last) - len(self.SECTION_TAIL)]
+        return first[:end], first[fence:end - 1].decode('utf-8'), parts
+    
+    def _record(self, section: FileSection) -> None:
+        """Keep a section's results for the header, TOC and reporting."""
+        self.sections.append(replace(section, parts=[], signature=None))
+    
+    def _parts_size(self, parts: List[SectionPart]) -> int:
+        """Length of a section in bytes, without reading spliced ranges."""
+        return sum(len(part) if isinstance(part, bytes) else part.length for part in parts)
+    
+    def _materialize(self, parts: List[SectionPart]) -> bytes:
+        """Join a section's parts into bytes, reading spliced ranges from disk."""
+        return b''.join(part if isinstance(part, bytes) else part.read() for part in parts)
     
     def _process_files_parallel(self, files: List[Path], repo_path: Path) -> List[str]:
         """Process multiple files in parallel."""
-        file_sections = [None] * len(files)
+        return [
+            self._materialize(section.parts).decode('utf-8')
+            for section in self._iter_file_sections(files, repo_path)
+        ]
+    
+    def _iter_file_sections(self, files: List[Path], repo_path: Path,
+                            stats: Optional[List[Optional[os.stat_result]]] = None) -> Iterator[FileSection]:
+        """Yield file sections in file order while reading ahead in parallel.
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all file processing tasks
-            future_to_index = {
-                executor.submit(self._generate_file_section_optimized, file, repo_path): i
-                for i, file in enumerate(files)
-            }
+        Files are grouped into read units (single large files or batches of
+        small ones). At most ``max_in_flight`` units and ``max_in_flight_bytes``
+        of file content are in flight at once; see WindowedScheduler. Stats
+        from an earlier pass can be passed in to avoid a second stat call.
+        """
+        self._open_cache(repo_path)
+        self._open_cpu_stage()
+        try:
+            sections = self._render_sections(files, repo_path, stats)
+            if self.dedupe:
+                sections = self._deduplicate(sections)
+            if self.near_duplicate_threshold is not None:
+                sections = self._collapse_near_duplicates(sections, repo_path)
+            if self._budget_enforcer is not None:
+                sections = self._enforce_budget(sections)
+            yield from sections
+        finally:
+            self._close_cpu_stage()
+            self._close_cache()
+    
+    def _render_sections(self, files: List[Path], repo_path: Path,
+                         stats: Optional[List[Optional[os.stat_result]]]) -> Iterator[FileSection]:
+        """Body of _iter_file_sections, run while the section cache is open."""
+        # A reader thread waits while the CPU stage transforms its batch, so
+        # there must be at least one per worker process to keep them all busy
+        with ThreadPoolExecutor(max_workers=max(self.max_workers, self.cpu_workers)) as executor:
+            if stats is None:
+                stats = self._stat_files(files, executor)
+            sizes = [st.st_size if st else 0 for st in stats]
+            units = self._plan_read_units(sizes)
+            weights = [sum(sizes[i] for i in unit) for unit in units]
+            keys = self._read_order_keys(files, repo_path, stats, units, weights, executor)
+            
+            def render(unit: List[int]) -> List[FileSection]:
+                return self._render_unit([files[i] for i in unit], repo_path, [stats[i] for i in unit])
+            
+            if self.auto_tune:
+                self.concurrency = AdaptiveConcurrency(self.max_workers)
+                render = self._throttled(render, self.concurrency, sizes)
             
-            # Collect results as they complete
-            for future in as_completed(future_to_index):
-                index = future_to_index[future]
+            scheduler = WindowedScheduler(executor, self.max_in_flight, self.max_in_flight_bytes)
+            for unit, future in zip(units, scheduler.map(render, units, weights, keys)):
                 try:
-                    file_sections[index] = future.result()
+                    sections = future.result()
                 except Exception as e:
                     # Handle errors gracefully
-                    file_sections[index] = f"## Error processing file\n\n```\n{str(e)}\n```"
+                    sections = [self._error_section(files[i], repo_path, e) for i in unit]
+                for i, section in zip(unit, sections):
+                    st = section.stat = stats[i]
+                    if section.tokens is not None and st is not None:
+                        self._known_tokens[(section.rel_path, st.st_size, st.st_mtime_ns)] = section.tokens
+                    yield section
+    
+    def _enforce_budget(self, sections: Iterator[FileSection]) -> Iterator[FileSection]:
+        """Leave out sections whose exact tokens would take the files over max_tokens.
+        
+        The files planned from estimates are admitted as their sections
+        arrive; see BudgetEnforcer. Files it drops are moved from the plan's
+        selection to the omitted files.
+        """
+        enforcer = self._budget_enforcer
+        indices = {candidate.rel_path: i for i, candidate in enumerate(enforcer.candidates)}
+        for section in sections:
+            if enforcer.admit(indices[section.rel_path], section.tokens or 0):
+                yield section
+        if enforcer.dropped:
+            budget = self.budget
+            budget.selected = [i for i in budget.selected if i not in enforcer.dropped]
+            budget.omitted = sorted(budget.omitted + enforcer.dropped)
+            budget.planned_tokens = sum(enforcer.candidates[i].tokens for i in budget.selected)
+            self.omitted = [self._budget_files[i] for i in budget.omitted]
+    
+    def _deduplicate(self, sections: Iterator[FileSection]) -> Iterator[FileSection]:
+        """Replace sections of files identical to an earlier file with stubs.
+        
+        Files are matched by the hash of their contents, computed alongside
+        the rest of the rendering. Files without a complete read (errors,
+        oversized files) are never matched.
+        """
+        self.dedupe_saved_bytes = self.dedupe_saved_tokens = 0
+        first: Dict[bytes, str] = {}
+        for section in sections:
+            original = first.setdefault(section.source_hash, section.rel_path) if section.source_hash else None
+            if original is not None and original != section.rel_path:
+                stub = self._duplicate_stub(section, original)
+                self.dedupe_saved_bytes += self._parts_size(section.parts) - self._parts_size(stub.parts)
+                if section.tokens is not None:
+                    self.dedupe_saved_tokens += section.tokens - stub.tokens
+                section = stub
+            yield section
+    
+    def _duplicate_stub(self, section: FileSection, original: str) -> FileSection:
+        """Short section standing in for a file identical to original."""
+        head = self._section_head(section.rel_path, self._get_language(Path(section.rel_path)))
+        tail = self.SECTION_TAIL
+        body = f"[Identical to {original} - content omitted]".encode('utf-8')
+        tokens = self._framing_tokens(head, tail) + self.tokenizer.count(body) if self.tokenizer else None
+        return replace(section, parts=[head + body + tail], tokens=tokens, duplicate_of=original, redactions=None)
+    
+    def _collapse_near_duplicates(self, sections: Iterator[FileSection], repo_path: Path) -> Iterator[FileSection]:
+        """Replace sections of files similar to an earlier file with a diff against it.
+        
+        Sections stream in output order, so the first file of each group of
+        similar files is emitted in full and becomes the representative the
+        later ones are diffed against. Candidates are found through an LSH
+        index over the MinHash signatures computed during rendering; a diff
+        is only used when it is shorter than the file itself.
+        """
+        self.near_duplicate_saved_bytes = self.near_duplicate_saved_tokens = 0
+        index = NearDuplicateIndex(self.near_duplicate_threshold)
+        bodies = BodyCache(self.near_duplicate_memory)
+        for section in sections:
+            if section.signature is None or section.duplicate_of:
+                yield section
+                continue
+            body = self._section_body(section)
+            match = index.match(section.signature) if body is not None else None
+            if match is not None:
+                diff_section = self._near_duplicate_diff(section, body, match[0], bodies, repo_path)
+                if diff_section is not None:
+                    self.near_duplicate_saved_bytes += (self._parts_size(section.parts)
+                                                        - self._parts_size(diff_section.parts))
+                    if section.tokens is not None:
+                        self.near_duplicate_saved_tokens += section.tokens - diff_section.tokens
+                    yield diff_section
+                    continue
+            if body is not None:
+                index.add(section.rel_path, section.signature)
+                bodies.put(section.rel_path, body)
+            yield section
+    
+    def _near_duplicate_diff(self, section: FileSection, body: bytes, original: str, bodies: BodyCache,
+                             repo_path: Path) -> Optional[FileSection]:
+        """Section holding the diff from original to section, if it is shorter than the file."""
+        original_body = bodies.get(original)
+        if original_body is None:
+            # Evicted from memory: render the representative again
+            original_body = self._section_body(self._generate_file_section_optimized(repo_path / original, repo_path))
+            if original_body is None:
+                return None
+            bodies.put(original, original_body)
+        diff = unified_diff(original_body, body, original, section.rel_path)
+        if not diff or len(diff) >= len(body):
+            return None
+        head = self._section_head(section.rel_path, 'diff')
+        tail = self.SECTION_TAIL
+        tokens = self._framing_tokens(head, tail) + self.tokenizer.count(diff) if self.tokenizer else None
+        return replace(section, parts=[head + diff + tail], tokens=tokens, similar_to=original)
+    
+    def _section_body(self, section: FileSection) -> Optional[bytes]:
+        """The file body of a rendered section, or None if it has no plain body.
+        
+        Sections larger than zero_copy_threshold are not read back.
+        """
+        head = self._section_head(section.rel_path, self._get_language(Path(section.rel_path)))
+        tail = self.SECTION_TAIL
+        if self._parts_size(section.parts) > self.zero_copy_threshold + len(head) + len(tail):
+            return None
+        data = self._materialize(section.parts)
+        if not data.startswith(head) or not data.endswith(tail):
+            return None
+        return data[len(head):len(data) - len(tail)]
+    
+    def _toc_note(self, section: FileSection) -> str:
+        """Note after a TOC entry for sections standing in for another file."""
+        if section.duplicate_of:
+            return f" (identical to {section.duplicate_of})"
+        if section.similar_to:
+            return f" (diff against {section.similar_to})"
+        if section.rel_path in self.generated:
+            return " (generated)"
+        return ""
+    
+    def _throttled(self, render: Callable[[List[int]], Any], concurrency: AdaptiveConcurrency,
+                   sizes: List[int]) -> Callable[[List[int]], Any]:
+        """Wrap a unit renderer so it runs under the adaptive concurrency limit."""
+        def throttled(unit: List[int]) -> Any:
+            with concurrency.slot():
+                result = render(unit)
+            concurrency.record(sum(sizes[i] for i in unit))
+            return result
+        return throttled
+    
+    def _open_cache(self, repo_path: Path) -> Optional[SectionCache]:
+        """Open the section and outline caches for this run, if enabled and not already open.
+        
+        Outlines are always cached by content for the run; with the section
+        cache enabled they are also kept on disk next to it.
+        """
+        directory = None
+        if self.use_cache:
+            directory = Path(self.cache_dir).expanduser()
+            if not directory.is_absolute():
+                directory = repo_path / directory
+        if self.outline and self.outline_cache is None:
+            path = directory / OUTLINE_CACHE_FILE if directory is not None else None
+            self.outline_cache = OutlineCache(path, self.outline_docstrings)
+        if directory is None:
+            return None
+        if self.section_cache is None:
+            self.section_cache = SectionCache(directory, self._render_key())
+        return self.section_cache
+    
+    def _close_cache(self) -> None:
+        """Save new entries and release the caches at the end of a run."""
+        outlines, self.outline_cache = self.outline_cache, None
+        if outlines is not None:
+            self.outline_hits, self.outline_misses = outlines.hits, outlines.misses
+            try:
+                outlines.save()
+            except OSError:
+                pass
+        cache = self.section_cache
+        if cache is None:
+            return
+        self.section_cache = None
+        self.cache_hits, self.cache_misses = cache.hits, cache.misses
+        try:
+            cache.save()
+        except OSError:
+            # A cache that cannot be written only costs speed next time
+            pass
+        finally:
+            cache.close()
+    
+    def _open_cpu_stage(self) -> None:
+        """Start the worker processes for this run, if configured."""
+        if self.cpu_workers and self._cpu_stage is None:
+            self._cpu_stage = CpuStage(self._transformer(), self.cpu_workers)
+    
+    def _close_cpu_stage(self) -> None:
+        """Stop the worker processes at the end of a run."""
+        stage, self._cpu_stage = self._cpu_stage, None
+        if stage is not None:
+            stage.close()
+    
+    def _transform_settings(self) -> TransformSettings:
+        outlines = self.outline_cache
+        return TransformSettings(self.tokenizer_spec, self._hash_bodies, self.validate_chunk_size,
+                                 signatures=self.near_duplicate_threshold is not None, compact=self.compact,
+                                 outline_docstrings=self.outline_docstrings,
+                                 outline_cache=str(outlines.path) if outlines and outlines.path else None,
+                                 redact=self.redact, redact_patterns=self.redact_patterns,
+                                 redact_entropy=self.redact_entropy)
+    
+    def _transformer(self) -> Transformer:
+        """Transformer for running transforms on the calling thread."""
+        settings = self._transform_settings()
+        transformer = self._inline_transformer
+        if (transformer is None or transformer.settings != settings
+                or (self.outline_cache is not None and transformer.outline_cache is not self.outline_cache)):
+            transformer = self._inline_transformer = Transformer(settings, self.tokenizer, self.token_cache,
+                                                                 self.outline_cache)
+        return transformer
+    
+    def _run_transforms(self, jobs: List[TransformJob]) -> List[TransformResult]:
+        """Run a batch of CPU transforms on the CPU stage, or inline without one."""
+        stage = self._cpu_stage
+        return stage.run(jobs) if stage is not None else self._transformer().run(jobs)
+    
+    def _render_unit(self, files: List[Path], repo_path: Path,
+                     stats: List[Optional[os.stat_result]]) -> List[FileSection]:
+        """Render the files of one read unit on an I/O thread.
         
-        return file_sections
+        Unchanged files are taken from the previous output or the section
+        cache. The rest are read here and their CPU transforms run as a
+        single batch, so a unit of many small files costs one hand-off to
+        the CPU stage.
+        """
+        sections: List[Optional[FileSection]] = [
+            self._reuse_section(file, repo_path, st) for file, st in zip(files, stats)
+        ]
+        if self.near_duplicate_threshold is not None:
+            # Reused sections skip the transforms, so sign them here
+            for section in sections:
+                if section is not None:
+                    body = self._section_body(section)
+                    section.signature = minhash_signature(body) if body is not None else None
+        reads: List[Tuple[int, _FileRead]] = []
+        for k, (file, st) in enumerate(zip(files, stats)):
+            if sections[k] is None:
+                try:
+                    reads.append((k, self._read_file(file, repo_path, st.st_size if st else None)))
+                except Exception as e:
+                    sections[k] = self._error_section(file, repo_path, e)
+        
+        results = iter(self._run_transforms([read.job for _, read in reads if read.job is not None]))
+        for k, read in reads:
+            section = self._finish_section(read, next(results) if read.job is not None else None)
+            self._store_section(read.rel_path, stats[k], section)
+            sections[k] = section
+        return sections
+    
+    def _reuse_section(self, file: Path, repo_path: Path, st: Optional[os.stat_result]) -> Optional[FileSection]:
+        """The section of an unchanged file from the previous output or the section cache."""
+        cache = self.section_cache
+        if (cache is None and self._previous is None) or st is None:
+            return None
+        try:
+            rel_path = str(file.relative_to(repo_path))
+        except ValueError:
+            return None
+        if rel_path in self.generated:
+            return None
+        
+        if self._previous is not None:
+            previous = self._previous.lookup(rel_path, st)
+            if previous is not None:
+                with self._reuse_lock:
+                    self.reused_sections += 1
+                span = FileSpan(self._previous.output_path, previous.offset, previous.length)
+                return FileSection(rel_path, [span], previous.tokens, previous.content_hash, previous.source_hash)
+        if cache is None:
+            return None
+        
+        cached = cache.get(rel_path, st, lambda entry: self._cache_entry_usable(file, entry))
+        if cached is None:
+            return None
+        if cached.kind == 'span':
+            parts: List[SectionPart] = [cached.blob, FileSpan(file, 0, st.st_size), self.SECTION_TAIL]
+        else:
+            parts = [cached.blob]
+        tokens = cached.tokens[self.tokenizer.name] if self.tokenizer else None
+        return FileSection(rel_path, parts, tokens, cached.content_hash, cached.source_hash)
+    
+    def _store_section(self, rel_path: str, st: Optional[os.stat_result], section: FileSection) -> None:
+        """Add a freshly rendered section to the section cache."""
+        cache = self.section_cache
+        # Only sections rendered from a complete read are cached; errors may be transient
+        if cache is None or st is None or section.source_hash is None:
+            return
+        parts = section.parts
+        if len(parts) == 3 and isinstance(parts[1], FileSpan):
+            kind, blob = 'span', parts[0]
+        else:
+            kind, blob = 'bytes', b''.join(parts)
+        tokens = {self.tokenizer.name: section.tokens} if self.tokenizer else {}
+        cache.put(rel_path, st, kind, blob, section.content_hash, section.source_hash, tokens)
+    
+    def _cache_entry_usable(self, file: Path, cached: CachedSection) -> bool:
+        """Whether a cache hit can be used for this run's settings."""
+        if self.tokenizer is not None and self.tokenizer.name not in cached.tokens:
+            return False
+        if self.cache_verify:
+            try:
+                return cached.source_hash is not None and self._file_digest(file) == cached.source_hash
+            except OSError:
+                return False
+        return True
+    
+    def _file_digest(self, file: Path) -> bytes:
+        """content_digest of a file, read in chunks."""
+        hasher = hashlib.blake2b(digest_size=16)
+        buffer = bytearray(self.validate_chunk_size)
+        view = memoryview(buffer)
+        with open(file, 'rb') as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+        return hasher.digest()
     
-    def _generate_file_section_optimized(self, file: Path, repo_path: Path) -> str:
-        """Optimized file section generation with chunk reading for large files."""
+    def _error_section(self, file: Path, repo_path: Path, error: Exception) -> FileSection:
+        """Section emitted in place of a file that could not be processed."""
+        try:
+            rel_path = str(file.relative_to(repo_path))
+        except ValueError:
+            rel_path = str(file)
+        text = f"## Error processing file\n\n```\n{str(error)}\n```"
+        tokens = self.tokenizer.count_text(text) if self.tokenizer else None
+        return FileSection(rel_path, [text.encode('utf-8')], tokens)
+    
+    def _plan_read_units(self, sizes: List[int]) -> List[List[int]]:
+        """Group file indices into read units, preserving file order.
+        
+        Runs of consecutive small files are batched; everything else is read
+        on its own. The batch length adapts to the sizes from the stat pass:
+        each batch aims for batch_target_bytes of content, but batches stay
+        small enough that every worker still gets several of them.
+        """
+        small = [size for size in sizes if size <= self.small_file_size]
+        batch_files = 1
+        if small:
+            # Count at least 512 bytes per file for the open/read/close overhead
+            average = max(512, sum(small) // len(small))
+            by_bytes = self.batch_target_bytes // average
+            by_parallelism = -(-len(small) // (self.max_workers * 4))
+            batch_files = max(1, min(by_bytes, by_parallelism, self.max_batch_files))
+        
+        units: List[List[int]] = []
+        batch: List[int] = []
+        for index, size in enumerate(sizes):
+            if size <= self.small_file_size:
+                batch.append(index)
+                if len(batch) >= batch_files:
+                    units.append(batch)
+                    batch = []
+            else:
+                if batch:
+                    units.append(batch)
+                    batch = []
+                units.append([index])
+        if batch:
+            units.append(batch)
+        return units
+    
+    def _stat_files(self, files: List[Path], executor: Optional[Executor] = None) -> List[Optional[os.stat_result]]:
+        """Stat every file up front so reads can be budgeted, batched and ordered.
+        
+        With an executor the stat calls are spread over the pool in chunks,
+        which matters on network filesystems with high per-call latency.
+        """
+        chunk = 1024
+        if executor is None or len(files) <= chunk:
+            return self._stat_chunk(files)
+        
+        chunks = [files[i:i + chunk] for i in range(0, len(files), chunk)]
+        return [st for stats in executor.map(self._stat_chunk, chunks) for st in stats]
+    
+    def _stat_chunk(self, files: List[Path]) -> List[Optional[os.stat_result]]:
+        """Stat a list of files, using None for files that cannot be stat'ed."""
+        stats = []
+        for file in files:
+            try:
+                stats.append(os.stat(file))
+            except OSError:
+                # Unreadable files are reported when the section is generated
+                stats.append(None)
+        return stats
+    
+    def _resolve_read_order(self, repo_path: Path) -> str:
+        """Pick the concrete read order for 'auto'.
+        
+        Spinning disks pay for every seek, so reads follow inode order there.
+        Elsewhere the largest units go first (LPT) so one big file submitted
+        late cannot set the tail latency.
+        """
+        if self.read_order != 'auto':
+            return self.read_order
+        return 'inode' if is_rotational(repo_path) else 'size'
+    
+    def _read_order_keys(self, files: List[Path], repo_path: Path, stats: List[Optional[os.stat_result]],
+                         units: List[List[int]], weights: List[int], executor: Executor) -> Optional[List[Any]]:
+        """Submission priority for each read unit, or None for plain path order."""
+        order = self._resolve_read_order(repo_path)
+        
+        if order == 'size':
+            return [-weight for weight in weights]
+        
+        inodes = [min((stats[i].st_ino for i in unit if stats[i]), default=0) for unit in units]
+        if order == 'inode':
+            return inodes
+        
+        if order == 'extent':
+            # One FIEMAP ioctl per unit; fall back to inode order where the
+            # filesystem cannot report physical locations
+            offsets = list(executor.map(lambda unit: physical_offset(files[unit[0]]), units))
+            if any(offset is not None for offset in offsets):
+                return [(0, offset) if offset is not None else (1, inode)
+                        for offset, inode in zip(offsets, inodes)]
+            return inodes
+        
+        return None
+    
+    def _generate_file_section_optimized(self, file: Path, repo_path: Path, file_size: Optional[int] = None) -> FileSection:
+        """Render a file section as bytes without decoding the file body.
+        
+        Small files are read whole. Files above zero_copy_threshold are
+        validated in chunks and referenced as a FileSpan so the writer can
+        copy them straight from disk. With a tokenizer configured the body is
+        hashed and counted as well.
+        """
+        read = self._read_file(file, repo_path, file_size)
+        result = self._run_transforms([read.job])[0] if read.job is not None else None
+        return self._finish_section(read, result)
+    
+    def _read_file(self, file: Path, repo_path: Path, file_size: Optional[int] = None) -> _FileRead:
+        """The I/O half of rendering a file: read it, or decide it is read by path.
+        
+        Read errors become an error notice in the body.
+        """
         rel_path = file.relative_to(repo_path)
         language = self._get_language(file)
-        
+        head = self._section_head(str(rel_path), language)
+        read = _FileRead(str(rel_path), head, file)
+        if read.rel_path in self.generated:
+            read.body = self._generated_notice(self.generated[read.rel_path])
+            return read
         try:
-            # Check file size first
-            file_size = file.stat().st_size
+            # Check file size first, unless the caller already knows it
+            if file_size is None:
+                file_size = file.stat().st_size
             
-            if file_size > 10_000_000:  # 10MB threshold
-                content = "[File too large - content omitted]"
-            elif file_size > 1_000_000:  # 1MB threshold - read in chunks
-                content = self._read_large_file(file)
+            if self.large_files.is_large(str(rel_path), file_size):
+                read.body = self._large_file_body(file, file_size)
+            elif file_size > self.zero_copy_threshold:
+                read.job, read.size = TransformJob(file, language, self._wants_outline(rel_path, language)), file_size
             else:
-                content = file.read_text(encoding='utf-8')
-        except UnicodeDecodeError:
-            content = "[Binary or non-UTF-8 file - content omitted]"
+                read.job = TransformJob(file.read_bytes(), language, self._wants_outline(rel_path, language))
         except Exception as e:
-            content = f"[Error reading file: {e}]"
-        
-        return f"## {rel_path}\n\n```{language}\n{content}\n```"
+            read.body = f"[Error reading file: {e}]".encode('utf-8')
+        return read
     
-    def _read_large_file(self, file: Path, chunk_size: int = 65536) -> str:
-        """Read large files in chunks to avoid memory spikes."""
-        chunks = []
-        with open(file, 'r', encoding='utf-8') as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                chunks.append(chunk)
-        return ''.join(chunks)
+    def _generated_notice(self, reason: str) -> bytes:
+        """Body of a generated file rendered as a stub."""
+        return f"[Generated file ({reason}) - content omitted]".encode('utf-8')
+    
+    def _large_file_body(self, file: Path, file_size: int) -> bytes:
+        """Body of a file above its size threshold: an excerpt, or a notice."""
+        if self.large_files.policy != 'excerpt':
+            return self.TOO_LARGE_NOTICE
+        with open(file, 'rb') as f:
+            excerpt = self.large_files.excerpt(f, file_size)
+        return excerpt if excerpt is not None else self.BINARY_NOTICE
+    
+    def _finish_section(self, read: _FileRead, result: Optional[TransformResult]) -> FileSection:
+        """Assemble a file section from a read and the result of its transforms."""
+        head, tail = read.head, self.SECTION_TAIL
+        if result is not None and result.error is None and not result.binary:
+            if result.body is None and isinstance(read.job.data, Path):
+                parts: List[SectionPart] = [head, FileSpan(read.file, 0, read.size), tail]
+                span_newlines = result.newlines
+            else:
+                body = result.body if result.body is not None else read.job.data
+                parts = [head + body + tail]
+                span_newlines = None
+            section = FileSection(read.rel_path, parts, None, result.content_hash, result.source_hash)
+            section.span_newlines = span_newlines
+            section.signature = result.signature
+            section.compacted_bytes, section.compacted_tokens = result.compacted_bytes, result.compacted_tokens
+            section.redactions = result.redactions
+            if result.outlined:
+                section.outlined = True
+                if self.outline_cache is not None and result.source_hash is not None and not result.redactions:
+                    # Outlines made in worker processes are saved by this one
+                    self.outline_cache.put(read.job.language, result.source_hash, result.body)
+            body_tokens = result.tokens
+        else:
+            # A fixed notice takes the place of the body
+            redactions = None
+            if result is None:
+                body = read.body
+                redactor = self._transformer().redactor
+                if redactor is not None:
+                    # Excerpts of large files skip the transforms
+                    body, redactions = redactor.redact(body)
+            elif result.error is not None:
+                body = f"[Error reading file: {result.error}]".encode('utf-8')
+            else:
+                body = self.BINARY_NOTICE
+            measured = self._transformer().measure(body)
+            source_hash = result.source_hash if result is not None else None
+            section = FileSection(read.rel_path, [head + body + tail], None, measured.content_hash, source_hash)
+            section.redactions = redactions or None
+            body_tokens = measured.tokens
+        if self.tokenizer is not None:
+            section.tokens = self._framing_tokens(head, tail) + body_tokens
+        return section
+    
+    @property
+    def _hash_bodies(self) -> bool:
+        """Whether file bodies are hashed (for token counts, the caches, the manifest, the index or dedupe)."""
+        return (self.tokenizer is not None or self.use_cache or self.incremental or self.dedupe or self.outline
+                or self.write_index)
+    
+    def _wants_outline(self, rel_path: Path, language: str) -> bool:
+        """Whether a file is rendered as an outline."""
+        if not self.outline or language not in OUTLINE_LANGUAGES:
+            return False
+        return self._outline_spec is None or self._outline_spec.match_file(str(rel_path))
     
-    def _generate_header(self, repo_path: Path, file_count: int) -> str:
-        """Generate document header."""
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def _framing_tokens(self, head: bytes, tail: bytes) -> int:
+        """Tokens in a section's heading and code fence."""
+        return self.tokenizer.count(head) + self.tokenizer.count(tail)
+    
+    def _generate_header(self, repo_path: Path, file_count: int, total_tokens: Optional[int] = None,
+                         omitted_count: int = 0, part_note: Optional[str] = None) -> str:
+        """Generate document header.
         
-        return f"""# LLM Context for {repo_path.name}
+        Stable output leaves out the generation time and repository path.
+        """
+        fields = self._header_fields(repo_path, file_count, total_tokens, omitted_count, part_note,
+                                     volatile=not self.stable)
+        return f"""{self._generate_title(repo_path)}
 
-Generated on: {timestamp}  
-Repository: `{repo_path}`  
-Total files: {file_count}
+{fields}
 
 ---"""
     
+    def _generate_title(self, repo_path: Path) -> str:
+        return f"# LLM Context for {repo_path.name}"
+    
+    def _header_fields(self, repo_path: Path, file_count: int, total_tokens: Optional[int] = None,
+                       omitted_count: int = 0, part_note: Optional[str] = None, volatile: bool = True) -> str:
+        """Header lines below the title; volatile adds the generation time and repository path."""
+        lines = []
+        if volatile:
+            lines.append(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            lines.append(f"Repository: `{repo_path}`")
+        lines.append(f"Total files: {file_count}")
+        if total_tokens is not None:
+            lines.append(f"Total tokens: {total_tokens:,} ({self.tokenizer.label})")
+        if omitted_count:
+            lines.append(f"Omitted files: {omitted_count} (token budget: {self.max_tokens:,})")
+        if part_note:
+            lines.append(part_note)
+        return '  \n'.join(lines)
+    
     def _generate_anchor(self, text: str) -> str:
         """Generate anchor ID following GitHub Flavored Markdown rules.
         
@@ -118,18 +1772,53 @@ Total files: {file_count}
         
         return anchor
     
-    def _generate_toc(self, files: List[Path], repo_path: Path) -> str:
-        """Generate table of contents."""
+    def _generate_toc(self, files: List[Path], repo_path: Path,
+                      sections: Optional[List[FileSection]] = None, omitted: Optional[List[Path]] = None) -> str:
+        """Generate table of contents, with per-file token counts if known.
+        
+        Files left out to fit the token budget are listed after the entries,
+        without links since they have no section.
+        """
         lines = ["## Table of Contents\n"]
         
         for i, file in enumerate(files, 1):
             rel_path = file.relative_to(repo_path)
             # Create anchor-friendly link using GitHub standard
             anchor = self._generate_anchor(str(rel_path))
-            lines.append(f"{i}. [{rel_path}](#{anchor})")
+            entry = f"{i}. [{rel_path}](#{anchor})"
+            if sections and sections[i - 1].tokens is not None:
+                entry += f" ({sections[i - 1].tokens:,} tokens)"
+            if sections:
+                entry += self._toc_note(sections[i - 1])
+            elif str(rel_path) in self.generated:
+                entry += " (generated)"
+            lines.append(entry)
+        
+        if omitted:
+            lines.append(f"\nOmitted to fit the {self.max_tokens:,}-token budget:\n")
+            for file in omitted:
+                lines.append(f"- {file.relative_to(repo_path)}")
         
         return '\n'.join(lines)
     
+    def _generate_section_toc(self, sections: List[FileSection]) -> str:
+        """Table of contents for a list of sections (one part of sharded output)."""
+        lines = ["## Table of Contents\n"]
+        
+        for i, section in enumerate(sections, 1):
+            title = section.title or section.rel_path
+            entry = f"{i}. [{title}](#{self._generate_anchor(title)})"
+            if section.tokens is not None:
+                entry += f" ({section.tokens:,} tokens)"
+            entry += self._toc_note(section)
+            lines.append(entry)
+        
+        return '\n'.join(lines)
+    
+    def _section_head(self, title: str, language: str) -> bytes:
+        """Heading and opening code fence of a file section."""
+        return f"## {title}\n\n```{language}\n".encode('utf-8')
+    
     def _generate_file_section(self, file: Path, repo_path: Path) -> str:
         """Generate a section for a single file."""
         rel_path = file.relative_to(repo_path)
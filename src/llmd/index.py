@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+
+from .compression import COMPRESSION_SUFFIXES
+from .writer import AtomicFileWriter
+
+# Bump when the index layout changes
+INDEX_VERSION = 1
+
+
+def index_path(output_path: Path) -> Path:
+    """Where the index of output_path lives: llm-context.md -> llm-context.index.json.
+
+    A compression suffix is dropped along with the format suffix, so
+    llm-context.jsonl.gz is indexed by llm-context.index.json too.
+    """
+    name = output_path.name
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return output_path.with_name(f"{Path(name).stem}.index.json")
+
+
+@dataclass
+class IndexEntry:
+    """Where one section of the output is."""
+    path: str
+    # Byte range of the section (uncompressed, for compressed output)
+    offset: int
+    length: int
+    # First and last line of the section, counting from 1
+    start_line: int
+    end_line: int
+    tokens: Optional[int] = None
+    content_hash: Optional[bytes] = None
+    # Heading of a piece of a file split across parts
+    title: Optional[str] = None
+    # Name of the part holding the section, for sharded output
+    part: Optional[str] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {'path': self.path}
+        if self.title is not None:
+            data['title'] = self.title
+        if self.part is not None:
+            data['part'] = self.part
+        data.update({
+            'offset': self.offset,
+            'length': self.length,
+            'lines': [self.start_line, self.end_line],
+            'tokens': self.tokens,
+            'content_hash': self.content_hash.hex() if self.content_hash else None,
+        })
+        return data
+
+
+@dataclass
+class OutputIndex:
+    """Byte and line ranges of every section of an output file.
+
+    Written next to the output so readers can seek (or ``mmap`` and slice)
+    straight to the files they need instead of scanning the whole document.
+    Everything in it is collected while the output is written.
+    """
+    output_path: Path
+    output_format: str
+    compression: Optional[str] = None
+
+    def __post_init__(self):
+        self.entries: List[IndexEntry] = []
+
+    @property
+    def path(self) -> Path:
+        return index_path(self.output_path)
+
+    def add(self, entry: IndexEntry) -> None:
+        self.entries.append(entry)
+
+    def save(self) -> Path:
+        """Write the index atomically and return its path."""
+        data = {
+            'version': INDEX_VERSION,
+            'output': self.output_path.name,
+            'format': self.output_format,
+            'compression': self.compression,
+            'sections': [entry.to_json() for entry in self.entries],
+        }
+        with AtomicFileWriter(self.path) as writer:
+            writer.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        return self.path
@@ -0,0 +1,301 @@
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+import codecs
+import re
+import pathspec
+
+LARGE_FILE_POLICIES = ('omit', 'excerpt')
+
+# Files above this size are omitted or excerpted unless a rule says otherwise
+DEFAULT_MAX_FILE_SIZE = 10_000_000
+
+# Upper bound on each side of an excerpt, however many lines it asks for
+MAX_EXCERPT_BYTES = 1024 * 1024
+
+# Read size when scanning for line ends
+_CHUNK_SIZE = 64 * 1024
+
+# Bytes per line assumed when estimating the size of a line-based excerpt
+_LINE_ESTIMATE = 80
+
+_FILE_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)\s*(?:b|bytes)?\s*$', re.IGNORECASE)
+_EXCERPT_PATTERN = re.compile(r'^\s*(\d+)\s*([km]?)\s*(b|bytes|l|lines)?\s*$', re.IGNORECASE)
+_MULTIPLIERS = {'': 1, 'k': 1024, 'm': 1024 * 1024, 'g': 1024 * 1024 * 1024}
+
+
+@dataclass(frozen=True)
+class ExcerptLimit:
+    """How much of one end of a large file to show."""
+    amount: int
+    unit: str  # 'lines' or 'bytes'
+
+
+def parse_file_size(value: Union[int, str], option: str = 'max_file_size') -> int:
+    """Parse a file size such as ``10MB``, ``500KB`` or ``1048576`` into bytes."""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {option} '{value}'. Expected e.g. 10MB or 500KB.")
+    if isinstance(value, int):
+        size = value
+    else:
+        match = _FILE_SIZE_PATTERN.match(str(value))
+        if not match:
+            raise ValueError(f"Invalid {option} '{value}'. Expected e.g. 10MB or 500KB.")
+        number, prefix = match.groups()
+        size = int(float(number) * _MULTIPLIERS[prefix.lower()])
+    if size < 0:
+        raise ValueError(f"Invalid {option} '{value}'. The size cannot be negative.")
+    return size
+
+
+def parse_size_rules(value: Union[int, str, List[str]]) -> Tuple[Optional[int], List[Tuple[str, int]]]:
+    """Parse ``max_file_size``: a default size and ``PATTERN=SIZE`` rules.
+
+    Accepts a single size, a comma-separated string such as
+    ``10MB, *.log=1MB, fixtures/**=200KB``, or a list of such entries.
+    Returns the default (None if not given) and the rules in order.
+    """
+    if isinstance(value, (int, bool)):
+        return parse_file_size(value), []
+    entries = value if isinstance(value, (list, tuple)) else str(value).split(',')
+    default: Optional[int] = None
+    rules: List[Tuple[str, int]] = []
+    for entry in entries:
+        entry = str(entry).strip()
+        if not entry:
+            continue
+        if '=' in entry:
+            pattern, size = entry.rsplit('=', 1)
+            if not pattern.strip():
+                raise ValueError(f"Invalid max_file_size '{entry}'. Expected SIZE or PATTERN=SIZE.")
+            rules.append((pattern.strip(), parse_file_size(size)))
+        else:
+            default = parse_file_size(entry)
+    return default, rules
+
+
+def parse_excerpt(value: Union[int, str], option: str) -> ExcerptLimit:
+    """Parse an excerpt length: ``200`` or ``200 lines``, or bytes such as ``64KB``."""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {option} '{value}'. Expected e.g. 200 lines or 64KB.")
+    if isinstance(value, int):
+        limit = ExcerptLimit(value, 'lines')
+    else:
+        match = _EXCERPT_PATTERN.match(str(value))
+        if not match:
+            raise ValueError(f"Invalid {option} '{value}'. Expected e.g. 200 lines or 64KB.")
+        number, prefix, suffix = match.groups()
+        prefix, suffix = prefix.lower(), (suffix or '').lower()
+        if suffix in ('l', 'lines') or (not suffix and not prefix):
+            limit = ExcerptLimit(int(number) * {'': 1, 'k': 1000, 'm': 1000 * 1000}[prefix], 'lines')
+        else:
+            limit = ExcerptLimit(int(number) * _MULTIPLIERS[prefix], 'bytes')
+    if limit.amount < 0:
+        raise ValueError(f"Invalid {option} '{value}'. The length cannot be negative.")
+    return limit
+
+
+@dataclass
+class LargeFilePolicy:
+    """What to do with files above a size threshold.
+
+    The threshold is ``max_file_size`` unless one of ``rules`` matches the
+    file's relative path (gitignore syntax; the last matching rule wins).
+    Files above it are omitted, or with the 'excerpt' policy shown as their
+    first and last lines, read by seeking so the middle is never read.
+    """
+    max_file_size: float = DEFAULT_MAX_FILE_SIZE
+    rules: List[Tuple[str, int]] = field(default_factory=list)
+    policy: str = 'omit'
+    head: ExcerptLimit = ExcerptLimit(200, 'lines')
+    tail: ExcerptLimit = ExcerptLimit(50, 'lines')
+    line_numbers: bool = True
+
+    def __post_init__(self):
+        self._specs = [(pathspec.PathSpec.from_lines('gitwildmatch', [pattern]), size)
+                       for pattern, size in self.rules]
+
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'LargeFilePolicy':
+        """Build a policy from the llm.md OPTIONS keys, raising ValueError on bad values."""
+        defaults = cls()
+        max_file_size, rules = defaults.max_file_size, []
+        if options.get('max_file_size') is not None:
+            default, rules = parse_size_rules(options['max_file_size'])
+            if default is not None:
+                max_file_size = default
+        policy = str(options.get('large_files', 'omit')).lower()
+        if policy not in LARGE_FILE_POLICIES:
+            raise ValueError(f"Invalid large_files '{policy}'. Expected one of: {', '.join(LARGE_FILE_POLICIES)}")
+        head = options.get('excerpt_head')
+        tail = options.get('excerpt_tail')
+        return cls(
+            max_file_size, rules, policy,
+            parse_excerpt(head, 'excerpt_head') if head is not None else defaults.head,
+            parse_excerpt(tail, 'excerpt_tail') if tail is not None else defaults.tail,
+            bool(options.get('excerpt_line_numbers', True)),
+        )
+
+    @property
+    def min_threshold(self) -> float:
+        """The smallest threshold of any file; smaller files need no rule lookup."""
+        return min([self.max_file_size] + [size for _, size in self.rules])
+
+    def threshold(self, rel_path: str) -> float:
+        """Size above which rel_path counts as large."""
+        for spec, size in reversed(self._specs):
+            if spec.match_file(rel_path):
+                return size
+        return self.max_file_size
+
+    def is_large(self, rel_path: str, size: int) -> bool:
+        return size > self.min_threshold and size > self.threshold(rel_path)
+
+    def describe(self) -> str:
+        """The settings that affect rendering, for cache keys."""
+        rules = ','.join(f"{pattern}={size}" for pattern, size in self.rules)
+        key = f"max_file_size={self.max_file_size}"
+        if rules:
+            key += f"; size_rules={rules}"
+        if self.policy == 'excerpt':
+            key += (f"; large_files=excerpt; head={self.head.amount} {self.head.unit}; "
+                    f"tail={self.tail.amount} {self.tail.unit}; line_numbers={self.line_numbers}")
+        return key
+
+    def estimated_size(self, size: int) -> int:
+        """Rough size of the body shown for a large file of the given size."""
+        if self.policy != 'excerpt':
+            return 0
+        shown = sum(limit.amount if limit.unit == 'bytes' else limit.amount * _LINE_ESTIMATE
+                    for limit in (self.head, self.tail))
+        return min(size, shown)
+
+    def excerpt(self, f: BinaryIO, size: int) -> Optional[bytes]:
+        """Head and tail of an open file with an elision marker between them.
+
+        Returns None if the excerpt is not valid UTF-8.
+        """
+        head, head_end = _read_head(f, size, self.head)
+        tail, tail_start = _read_tail(f, size, self.tail, head_end)
+        try:
+            head_text = _decode(head)
+            tail_text = _decode(tail)
+        except UnicodeDecodeError:
+            return None
+
+        head_lines, tail_lines = _lines(head_text), _lines(tail_text)
+        omitted = tail_start - head_end
+        if self.line_numbers:
+            head_lines = [f"{n:>6}  {line}" for n, line in enumerate(head_lines, 1)]
+            # The middle is never read, so unless head and tail meet, tail
+            # lines are numbered from the end of the file (-1 is the last)
+            first = len(head_lines) + 1 if omitted == 0 else -len(tail_lines)
+            tail_lines = [f"{n:>6}  {line}" for n, line in enumerate(tail_lines, first)]
+        lines = head_lines
+        if omitted > 0:
+            lines.append(f"[... {omitted:,} bytes omitted ...]")
+        lines.extend(tail_lines)
+        return '\n'.join(lines).encode('utf-8')
+
+
+def _lines(text: str) -> List[str]:
+    lines = text.split('\n') if text else []
+    if text.endswith('\n'):
+        lines.pop()
+    return lines
+
+
+def _decode(data: bytes) -> str:
+    text = codecs.utf_8_decode(data, 'strict', True)[0]
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _read_head(f: BinaryIO, size: int, limit: ExcerptLimit) -> Tuple[bytes, int]:
+    """The first lines or bytes of a file, cut at a line end where possible."""
+    if limit.amount == 0:
+        return b'', 0
+    if limit.unit == 'bytes':
+        f.seek(0)
+        data = f.read(min(limit.amount, size))
+    else:
+        f.seek(0)
+        data = b''
+        while data.count(b'\n') < limit.amount and len(data) < MAX_EXCERPT_BYTES:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            data += chunk
+        end = -1
+        for _ in range(limit.amount):
+            end = data.find(b'\n', end + 1)
+            if end < 0:
+                break
+        if end >= 0:
+            data = data[:end + 1]
+        data = data[:MAX_EXCERPT_BYTES]
+    if len(data) < size and not data.endswith(b'\n'):
+        # Cut before a partial line, or at least not inside a character
+        cut = data.rfind(b'\n') + 1
+        data = data[:cut] if cut else data[:_char_boundary(data, len(data))]
+    return data, len(data)
+
+
+def _read_tail(f: BinaryIO, size: int, limit: ExcerptLimit, head_end: int) -> Tuple[bytes, int]:
+    """The last lines or bytes of a file after head_end, starting at a line start where possible."""
+    if limit.amount == 0 or head_end >= size:
+        return b'', size
+    if limit.unit == 'bytes':
+        start = max(head_end, size - limit.amount)
+        f.seek(start)
+        data = f.read(size - start)
+    else:
+        start, data = size, b''
+        # One more newline than lines wanted marks where the first of them starts
+        wanted = limit.amount + (1 if size else 0)
+        while start > head_end and data.count(b'\n') < wanted and len(data) < MAX_EXCERPT_BYTES:
+            step = min(_CHUNK_SIZE, start - head_end)
+            start -= step
+            f.seek(start)
+            data = f.read(step) + data
+        # Drop a final newline so it does not count as a line
+        body = data[:-1] if data.endswith(b'\n') else data
+        cut = len(body)
+        for _ in range(limit.amount):
+            cut = body.rfind(b'\n', 0, cut)
+            if cut < 0:
+                break
+        if cut >= 0:
+            start += cut + 1
+            data = data[cut + 1:]
+        if len(data) > MAX_EXCERPT_BYTES:
+            start += len(data) - MAX_EXCERPT_BYTES
+            data = data[-MAX_EXCERPT_BYTES:]
+    if start > head_end:
+        f.seek(start - 1)
+        if f.read(1) != b'\n':
+            # Skip a partial first line, or at least start on a character
+            newline = data.find(b'\n')
+            skip = newline + 1 if 0 <= newline < len(data) - 1 else _char_start(data)
+            start += skip
+            data = data[skip:]
+    return data, start
+
+
+def _char_boundary(data: bytes, end: int) -> int:
+    """Largest position <= end that does not split a UTF-8 character."""
+    pos = end
+    while pos > 0 and end - pos < 4 and (data[pos - 1] & 0xC0) == 0x80:
+        pos -= 1
+    if pos > 0 and data[pos - 1] >= 0xC0:
+        # A lead byte whose continuation bytes were cut off
+        needed = 2 if data[pos - 1] < 0xE0 else 3 if data[pos - 1] < 0xF0 else 4
+        if end - (pos - 1) < needed:
+            return pos - 1
+    return end
+
+
+def _char_start(data: bytes) -> int:
+    """Number of leading continuation bytes (of a character cut off in front)."""
+    skip = 0
+    while skip < min(3, len(data)) and (data[skip] & 0xC0) == 0x80:
+        skip += 1
+    return skip
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+from .writer import AtomicFileWriter
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 1
+
+# Entry fields, stored as a JSON list to keep the manifest compact
+_OFFSET, _LENGTH, _SIZE, _MTIME_NS, _INODE, _TOKENS, _CONTENT_HASH, _SOURCE_HASH = range(8)
+
+
+def manifest_path(output_path: Path) -> Path:
+    """Where the manifest of output_path lives: .llm-context.md.manifest.json."""
+    return output_path.with_name(f".{output_path.name}.manifest.json")
+
+
+@dataclass
+class PreviousSection:
+    """A section of the previous output that can be copied into the new one."""
+    offset: int
+    length: int
+    tokens: Optional[int]
+    content_hash: Optional[bytes]
+    source_hash: Optional[bytes]
+
+
+@dataclass
+class SectionManifest:
+    """Byte ranges of every file section in an output file.
+
+    Written next to the output by ``--incremental`` runs. Offsets are
+    absolute positions in the output; each entry also records the stat key
+    (size, mtime_ns, inode) the section was rendered from.
+    """
+    output_path: Path
+    render_key: str
+    entries: Dict[str, List[Any]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, output_path: Path, render_key: str) -> Optional['SectionManifest']:
+        """Load the manifest if it still describes output_path exactly.
+
+        Returns None when there is no manifest, it was written with other
+        settings, or the output was changed after the manifest was written.
+        """
+        try:
+            data = json.loads(manifest_path(output_path).read_text(encoding='utf-8'))
+            st = output_path.stat()
+            if (data.get('version') != MANIFEST_VERSION or data.get('render_key') != render_key
+                    or data['output_size'] != st.st_size or data['output_mtime_ns'] != st.st_mtime_ns):
+                return None
+            entries = data['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return cls(output_path, render_key, {
+            rel: entry for rel, entry in entries.items()
+            if isinstance(entry, list) and len(entry) == 8 and entry[_OFFSET] + entry[_LENGTH] <= st.st_size
+        })
+
+    def lookup(self, rel_path: str, st: os.stat_result) -> Optional[PreviousSection]:
+        """The previous section of rel_path, if the file is unchanged."""
+        entry = self.entries.get(rel_path)
+        if (entry is None or entry[_SIZE] != st.st_size or entry[_MTIME_NS] != st.st_mtime_ns
+                or entry[_INODE] != st.st_ino):
+            return None
+        return PreviousSection(
+            entry[_OFFSET], entry[_LENGTH], entry[_TOKENS],
+            bytes.fromhex(entry[_CONTENT_HASH]) if entry[_CONTENT_HASH] else None,
+            bytes.fromhex(entry[_SOURCE_HASH]) if entry[_SOURCE_HASH] else None,
+        )
+
+    def extent(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """The offset and length of rel_path's previous section, whether or not the file changed."""
+        entry = self.entries.get(rel_path)
+        return None if entry is None else (entry[_OFFSET], entry[_LENGTH])
+
+    def add(self, rel_path: str, offset: int, length: int, st: os.stat_result, tokens: Optional[int],
+            content_hash: Optional[bytes], source_hash: Optional[bytes]) -> None:
+        """Record where a section was written."""
+        self.entries[rel_path] = [
+            offset, length, st.st_size, st.st_mtime_ns, st.st_ino, tokens,
+            content_hash.hex() if content_hash else None,
+            source_hash.hex() if source_hash else None,
+        ]
+
+    def save(self) -> None:
+        """Write the manifest, keyed to the output file as it is now."""
+        st = self.output_path.stat()
+        data = {
+            'version': MANIFEST_VERSION,
+            'render_key': self.render_key,
+            'output_size': st.st_size,
+            'output_mtime_ns': st.st_mtime_ns,
+            'entries': self.entries,
+        }
+        with AtomicFileWriter(manifest_path(self.output_path)) as writer:
+            writer.write_text(json.dumps(data, separators=(',', ':')))
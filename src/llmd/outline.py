@@ -0,0 +1,341 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Tuple
+import ast
+import json
+import re
+import threading
+import tokenize
+from .writer import AtomicFileWriter
+
+# Bump when outlines change, so persisted outlines are discarded
+OUTLINE_VERSION = 2
+
+# Languages that can be outlined
+OUTLINE_LANGUAGES = ('python', 'javascript', 'typescript', 'jsx', 'tsx', 'go', 'rust')
+
+# First line of every outline
+OUTLINE_NOTE = "Outline: bodies omitted"
+
+# File in the cache directory holding outlines between runs
+OUTLINE_CACHE_FILE = 'outlines.json'
+
+# Statements kept whole up to this many lines; longer ones are cut after their first
+_MAX_STATEMENT_LINES = 5
+
+
+def outline(body: bytes, language: str, docstrings: bool = True) -> Optional[bytes]:
+    """Skeleton of a UTF-8 source file: imports and declarations without bodies.
+
+    Python is parsed with ``ast``; JavaScript, TypeScript, Go and Rust are
+    outlined by a brace-matching scanner. With ``docstrings``, Python
+    modules, classes and functions keep the first line of their docstring.
+    The outline starts with a comment saying bodies were omitted. Returns
+    None when the language is not supported, the file does not parse, or
+    it has nothing to outline; the full body is used then.
+    """
+    text = body.decode('utf-8')
+    if language == 'python':
+        skeleton = _outline_python(text, docstrings)
+    elif language in _BRACE_RULES:
+        skeleton = _outline_braces(text, _BRACE_RULES[language])
+    else:
+        return None
+    if not skeleton:
+        return None
+    comment = '#' if language == 'python' else '//'
+    return f"{comment} {OUTLINE_NOTE}\n{skeleton}".encode('utf-8')
+
+
+# -- Python ---------------------------------------------------------------
+
+def _outline_python(text: str, docstrings: bool) -> Optional[str]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    lines = text.splitlines()
+    out: List[str] = []
+    if docstrings:
+        _python_docstring(tree, '', out)
+    _python_block(tree.body, lines, out, docstrings, top_level=True)
+    return '\n'.join(out).strip('\n') + '\n' if out else None
+
+
+def _python_block(nodes: List[ast.stmt], lines: List[str], out: List[str], docstrings: bool,
+                  top_level: bool = False) -> None:
+    for node in nodes:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            if top_level and out:
+                out.append('')
+            _python_definition(node, lines, out, docstrings)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and top_level:
+            out.extend(lines[node.lineno - 1:node.end_lineno])
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.lineno == node.end_lineno:
+            # Class attributes, and module constants such as __all__ or VERSION
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if not top_level or all(isinstance(t, ast.Name) and (t.id.isupper() or t.id.startswith('__'))
+                                    for t in targets):
+                out.append(lines[node.lineno - 1].rstrip())
+
+
+def _python_definition(node, lines: List[str], out: List[str], docstrings: bool) -> None:
+    """Emit a class or function signature, then class members or ``...``."""
+    start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+    row, col = _python_header_end(lines, node.lineno)
+    out.extend(lines[start - 1:row - 1])
+    out.append(lines[row - 1][:col].rstrip())
+
+    header_indent = len(lines[node.lineno - 1]) - len(lines[node.lineno - 1].lstrip())
+    first = node.body[0]
+    if first.lineno > row:
+        indent = lines[first.lineno - 1][:first.col_offset]
+    else:
+        indent = ' ' * (header_indent + 4)
+
+    emitted = len(out)
+    if docstrings:
+        _python_docstring(node, indent, out)
+    if isinstance(node, ast.ClassDef):
+        _python_block(node.body, lines, out, docstrings)
+    if len(out) == emitted:
+        out.append(indent + '...')
+
+
+def _python_header_end(lines: List[str], lineno: int) -> Tuple[int, int]:
+    """(line number, column after the colon) ending the def or class header at lineno."""
+    depth = 0
+    # Feed lines lazily: only the header is tokenized
+    rows = (lines[k] + '\n' for k in range(lineno - 1, len(lines)))
+    try:
+        for token in tokenize.generate_tokens(lambda: next(rows, '')):
+            if token.type != tokenize.OP:
+                continue
+            if token.string in '([{':
+                depth += 1
+            elif token.string in ')]}':
+                depth -= 1
+            elif token.string == ':' and depth == 0:
+                return lineno + token.end[0] - 1, token.end[1]
+    except (tokenize.TokenError, SyntaxError):
+        pass
+    return lineno, len(lines[lineno - 1])
+
+
+def _python_docstring(node, indent: str, out: List[str]) -> None:
+    docstring = ast.get_docstring(node)
+    if docstring:
+        first_line = docstring.strip().splitlines()[0].replace('"""', '\\"\\"\\"')
+        if first_line.endswith('"'):
+            first_line += ' '
+        out.append(f'{indent}"""{first_line}"""')
+
+
+# -- Brace languages ------------------------------------------------------
+
+@dataclass(frozen=True)
+class _BraceRules:
+    """How to outline a language with brace-delimited blocks."""
+    # String literals and comments, blanked out before scanning
+    mask: Pattern[str]
+    # Top-level statements that are kept; blocks they open are elided
+    declaration: Pattern[str]
+    # Kept statements whose blocks list members, which are kept in turn
+    container: Pattern[str]
+    # Statements kept whole however long; braces in them are not blocks
+    whole: Pattern[str]
+
+
+_C_MASK = [r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'", r'//[^\n]*', r'/\*[\s\S]*?\*/']
+
+_JS_RULES = _BraceRules(
+    mask=re.compile('|'.join(_C_MASK + [r'`(?:\\.|[^`\\])*`'])),
+    declaration=re.compile(
+        r'(?:@[\w$.]+|import\b|export\b|(?:(?:declare|abstract|async|default)\s+)*'
+        r'(?:function\b|class\b|interface\b|type\s|enum\b|namespace\s|module\s|const\b|let\b|var\b))'
+    ),
+    container=re.compile(
+        r'(?:export\s+)?(?:(?:default|declare|abstract)\s+)*(?:class\b|interface\b|enum\b|namespace\s|module\s)'
+        r'|(?:export\s+)?(?:declare\s+)?type\b[^=]*=\s*\{\s*$'
+    ),
+    whole=re.compile(r'import\b|export\s+(?:type\s+)?(?:\{|\*)'),
+)
+
+_GO_RULES = _BraceRules(
+    mask=re.compile('|'.join([r'"(?:\\.|[^"\\\n])*"', r'`[^`]*`', r"'(?:\\.|[^'\\\n])+'"] + _C_MASK[2:])),
+    declaration=re.compile(r'(?:package|import|func|type|const|var)\b'),
+    container=re.compile(r'type\s+\w+(?:\[[^\]]*\])?\s+(?:struct|interface)\s*\{'),
+    whole=re.compile(r'(?:import|const|var|type)\s*\('),
+)
+
+_RUST_PREFIX = r'(?:pub(?:\s*\([^)]*\))?\s+)?(?:(?:unsafe|async|const|default|extern(?:\s+"[^"\n]*")?)\s+)*'
+_RUST_RULES = _BraceRules(
+    mask=re.compile('|'.join([
+        r'r(#*)"[\s\S]*?"\1', r'"(?:\\.|[^"\\])*"',
+        r"'(?:\\(?:u\{[0-9a-fA-F]+\}|x[0-9a-fA-F]{2}|.)|[^'\\\n])'",
+    ] + _C_MASK[2:])),
+    declaration=re.compile(
+        r'#!?\[|' + _RUST_PREFIX + r'(?:fn|struct|enum|trait|impl|mod|use|type|static|union|macro_rules!)\b'
+        r'|(?:pub(?:\s*\([^)]*\))?\s+)?const\b'
+    ),
+    container=re.compile(_RUST_PREFIX + r'(?:struct|enum|trait|impl|mod|union)\b'),
+    whole=re.compile(r'(?:pub(?:\s*\([^)]*\))?\s+)?use\b'),
+)
+
+_BRACE_RULES: Dict[str, _BraceRules] = {
+    'javascript': _JS_RULES, 'typescript': _JS_RULES, 'jsx': _JS_RULES, 'tsx': _JS_RULES,
+    'go': _GO_RULES, 'rust': _RUST_RULES,
+}
+
+
+_BRACKETS = re.compile(r'[()\[\]{}]')
+
+
+def _blank(match) -> str:
+    """Replace a masked span with spaces, keeping its newlines."""
+    return re.sub(r'[^\n]', ' ', match.group())
+
+
+def _outline_braces(text: str, rules: _BraceRules) -> Optional[str]:
+    """Keep declarations and container members, eliding every other block.
+
+    Works line by line on a copy of the source with strings and comments
+    blanked out, so braces and keywords inside them are ignored.
+    """
+    lines = text.split('\n')
+    masked = rules.mask.sub(_blank, text).split('\n')
+    out: List[str] = []
+    depth = 0
+    # Depths at which kept containers opened; members are at depth + 1
+    containers: List[int] = []
+    # Depth to return to before scanning resumes, inside an elided block
+    skip_to: Optional[int] = None
+    pending: List[int] = []
+    parens = 0
+    whole = False
+    opened_at: Optional[Tuple[int, int]] = None
+
+    for i, line in enumerate(masked):
+        if skip_to is not None:
+            depth += line.count('{') - line.count('}')
+            if depth <= skip_to:
+                skip_to = None
+            continue
+        if not pending:
+            if not line.strip():
+                continue
+            level = depth
+            whole = bool(rules.whole.match(line.lstrip()))
+            opened_at = None
+        pending.append(i)
+
+        for bracket in _BRACKETS.finditer(line):
+            col, char = bracket.start(), bracket.group()
+            # Braces inside brackets (destructuring, literals) are not blocks
+            if char in '([' or (char == '{' and (whole or parens > 0)):
+                parens += 1
+            elif char in ')]' or (char == '}' and (whole or parens > 0)):
+                parens -= 1
+            elif char == '{':
+                depth += 1
+                if depth == level + 1 and opened_at is None:
+                    opened_at = (i, col)
+            elif char == '}':
+                depth -= 1
+        if parens > 0:
+            continue
+        parens = 0
+
+        statement = ' '.join(masked[k] for k in pending).strip()
+        in_container = bool(containers) and level == containers[-1] + 1
+        kept = in_container or (not containers and level == 0 and bool(rules.declaration.match(statement)))
+        if depth < level:
+            # The statement closes the container it is in
+            if in_container:
+                out.extend(lines[k].rstrip() for k in pending)
+            while containers and depth <= containers[-1]:
+                containers.pop()
+        elif depth > level:
+            if kept and rules.container.match(statement):
+                out.extend(lines[k].rstrip() for k in pending)
+                containers.append(level)
+            else:
+                if kept:
+                    row, col = opened_at if opened_at is not None else (pending[-1], len(lines[pending[-1]]))
+                    out.extend(lines[k].rstrip() for k in pending if k < row)
+                    out.append(lines[row][:col + 1].rstrip() + ' ... }')
+                skip_to = level
+        elif kept:
+            if whole or len(pending) <= _MAX_STATEMENT_LINES:
+                out.extend(lines[k].rstrip() for k in pending)
+            else:
+                out.append(lines[pending[0]].rstrip() + ' ...')
+        pending = []
+
+    return '\n'.join(out) + '\n' if out else None
+
+
+# -- Cache ----------------------------------------------------------------
+
+class OutlineCache:
+    """Thread-safe outlines keyed by the language and content hash of their source.
+
+    Identical bytes outline differently as, say, Python and JavaScript, so
+    the language is part of the key.
+
+    With a path, outlines are loaded from and saved to a JSON file so
+    repeat runs skip parsing. Only outlines used in the current run are
+    saved. A file written by another version or with other settings is
+    ignored.
+    """
+
+    def __init__(self, path: Optional[Path] = None, docstrings: bool = True):
+        self.path = path
+        self.key = f"v{OUTLINE_VERSION}; docstrings={docstrings}"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._stored: Dict[Tuple[str, bytes], bytes] = {}
+        self._used: Dict[Tuple[str, bytes], bytes] = {}
+        if path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            if data.get('key') != self.key:
+                return
+            stored = {}
+            for key, outline in data['outlines'].items():
+                language, _, digest = key.rpartition(':')
+                stored[language, bytes.fromhex(digest)] = outline.encode('utf-8')
+            self._stored = stored
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self._stored = {}
+
+    def get(self, language: str, digest: bytes) -> Optional[bytes]:
+        key = (language, digest)
+        with self._lock:
+            outline = self._used.get(key) or self._stored.get(key)
+            if outline is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._used[key] = outline
+            return outline
+
+    def put(self, language: str, digest: bytes, outline: bytes) -> None:
+        with self._lock:
+            self._used[language, digest] = outline
+
+    def save(self) -> None:
+        """Write the outlines used in this run, if there is a path."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = {'key': self.key,
+                    'outlines': {f"{language}:{digest.hex()}": outline.decode('utf-8')
+                                 for (language, digest), outline in self._used.items()}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with AtomicFileWriter(self.path) as writer:
+            writer.write_text(json.dumps(data, separators=(',', ':')))
@@ -364,6 +364,17 @@ class LlmMdParser:
         """Get parsed OPTIONS as dictionary."""
         return self.options.copy()
     
+    def get_include_patterns(self) -> List[str]:
+        """Get all INCLUDE patterns from sections, legacy config and CLI, in order."""
+        patterns = []
+        for section in self.sections:
+            if section.get('type') == 'INCLUDE':
+                patterns.extend(section.get('patterns', []))
+        patterns.extend(self.include_patterns)
+        patterns.extend(self.cli_include)
+        # Drop duplicates, keeping first occurrence
+        return list(dict.fromkeys(patterns))
+    
     def get_implicit_patterns(self) -> List[str]:
         """Get implicit patterns following mode declaration."""
         return self.implicit_patterns.copy()
@@ -0,0 +1,183 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import os
+
+from .budget import estimate_tokens
+
+# Directory levels below the root shown by default; deeper directories are
+# counted in their ancestors' totals
+DEFAULT_MAP_DEPTH = 3
+
+# Subdirectories shown per directory by default; the smaller ones beyond
+# this are summarised on one line
+DEFAULT_MAP_COLLAPSE = 10
+
+
+@dataclass
+class RepoInventory:
+    """Sizes of the files of a repository, taken from stat data alone.
+
+    ``files`` maps relative paths (with ``/`` separators) to sizes;
+    ``skipped`` lists directories that were not walked at all, such as
+    ``node_modules``.
+    """
+    files: Dict[str, int] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_files(cls, files: Iterable[Path], repo_path: Path) -> 'RepoInventory':
+        """An inventory of just the given files."""
+        inventory = cls()
+        for file in files:
+            try:
+                inventory.files[file.relative_to(repo_path).as_posix()] = file.stat().st_size
+            except (OSError, ValueError):
+                continue
+        return inventory
+
+
+@dataclass
+class _Directory:
+    name: str
+    # Totals over the directory and everything below it
+    files: int = 0
+    size: int = 0
+    selected: int = 0
+    # Files directly in the directory
+    own_files: int = 0
+    skipped: bool = False
+    children: Dict[str, '_Directory'] = field(default_factory=dict)
+
+    def child(self, name: str) -> '_Directory':
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = _Directory(name)
+        return node
+
+
+def render_repo_map(inventory: RepoInventory, selected: Set[str], root_name: str,
+                    max_depth: int = DEFAULT_MAP_DEPTH, collapse: int = DEFAULT_MAP_COLLAPSE) -> str:
+    """A compact directory tree with file counts, sizes and token estimates.
+
+    Every directory of the inventory is counted, including those none of
+    whose files were selected (marked excluded); directories that were not
+    walked are named on their parent's line. Directories with no files
+    of their own and a single subdirectory are joined into one line
+    (``src/llmd/``); levels below max_depth are folded into their parent,
+    and beyond the ``collapse`` largest subdirectories of a directory the
+    rest share one summary line.
+    """
+    root = _Directory(root_name)
+    for rel_path, size in inventory.files.items():
+        parts = rel_path.split('/')
+        node = root
+        nodes = [root]
+        for name in parts[:-1]:
+            node = node.child(name)
+            nodes.append(node)
+        node.own_files += 1
+        is_selected = rel_path in selected
+        for ancestor in nodes:
+            ancestor.files += 1
+            ancestor.size += size
+            ancestor.selected += is_selected
+    for rel_dir in inventory.skipped:
+        node = root
+        for name in rel_dir.split('/'):
+            node = node.child(name)
+        node.skipped = True
+
+    lines: List[str] = []
+    _render_directory(root, 0, max_depth, collapse, lines)
+    return "## Repository Map\n\n```text\n" + '\n'.join(lines) + "\n```"
+
+
+def _render_directory(node: _Directory, depth: int, max_depth: int, collapse: int, lines: List[str]) -> None:
+    label = node.name + '/'
+    while depth and not node.own_files and not node.skipped and len(node.children) == 1:
+        node = next(iter(node.children.values()))
+        label += node.name + '/'
+    # Directories that were not walked only get their names listed
+    unscanned = sorted(name for name, child in node.children.items() if child.skipped and not child.files)
+    line = f"{'  ' * depth}{label} {_describe(node)}"
+    if unscanned:
+        line += f" (not scanned: {', '.join(name + '/' for name in unscanned)})"
+    lines.append(line)
+    if depth >= max_depth:
+        return
+    children = sorted((child for child in node.children.values() if child.files),
+                      key=lambda child: (-child.size, child.name))
+    shown, rest = children[:collapse], children[collapse:]
+    for child in sorted(shown, key=lambda child: child.name):
+        _render_directory(child, depth + 1, max_depth, collapse, lines)
+    if rest:
+        files = sum(child.files for child in rest)
+        size = sum(child.size for child in rest)
+        lines.append(f"{'  ' * (depth + 1)}... {len(rest)} more directories: {_describe_totals(files, size)}")
+
+
+def _describe(node: _Directory) -> str:
+    text = _describe_totals(node.files, node.size)
+    if not node.selected:
+        text += ", excluded"
+    elif node.selected < node.files:
+        text += f", {node.selected:,} selected"
+    return text
+
+
+def _describe_totals(files: int, size: int) -> str:
+    return f"{files:,} file{'s' if files != 1 else ''}, {_format_size(size)}, ~{_format_count(estimate_tokens(size))} tokens"
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            break
+    return f"{size:.1f} {unit}"
+
+
+def _format_count(count: int) -> str:
+    if count < 1000:
+        return str(count)
+    if count < 1_000_000:
+        return f"{count / 1000:.1f}K"
+    return f"{count / 1_000_000:.1f}M"
+
+
+def walk_inventory(repo_path: Path, skip_dirs: Iterable[str] = (), start: str = '',
+                   inventory: Optional[RepoInventory] = None) -> RepoInventory:
+    """Stat every file under repo_path (except .git), without descending into skip_dirs.
+
+    With start (a relative directory), only that directory is walked; its
+    files are added to inventory if one is given.
+    """
+    if inventory is None:
+        inventory = RepoInventory()
+    skip = set(skip_dirs)
+    stack = [start]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(repo_path, rel_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name == '.git':
+                            continue
+                        if entry.name in skip:
+                            inventory.skipped.append(rel_path)
+                        else:
+                            stack.append(rel_path)
+                    elif entry.is_file():
+                        inventory.files[rel_path] = entry.stat().st_size
+                except OSError:
+                    continue
+    return inventory
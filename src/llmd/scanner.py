@@ -1,9 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Set, Iterator
+from typing import List, Dict, Any, Optional, Set, Iterator
 import os
+import stat
 import click
 import pathspec
+from .cache import DEFAULT_CACHE_DIR
+from .generated import GENERATED_CACHE_FILE, GeneratedFileDetector, parse_generated_policy
 from .parser import GitignoreParser, LlmMdParser
+from .repomap import RepoInventory, walk_inventory
+from .scheduler import default_workers
 
 
 class RepoScanner:
@@ -25,15 +31,32 @@ class RepoScanner:
     SKIP_DIRS = {
         '.git', '__pycache__', 'node_modules', '.venv', 'venv', 
         'env', '.env', '.tox', '.pytest_cache', '.mypy_cache',
-        'dist', 'build', 'target', '.next', '.nuxt'
+        'dist', 'build', 'target', '.next', '.nuxt', '.llmd-cache'
     }
     
     def __init__(self, repo_path: Path, gitignore_parser: GitignoreParser, 
-                 llm_parser: LlmMdParser, verbose: bool = False):
+                 llm_parser: LlmMdParser, verbose: bool = False, generated: Optional[str] = None,
+                 use_cache: Optional[bool] = None, repo_map: Optional[bool] = None):
         self.repo_path = repo_path
         self.gitignore_parser = gitignore_parser
         self.llm_parser = llm_parser
         self.verbose = verbose
+        # What to do with generated and vendored files (include, stub or
+        # drop), and whether marker verdicts are cached on disk; both
+        # override the llm.md options
+        options = llm_parser.get_options()
+        self.generated_policy = parse_generated_policy(
+            generated if generated is not None else options.get('generated', 'include'))
+        self.use_cache = bool(use_cache if use_cache is not None else options.get('cache', False))
+        # Whether scans record the sizes of every file they walk past, for
+        # the repository map (see inventory)
+        self.record_inventory = bool(repo_map if repo_map is not None else options.get('repo_map', False))
+        # Inventory the next walk of a scan fills in, and the one the last scan filled
+        self._recording: Optional[RepoInventory] = None
+        self._inventory: Optional[RepoInventory] = None
+        # Generated files found by the last scan, by relative path, with the
+        # reason ('linguist-generated', 'linguist-vendored', '-diff' or 'marker')
+        self.generated: Dict[str, str] = {}
         self._pattern_cache = {}
         self._gitignore_cache = {}
         # Pre-calculate repo path string for faster operations
@@ -45,8 +68,29 @@ class RepoScanner:
         # Pre-compute directory patterns for whitelist mode optimization
         self._whitelist_dir_patterns = None
         self._should_prune_dirs = False
+        # Files to consider instead of walking the repository, during a scan of given paths
+        self._candidates: Optional[List[Path]] = None
+    
+    def scan(self, paths: Optional[List[Path]] = None) -> List[Path]:
+        """Scan the repository, then apply the generated-file policy.
+        
+        With paths, only those files are considered instead of walking the
+        repository (see llmd.vcs.changed_files); the llm.md rules and default
+        exclusions still apply to them.
+        """
+        self._candidates = [path for path in paths if path.is_file()] if paths is not None else None
+        self._inventory = None
+        self._recording = RepoInventory() if self.record_inventory and paths is None else None
+        try:
+            files = self._scan_files()
+        finally:
+            self._candidates = None
+            self._recording = None
+        if self.generated_policy == 'include':
+            return files
+        return self._filter_generated(files)
     
-    def scan(self) -> List[Path]:
+    def _scan_files(self) -> List[Path]:
         """Optimized single-pass scan with early filtering."""
         mode = self.llm_parser.get_mode()
         
@@ -187,10 +231,16 @@ class RepoScanner:
     
     def _scan_optimized_whitelist(self) -> Iterator[Path]:
         """Use os.walk() for whitelist mode with smart directory pruning."""
+        if self._candidates is not None:
+            yield from self._candidates
+            return
+        inventory = self._take_recording()
+        unrecorded: Set[str] = set()
         for root, dirs, files in os.walk(self.repo_path):
             # Always skip .git
             if '.git' in dirs:
                 dirs.remove('.git')
+            walked = list(dirs)
             
             # Smart directory pruning in whitelist mode
             if self._should_prune_dirs and self._whitelist_dir_patterns:
@@ -217,6 +267,8 @@ class RepoScanner:
                             dirs[:] = []  # Don't recurse into subdirectories
                 except ValueError:
                     pass
+            if inventory is not None:
+                self._record_walk_step(inventory, unrecorded, root, dirs, [d for d in walked if d not in dirs], files)
             
             root_path = Path(root)
             # Pre-calculate root_path string to avoid repeated conversions
@@ -229,9 +281,16 @@ class RepoScanner:
     
     def _scan_optimized_blacklist(self) -> Iterator[Path]:
         """Use os.walk() for blacklist mode - must walk all directories (except .git)."""
+        if self._candidates is not None:
+            yield from self._candidates
+            return
+        inventory = self._take_recording()
+        unrecorded: Set[str] = set()
         for root, dirs, files in os.walk(self.repo_path):
             # Only skip .git directory (matches _walk_absolutely_all_directories behavior)
             dirs[:] = [d for d in dirs if d != '.git']
+            if inventory is not None:
+                self._record_walk_step(inventory, unrecorded, root, dirs, [], files)
             
             root_path = Path(root)
             for filename in files:
@@ -239,6 +298,58 @@ class RepoScanner:
                 # Ensure we're yielding proper Path objects
                 yield full_path
     
+    def _take_recording(self) -> Optional[RepoInventory]:
+        """The inventory for the walk starting now to fill in, if it is the scan's first walk."""
+        inventory, self._recording = self._recording, None
+        if inventory is not None:
+            self._inventory = inventory
+        return inventory
+    
+    def _record_walk_step(self, inventory: RepoInventory, unrecorded: Set[str], root: str,
+                          dirs: List[str], pruned: List[str], files: List[str]) -> None:
+        """Record one os.walk step: the sizes of its files, and of those in pruned directories.
+        
+        SKIP_DIRS directories are walked by some scans, but only named in the
+        inventory; unrecorded holds them and everything below them.
+        """
+        rel_root = os.path.relpath(root, self._repo_path_str).replace(os.sep, '/')
+        prefix = '' if rel_root == '.' else rel_root + '/'
+        if rel_root in unrecorded:
+            unrecorded.update(prefix + d for d in dirs)
+            return
+        for d in pruned:
+            self._record_skipped_directory(inventory, prefix + d)
+        for d in dirs:
+            if d in self.SKIP_DIRS:
+                inventory.skipped.append(prefix + d)
+                unrecorded.add(prefix + d)
+        for filename in files:
+            self._record_file(inventory, os.path.join(root, filename), prefix + filename)
+    
+    def _record_skipped_directory(self, inventory: RepoInventory, rel_path: str) -> None:
+        """Record a directory the scan does not walk.
+        
+        SKIP_DIRS directories are only named; the files of others (hidden or
+        pruned directories) are still recorded, with a stat-only walk of just
+        that directory.
+        """
+        name = rel_path.rsplit('/', 1)[-1]
+        if name == '.git':
+            return
+        if name in self.SKIP_DIRS:
+            inventory.skipped.append(rel_path)
+        else:
+            walk_inventory(self.repo_path, self.SKIP_DIRS, start=rel_path, inventory=inventory)
+    
+    def _record_file(self, inventory: RepoInventory, path: str, rel_path: str) -> None:
+        """Record the size of a regular file."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        if stat.S_ISREG(st.st_mode):
+            inventory.files[rel_path] = st.st_size
+    
     def _scan_whitelist_optimized(self, pattern_specs: Dict[str, pathspec.PathSpec], options: Dict[str, Any]) -> List[Path]:
         """Optimized whitelist mode scanning."""
         files = []
@@ -543,7 +654,7 @@ class RepoScanner:
         """Scan all files (excluding those that should be skipped)."""
         files = []
         
-        for path in self._walk_directory(self.repo_path):
+        for path in self._walk_directory(self.repo_path, self._take_recording()):
             if not path.is_file():
                 continue
             
@@ -554,25 +665,47 @@ class RepoScanner:
         
         return files
     
-    def _walk_directory(self, directory: Path):
-        """Walk directory tree, skipping certain directories."""
+    def _walk_directory(self, directory: Path, inventory: Optional[RepoInventory] = None):
+        """Walk directory tree, skipping certain directories.
+        
+        With an inventory, the sizes of the files walked and the directories
+        skipped are recorded in it.
+        """
+        if self._candidates is not None:
+            yield from (path for path in self._candidates if not self._in_skipped_directory(path))
+            return
         for item in directory.iterdir():
             if item.is_dir():
                 # Check if directory might have includes before skipping
                 if self._might_have_includes_in_directory(item):
                     # Don't skip if includes might match files inside
                     pass
-                elif item.name in self.SKIP_DIRS:
-                    # Skip known problematic directories
-                    continue
-                elif item.name.startswith('.'):
-                    # Skip hidden directories
+                elif item.name in self.SKIP_DIRS or item.name.startswith('.'):
+                    # Skip known problematic directories and hidden directories
+                    if inventory is not None:
+                        self._record_skipped_directory(inventory, item.relative_to(self.repo_path).as_posix())
                     continue
                 
-                yield from self._walk_directory(item)
+                if inventory is not None and item.name in self.SKIP_DIRS:
+                    inventory.skipped.append(item.relative_to(self.repo_path).as_posix())
+                    yield from self._walk_directory(item)
+                else:
+                    yield from self._walk_directory(item, inventory)
             else:
+                if inventory is not None:
+                    self._record_file(inventory, str(item), item.relative_to(self.repo_path).as_posix())
                 yield item
     
+    def _in_skipped_directory(self, path: Path) -> bool:
+        """Whether _walk_directory would not reach path, for scans of given paths."""
+        directory = path.parent
+        while directory != self.repo_path and directory != directory.parent:
+            if not self._might_have_includes_in_directory(directory) and (
+                    directory.name in self.SKIP_DIRS or directory.name.startswith('.')):
+                return True
+            directory = directory.parent
+        return False
+    
     def _might_have_includes_in_directory(self, directory: Path) -> bool:
         """Check if include patterns might match files in this directory."""
         if not self.llm_parser.has_include_patterns():
@@ -654,7 +787,7 @@ class RepoScanner:
         """Legacy scan all files method."""
         files = []
         
-        for path in self._walk_directory(self.repo_path):
+        for path in self._walk_directory(self.repo_path, self._take_recording()):
             if not path.is_file():
                 continue
             
@@ -667,23 +800,35 @@ class RepoScanner:
     
     def _get_all_files(self) -> List[Path]:
         """Discover all files in repository, including those in normally skipped directories."""
+        if self._candidates is not None:
+            return list(self._candidates)
         files = []
         
-        for path in self._walk_absolutely_all_directories(self.repo_path):
+        for path in self._walk_absolutely_all_directories(self.repo_path, self._take_recording()):
             if path.is_file():
                 files.append(path)
         
         return files
     
-    def _walk_absolutely_all_directories(self, directory: Path):
-        """Walk directory tree, including normally skipped directories (except .git)."""
+    def _walk_absolutely_all_directories(self, directory: Path, inventory: Optional[RepoInventory] = None):
+        """Walk directory tree, including normally skipped directories (except .git).
+        
+        With an inventory, the sizes of the files walked are recorded in it;
+        SKIP_DIRS directories are walked but only named.
+        """
         for item in directory.iterdir():
             if item.is_dir():
                 # Only skip .git directory (always unsafe)
                 if item.name == '.git':
                     continue
-                yield from self._walk_absolutely_all_directories(item)
+                if inventory is not None and item.name in self.SKIP_DIRS:
+                    inventory.skipped.append(item.relative_to(self.repo_path).as_posix())
+                    yield from self._walk_absolutely_all_directories(item)
+                else:
+                    yield from self._walk_absolutely_all_directories(item, inventory)
             else:
+                if inventory is not None:
+                    self._record_file(inventory, str(item), item.relative_to(self.repo_path).as_posix())
                 yield item
     
     def _walk_all_directories(self, directory: Path):
@@ -816,6 +961,51 @@ class RepoScanner:
         
         return files
     
+    def _filter_generated(self, files: List[Path]) -> List[Path]:
+        """Record the generated files among files; drop them under the drop policy.
+        
+        Marker checks read only the start of each file, on a thread pool.
+        With the cache option their verdicts are kept in the cache directory.
+        """
+        cache_path = None
+        if self.use_cache:
+            options = self.llm_parser.get_options()
+            directory = Path(str(options.get('cache_dir', DEFAULT_CACHE_DIR))).expanduser()
+            if not directory.is_absolute():
+                directory = self.repo_path / directory
+            cache_path = directory / GENERATED_CACHE_FILE
+        detector = GeneratedFileDetector(self.repo_path, cache_path)
+        
+        rel_paths = [self._get_cached_relative_path(file) or str(file) for file in files]
+        with ThreadPoolExecutor(max_workers=default_workers()) as executor:
+            reasons = list(executor.map(detector.reason, files, rel_paths))
+        try:
+            detector.save()
+        except OSError:
+            pass
+        
+        self.generated = {rel: reason for rel, reason in zip(rel_paths, reasons) if reason is not None}
+        if self.verbose and self.generated:
+            action = 'Dropped' if self.generated_policy == 'drop' else 'Stubbed'
+            click.echo(f"{action} {len(self.generated)} generated files ({detector.reads} read for markers)")
+        if self.generated_policy == 'drop':
+            return [file for file, reason in zip(files, reasons) if reason is None]
+        return files
+    
+    def inventory(self) -> RepoInventory:
+        """Sizes of every file in the repository, selected or not, for the repository map.
+        
+        Only stat data is used. Directories in SKIP_DIRS are listed but not
+        walked, so dependency trees do not dominate the cost. With
+        record_inventory, this was recorded during the last scan's own walk
+        (see _record_walk_step), so the repository is not walked again;
+        scans that did not walk it, such as scans of given paths, fall back
+        to a separate walk.
+        """
+        if self._inventory is not None:
+            return self._inventory
+        return walk_inventory(self.repo_path, self.SKIP_DIRS)
+    
     def clear_caches(self):
         """Clear all internal caches. Useful for long-running processes."""
         self._pattern_cache.clear()
@@ -0,0 +1,322 @@
+from concurrent.futures import Executor, Future
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, TypeVar
+import heapq
+import math
+import os
+import struct
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+# Read orders understood by the generator
+READ_ORDERS = ('auto', 'path', 'size', 'inode', 'extent')
+
+
+class WindowedScheduler:
+    """Run tasks on an executor with bounded work in flight, yielding results in order.
+
+    A task counts as in flight from the moment it is submitted until the
+    consumer has taken its result, so both running tasks and completed results
+    parked in the reorder buffer are covered by the limits. New work is only
+    submitted when the consumer asks for the next result, which propagates
+    backpressure from a slow writer all the way to the readers.
+    """
+
+    def __init__(self, executor: Executor, max_tasks: int, max_bytes: int, lookahead: Optional[int] = None):
+        self.executor = executor
+        self.max_tasks = max(1, max_tasks)
+        self.max_bytes = max(1, max_bytes)
+        # How far past the next result submissions may be reordered
+        self.lookahead = max(1, lookahead) if lookahead else self.max_tasks * 4
+        # High-water marks, useful for verbose output and tests
+        self.peak_tasks = 0
+        self.peak_bytes = 0
+
+    def map(self, func: Callable[[T], R], items: Sequence[T], weights: Sequence[int],
+            keys: Optional[Sequence[Any]] = None) -> Iterator['Future[R]']:
+        """Submit func(item) for every item and yield the futures in item order.
+
+        Args:
+            func: Callable run on the executor for each item
+            items: Work items, in the order results must be emitted
+            weights: Approximate memory cost of each item (e.g. file size in bytes)
+            keys: Optional submission priority per item (lowest first). Only
+                items within ``lookahead`` of the next result are eligible, so
+                reordering never holds more than a window of results back.
+
+        The next item to emit is always submitted even when it alone exceeds
+        max_bytes or the task limit, so oversized items cannot stall the
+        pipeline and reordering cannot starve the head of the queue.
+        """
+        count = len(items)
+        pending: Dict[int, Future] = {}
+        submitted = bytearray(count)
+        in_flight_bytes = 0
+        # Priority queue of eligible items; without keys, plain item order
+        eligible: List[tuple] = []
+        next_eligible = 0
+        lookahead = self.lookahead if keys is not None else count
+
+        def submit(i: int) -> None:
+            nonlocal in_flight_bytes
+            pending[i] = self.executor.submit(func, items[i])
+            submitted[i] = 1
+            in_flight_bytes += weights[i]
+
+        try:
+            for index in range(count):
+                limit = min(count, index + lookahead)
+                while next_eligible < limit:
+                    key = keys[next_eligible] if keys is not None else next_eligible
+                    heapq.heappush(eligible, (key, next_eligible))
+                    next_eligible += 1
+
+                if not submitted[index]:
+                    submit(index)
+
+                while eligible and len(pending) < self.max_tasks:
+                    _, i = eligible[0]
+                    if submitted[i]:
+                        heapq.heappop(eligible)
+                        continue
+                    if in_flight_bytes + weights[i] > self.max_bytes:
+                        break
+                    heapq.heappop(eligible)
+                    submit(i)
+
+                self.peak_tasks = max(self.peak_tasks, len(pending))
+                self.peak_bytes = max(self.peak_bytes, in_flight_bytes)
+
+                yield pending.pop(index)
+                # The consumer is done with this result - release its budget
+                in_flight_bytes -= weights[index]
+        finally:
+            # Consumer stopped early - drop work that has not started yet
+            for future in pending.values():
+                future.cancel()
+
+
+def is_rotational(path: Path) -> bool:
+    """Best-effort check whether path lives on a spinning disk (Linux only)."""
+    try:
+        st_dev = os.stat(path).st_dev
+        device = Path(f'/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}')
+        # Partitions keep the queue attributes on their parent device
+        for queue in (device / 'queue', device / '..' / 'queue'):
+            flag = queue / 'rotational'
+            if flag.exists():
+                return flag.read_text().strip() == '1'
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+# FS_IOC_FIEMAP = _IOWR('f', 11, struct fiemap)
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct('=QQLLLL')
+_FIEMAP_EXTENT = struct.Struct('=QQQQQLLLL')
+# Extent location not known yet (e.g. delayed allocation)
+_FIEMAP_EXTENT_UNKNOWN = 0x2
+
+
+def physical_offset(path: Path) -> Optional[int]:
+    """Physical byte offset of a file's first extent, or None if unavailable.
+
+    Uses the Linux FIEMAP ioctl; filesystems without it (tmpfs, most network
+    filesystems) and other platforms return None.
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return None
+    request = bytearray(_FIEMAP_HEADER.size + _FIEMAP_EXTENT.size)
+    # Map the whole file but ask for a single extent
+    _FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, _FS_IOC_FIEMAP, request, True)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    mapped = _FIEMAP_HEADER.unpack_from(request, 0)[3]
+    if not mapped:
+        return None
+    extent = _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)
+    if extent[5] & _FIEMAP_EXTENT_UNKNOWN:
+        return None
+    return extent[1]
+
+
+def cgroup_cpu_quota(proc_root: Path = Path('/proc'), cgroup_root: Path = Path('/sys/fs/cgroup')) -> Optional[float]:
+    """CPU quota of the current cgroup in CPUs (e.g. 2.0), or None if unlimited.
+    
+    Understands cgroup v2 ``cpu.max`` and cgroup v1 ``cpu.cfs_quota_us`` /
+    ``cpu.cfs_period_us``. Limits set on parent cgroups also apply, so the
+    smallest quota along the path wins.
+    """
+    try:
+        lines = (proc_root / 'self' / 'cgroup').read_text().splitlines()
+    except OSError:
+        return None
+    
+    quotas = []
+    for line in lines:
+        parts = line.split(':', 2)
+        if len(parts) != 3:
+            continue
+        hierarchy, controllers, path = parts
+        if hierarchy == '0' and controllers == '':
+            quotas += _cgroup_quotas(cgroup_root, path, _read_cpu_max)
+        elif 'cpu' in controllers.split(','):
+            # v1 controllers are mounted as e.g. cpu,cpuacct or cpu
+            for mount in (cgroup_root / controllers, cgroup_root / 'cpu'):
+                if mount.is_dir():
+                    quotas += _cgroup_quotas(mount, path, _read_cfs_quota)
+                    break
+    
+    return min(quotas) if quotas else None
+
+
+def _cgroup_quotas(mount: Path, cgroup_path: str, reader: Callable[[Path], Optional[float]]) -> List[float]:
+    """Collect quotas from a cgroup directory and all of its parents.
+    
+    Inside a container the cgroup path from /proc is often not visible and
+    the container's own cgroup is mounted at the root, so the root is always
+    checked as well.
+    """
+    quotas = []
+    directory = mount / cgroup_path.lstrip('/')
+    candidates = [directory, *directory.parents] if directory.is_dir() else [mount]
+    for candidate in candidates:
+        quota = reader(candidate)
+        if quota is not None:
+            quotas.append(quota)
+        if candidate == mount:
+            break
+    return quotas
+
+
+def _read_cpu_max(directory: Path) -> Optional[float]:
+    """Parse a cgroup v2 cpu.max file ("max 100000" or "200000 100000")."""
+    try:
+        quota, period = (directory / 'cpu.max').read_text().split()[:2]
+    except (OSError, ValueError):
+        return None
+    if quota == 'max' or int(period) <= 0:
+        return None
+    return int(quota) / int(period)
+
+
+def _read_cfs_quota(directory: Path) -> Optional[float]:
+    """Parse cgroup v1 cpu.cfs_quota_us / cpu.cfs_period_us (-1 means unlimited)."""
+    try:
+        quota = int((directory / 'cpu.cfs_quota_us').read_text())
+        period = int((directory / 'cpu.cfs_period_us').read_text())
+    except (OSError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
+
+
+def available_cpus() -> int:
+    """Number of CPUs this process can actually use.
+    
+    ``os.cpu_count()`` reports every CPU on the host; this also honours the
+    scheduler affinity mask and any cgroup CPU quota, which is what limits
+    containers on large CI hosts.
+    """
+    if hasattr(os, 'process_cpu_count'):
+        count = os.process_cpu_count() or 1
+    elif hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0)) or 1
+    else:
+        count = os.cpu_count() or 1
+    
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, math.ceil(quota)))
+    return count
+
+
+def default_workers() -> int:
+    """Default I/O thread count: a few threads per usable CPU, capped at 32."""
+    return min(32, available_cpus() * 4)
+
+
+class AdaptiveConcurrency:
+    """Hill-climbing limit on how many reads run at once.
+    
+    Worker threads hold a slot while reading. Every ``interval`` seconds the
+    measured throughput is compared with the previous interval: if it got
+    worse, the direction of adjustment flips, otherwise the limit keeps
+    moving the same way. The limit stays between 1 and ``max_limit``.
+    """
+    
+    def __init__(self, max_limit: int, initial: Optional[int] = None, interval: float = 0.25,
+                 tolerance: float = 0.05, clock: Callable[[], float] = time.monotonic):
+        self.max_limit = max(1, max_limit)
+        self.limit = min(self.max_limit, max(1, initial or self.max_limit // 2))
+        self.interval = interval
+        self.tolerance = tolerance
+        self.history: List[int] = [self.limit]
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._active = 0
+        self._direction = 1
+        self._window_start = clock()
+        self._window_bytes = 0
+        self._last_throughput: Optional[float] = None
+    
+    @contextmanager
+    def slot(self):
+        """Block until fewer than ``limit`` reads are running, then hold a slot."""
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+    
+    def record(self, nbytes: int) -> None:
+        """Account for completed work and adjust the limit once per interval."""
+        with self._condition:
+            self._window_bytes += nbytes
+            now = self._clock()
+            elapsed = now - self._window_start
+            if elapsed < self.interval:
+                return
+            
+            throughput = self._window_bytes / elapsed
+            if self._last_throughput is not None and throughput < self._last_throughput * (1 - self.tolerance):
+                self._direction = -self._direction
+            self._last_throughput = throughput
+            
+            step = max(1, self.limit // 4)
+            new_limit = min(self.max_limit, max(1, self.limit + self._direction * step))
+            if new_limit == self.limit:
+                # Pinned at a bound - probe the other way next time
+                self._direction = -self._direction
+            else:
+                self.limit = new_limit
+                self.history.append(new_limit)
+                self._condition.notify_all()
+            
+            self._window_start = now
+            self._window_bytes = 0
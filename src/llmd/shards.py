@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Union
+import re
+
+SHARD_UNITS = ('bytes', 'tokens')
+
+_SIZE_PATTERN = re.compile(
+    r'^\s*(\d+(?:\.\d+)?)\s*([km]?)\s*(b|bytes|t|tokens)?\s*$',
+    re.IGNORECASE,
+)
+_MULTIPLIERS = {'': 1, 'k': 1024, 'm': 1024 * 1024}
+_TOKEN_MULTIPLIERS = {'': 1, 'k': 1000, 'm': 1000 * 1000}
+
+
+@dataclass(frozen=True)
+class ShardLimit:
+    """Maximum size of one output part."""
+    amount: int
+    unit: str  # 'bytes' or 'tokens'
+
+
+def parse_shard_size(value: Union[int, str]) -> ShardLimit:
+    """Parse a shard size such as ``2MB``, ``500k``, ``1048576`` or ``100k tokens``.
+
+    Plain numbers and ``B``/``KB``/``MB`` suffixes are bytes (binary
+    multiples); a ``t``/``tokens`` suffix makes the limit a token count,
+    where ``k`` and ``m`` are decimal.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid shard_size '{value}'. Expected e.g. 2MB, 500KB or 100k tokens.")
+    if isinstance(value, int):
+        amount, unit = value, 'bytes'
+    else:
+        match = _SIZE_PATTERN.match(str(value))
+        if not match:
+            raise ValueError(f"Invalid shard_size '{value}'. Expected e.g. 2MB, 500KB or 100k tokens.")
+        number, prefix, suffix = match.groups()
+        prefix = prefix.lower()
+        if suffix and suffix.lower() in ('t', 'tokens'):
+            amount, unit = int(float(number) * _TOKEN_MULTIPLIERS[prefix]), 'tokens'
+        else:
+            amount, unit = int(float(number) * _MULTIPLIERS[prefix]), 'bytes'
+    if amount <= 0:
+        raise ValueError(f"Invalid shard_size '{value}'. The size must be positive.")
+    return ShardLimit(amount, unit)
+
+
+def part_path(output_path: Path, index: int) -> Path:
+    """Path of part ``index`` (1-based): llm-context.md -> llm-context.part-001.md."""
+    return output_path.with_name(f"{output_path.stem}.part-{index:03d}{output_path.suffix}")
+
+
+def stale_parts(output_path: Path, part_count: int) -> List[Path]:
+    """Parts left over from an earlier run that produced more parts."""
+    pattern = re.compile(rf'^{re.escape(output_path.stem)}\.part-(\d+){re.escape(output_path.suffix)}$')
+    stale = []
+    for path in output_path.parent.glob(f"{output_path.stem}.part-*{output_path.suffix}"):
+        match = pattern.match(path.name)
+        if match and int(match.group(1)) > part_count:
+            stale.append(path)
+    return sorted(stale)
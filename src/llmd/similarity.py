@@ -0,0 +1,158 @@
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import difflib
+import zlib
+
+# Number of MinHash values per signature
+SIGNATURE_SIZE = 64
+
+# Lines per shingle; files shorter than this form a single shingle
+SHINGLE_LINES = 3
+
+# Default similarity above which files are collapsed into diffs
+DEFAULT_THRESHOLD = 0.8
+
+# Context lines around each change in the emitted diffs
+DIFF_CONTEXT = 1
+
+_MASK = (1 << 64) - 1
+
+
+def _mix(value: int) -> int:
+    """64-bit finalizer (splitmix64), spreading tuple hashes over all bits."""
+    value &= _MASK
+    value ^= value >> 33
+    value = (value * 0xff51afd7ed558ccd) & _MASK
+    value ^= value >> 33
+    value = (value * 0xc4ceb9fe1a85ec53) & _MASK
+    return value ^ (value >> 33)
+
+
+def minhash_signature(data: bytes, size: int = SIGNATURE_SIZE) -> Optional[bytes]:
+    """MinHash signature of a text's line shingles, packed as 64-bit values.
+
+    Lines are stripped and blank lines dropped, so reindented or respaced
+    copies still match. Uses one-permutation hashing: every shingle is
+    hashed once and kept only if it is the minimum of its bin, and empty
+    bins borrow from the next non-empty bin (rotation densification). That
+    makes a signature cost one hash per line rather than one per line per
+    permutation. Returns None for texts without any non-blank line.
+    """
+    hashes = [zlib.crc32(line) for line in (line.strip() for line in data.split(b'\n')) if line]
+    if not hashes:
+        return None
+    width = min(SHINGLE_LINES, len(hashes))
+    empty = _MASK + 1
+    mins = [empty] * size
+    for shingle in zip(*(hashes[i:] for i in range(width))):
+        value = _mix(hash(shingle))
+        slot = value % size
+        value //= size
+        if value < mins[slot]:
+            mins[slot] = value
+
+    offset = _MASK // size + 1
+    signature = array('Q', bytes(8 * size))
+    for slot in range(size):
+        step = 0
+        while mins[(slot + step) % size] == empty:
+            step += 1
+        signature[slot] = (mins[(slot + step) % size] + step * offset) & _MASK
+    return signature.tobytes()
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    left, right = memoryview(a).cast('Q'), memoryview(b).cast('Q')
+    return sum(x == y for x, y in zip(left, right)) / len(left)
+
+
+def lsh_shape(size: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) for locality-sensitive hashing at a similarity threshold.
+
+    Picks the most rows per band whose collision threshold (1/bands)^(1/rows)
+    stays at or below the requested one, so pairs above the threshold are
+    very likely to share a band; candidates are then checked exactly.
+    """
+    rows = 1
+    for candidate in range(1, size + 1):
+        if (1 / (size // candidate)) ** (1 / candidate) <= threshold:
+            rows = candidate
+    return size // rows, rows
+
+
+class NearDuplicateIndex:
+    """Find earlier files whose signature is similar to a new one.
+
+    Each signature is cut into bands; files sharing any band are candidates,
+    and candidates are confirmed by comparing full signatures. Lookups cost
+    one dict probe per band, so indexing n files is O(n) rather than the
+    O(n^2) of comparing every pair.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, size: int = SIGNATURE_SIZE):
+        self.threshold = threshold
+        self.bands, self.rows = lsh_shape(size, threshold)
+        self._buckets: List[Dict[bytes, str]] = [{} for _ in range(self.bands)]
+        self._signatures: Dict[str, bytes] = {}
+
+    def _band_keys(self, signature: bytes) -> List[bytes]:
+        width = 8 * self.rows
+        return [signature[band * width:(band + 1) * width] for band in range(self.bands)]
+
+    def match(self, signature: bytes) -> Optional[Tuple[str, float]]:
+        """The most similar indexed file at or above the threshold, and its similarity."""
+        best: Optional[Tuple[str, float]] = None
+        seen = set()
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            candidate = bucket.get(key)
+            if candidate is None or candidate in seen:
+                continue
+            seen.add(candidate)
+            score = similarity(signature, self._signatures[candidate])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def add(self, name: str, signature: bytes) -> None:
+        """Index a file; the first file in each bucket stays its representative."""
+        self._signatures[name] = signature
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, name)
+
+
+class BodyCache:
+    """Recently emitted bodies, bounded by total size (least recently used out)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._bodies: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._size = 0
+
+    def get(self, name: str) -> Optional[bytes]:
+        body = self._bodies.get(name)
+        if body is not None:
+            self._bodies.move_to_end(name)
+        return body
+
+    def put(self, name: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        previous = self._bodies.pop(name, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._bodies[name] = body
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            _, evicted = self._bodies.popitem(last=False)
+            self._size -= len(evicted)
+
+
+def unified_diff(old: bytes, new: bytes, old_name: str, new_name: str, context: int = DIFF_CONTEXT) -> bytes:
+    """Unified diff between two UTF-8 texts; empty when they are equal."""
+    lines = difflib.unified_diff(
+        old.decode('utf-8').splitlines(), new.decode('utf-8').splitlines(),
+        f"a/{old_name}", f"b/{new_name}", n=context, lineterm='',
+    )
+    return '\n'.join(lines).encode('utf-8')
@@ -0,0 +1,356 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import codecs
+import hashlib
+import multiprocessing
+from .compact import compact
+from .outline import OutlineCache, outline
+from .redact import DEFAULT_ENTROPY_THRESHOLD, Redactor
+from .similarity import minhash_signature
+from .tokenizer import Tokenizer, TokenCache, content_digest, get_tokenizer
+
+
+@dataclass
+class TransformJob:
+    """A unit of CPU work."""
+    # File contents read by an I/O thread, or the path of a large file that
+    # the transform reads itself in chunks
+    data: Union[bytes, Path]
+    # Language identifier from MarkdownGenerator._get_language
+    language: str = 'text'
+    # Render an outline instead of the body, if the language has one
+    outline: bool = False
+
+
+@dataclass(frozen=True)
+class TransformSettings:
+    """Picklable description of the transforms applied to every file body."""
+    # Tokenizer spec (see get_tokenizer); loaded once per worker process
+    tokenizer: Optional[str] = None
+    # Hash bodies for token counts, the section cache and the manifest
+    hash_bodies: bool = False
+    # Read size for files transformed by path
+    chunk_size: int = 1024 * 1024
+    # Compute MinHash signatures of bodies read whole, for near-duplicates
+    signatures: bool = False
+    # Minify bodies with the rules for their language (see llmd.compact)
+    compact: bool = False
+    # Keep the first docstring line in Python outlines
+    outline_docstrings: bool = True
+    # Outline cache file to load in worker processes (see llmd.outline)
+    outline_cache: Optional[str] = None
+    # Replace secrets in bodies (see llmd.redact)
+    redact: bool = False
+    # Signatures matched on top of the default ones, as (name, regex) pairs
+    redact_patterns: Tuple[Tuple[str, str], ...] = ()
+    # Entropy threshold of the high-entropy heuristic, or None to turn it off
+    redact_entropy: Optional[float] = DEFAULT_ENTROPY_THRESHOLD
+
+
+@dataclass
+class TransformResult:
+    """Outcome of transforming one file body."""
+    # Body to emit, or None when it is the source unchanged (for a path job,
+    # the file can then be spliced into the output from disk)
+    body: Optional[bytes] = None
+    # The source is not valid UTF-8; nothing but source_hash is set
+    binary: bool = False
+    # Why the source could not be read, if it could not
+    error: Optional[str] = None
+    content_hash: Optional[bytes] = None
+    source_hash: Optional[bytes] = None
+    # Tokens in the body, without the section heading and fence
+    tokens: Optional[int] = None
+    # MinHash signature of the body (see llmd.similarity)
+    signature: Optional[bytes] = None
+    # Bytes and tokens removed by compaction
+    compacted_bytes: int = 0
+    compacted_tokens: Optional[int] = None
+    # The body is an outline of the source
+    outlined: bool = False
+    # Line breaks in a body left on disk (body is None for a path job)
+    newlines: Optional[int] = None
+    # Secrets replaced in the body, per signature name
+    redactions: Optional[Dict[str, int]] = None
+
+
+class Transformer:
+    """Apply the CPU-bound steps of rendering to file bodies.
+
+    UTF-8 validation, newline normalization, hashing and token counting all
+    hold the GIL for most of their run time, so they are kept apart from the
+    I/O and can be moved to worker processes by CpuStage.
+    """
+
+    def __init__(self, settings: TransformSettings, tokenizer: Optional[Tokenizer] = None,
+                 token_cache: Optional[TokenCache] = None, outline_cache: Optional[OutlineCache] = None):
+        self.settings = settings
+        if tokenizer is None and settings.tokenizer:
+            tokenizer = get_tokenizer(settings.tokenizer)
+        self.tokenizer = tokenizer
+        self.token_cache = token_cache if token_cache is not None else TokenCache()
+        if outline_cache is None:
+            path = Path(settings.outline_cache) if settings.outline_cache else None
+            outline_cache = OutlineCache(path, settings.outline_docstrings)
+        self.outline_cache = outline_cache
+        self.redactor = None
+        if settings.redact:
+            self.redactor = Redactor(settings.redact_patterns, settings.redact_entropy)
+
+    def run(self, jobs: List[TransformJob]) -> List[TransformResult]:
+        """Transform a batch of jobs, turning read errors into results."""
+        results = []
+        for job in jobs:
+            try:
+                if isinstance(job.data, Path):
+                    results.append(self.transform_file(job.data, job.language, job.outline))
+                else:
+                    results.append(self.transform(job.data, job.language, job.outline))
+            except Exception as e:
+                results.append(TransformResult(error=str(e)))
+        return results
+
+    def transform(self, source: bytes, language: str = 'text', outline: bool = False) -> TransformResult:
+        """Transform file contents that were read whole."""
+        try:
+            validate_utf8(source)
+        except UnicodeDecodeError:
+            return TransformResult(binary=True, source_hash=self._digest(source))
+        body = normalize_newlines(source)
+        redactions = None
+        if self.redactor is not None:
+            body, redactions = self.redactor.redact(body)
+        result = None
+        if outline:
+            result = self._outline(source, body, language, redacted=bool(redactions))
+        if result is None:
+            result = self._finish(source, body, language)
+        result.redactions = redactions or None
+        return result
+
+    def transform_file(self, path: Path, language: str = 'text', outline: bool = False) -> TransformResult:
+        """Transform a large file, validating it chunk by chunk.
+
+        A file that needs no changes is only hashed and counted, so the
+        writer can copy it from disk; otherwise it is read whole. With
+        redaction on, the file is first searched for secrets in chunks too.
+        """
+        if (self.settings.compact or outline
+                or (self.redactor is not None and self.redactor.file_has_secrets(path, self.settings.chunk_size))):
+            return self.transform(path.read_bytes(), language, outline)
+        hasher = hashlib.blake2b(digest_size=16) if self.settings.hash_bodies else None
+        try:
+            verbatim, newlines = validate_utf8_file(path, self.settings.chunk_size, hasher)
+        except UnicodeDecodeError:
+            return TransformResult(binary=True)
+        if not verbatim:
+            # Carriage returns need normalizing, so the body must be copied
+            source = path.read_bytes()
+            return self._finish(source, normalize_newlines(source), language)
+
+        result = TransformResult(newlines=newlines)
+        if hasher is not None:
+            # The body is the file verbatim
+            result.content_hash = result.source_hash = hasher.digest()
+        if self.tokenizer is not None:
+            result.tokens = self._count_file_tokens(path, result.content_hash)
+        return result
+
+    def measure(self, body: bytes) -> TransformResult:
+        """Hash and count a body that is emitted as is, such as a notice."""
+        result = self._finish(body, body)
+        result.source_hash = result.signature = None
+        return result
+
+    def _outline(self, source: bytes, body: bytes, language: str,
+                 redacted: bool = False) -> Optional[TransformResult]:
+        """Outline a body, from the cache when the content was seen before.
+
+        Outlines of redacted bodies are cached under the redacted content.
+        """
+        digest = content_digest(source)
+        key = content_digest(body) if redacted else digest
+        skeleton = self.outline_cache.get(language, key)
+        if skeleton is None:
+            skeleton = outline(body, language, self.settings.outline_docstrings)
+            if skeleton is None:
+                return None
+            self.outline_cache.put(language, key, skeleton)
+        result = self._finish(source, skeleton, source_hash=digest)
+        result.outlined = True
+        return result
+
+    def _finish(self, source: bytes, body: bytes, language: Optional[str] = None,
+                source_hash: Optional[bytes] = None) -> TransformResult:
+        """Compact (file bodies only, when language is given), hash, count and sign the final body."""
+        compacted_bytes, compacted_tokens = 0, None
+        if self.settings.compact and language is not None:
+            full = body
+            body = compact(full, language)
+            compacted_bytes = len(full) - len(body)
+            if self.tokenizer is not None:
+                compacted_tokens = self._count_tokens(full, content_digest(full)) if compacted_bytes else 0
+        result = TransformResult(None if body is source else body,
+                                 compacted_bytes=compacted_bytes, compacted_tokens=compacted_tokens)
+        if self.settings.hash_bodies:
+            result.content_hash = content_digest(body)
+            if body is source:
+                result.source_hash = result.content_hash
+            else:
+                result.source_hash = source_hash or content_digest(source)
+        if self.tokenizer is not None:
+            result.tokens = self._count_tokens(body, result.content_hash)
+            if compacted_tokens:
+                result.compacted_tokens = compacted_tokens - result.tokens
+        if self.settings.signatures:
+            result.signature = minhash_signature(body)
+        return result
+
+    def _digest(self, data: bytes) -> Optional[bytes]:
+        return content_digest(data) if self.settings.hash_bodies else None
+
+    def _count_tokens(self, body: bytes, digest: bytes) -> int:
+        """Token count of a body, from the cache when the content was seen before."""
+        count = self.token_cache.get(self.tokenizer, digest)
+        if count is None:
+            count = self.tokenizer.count(body)
+            self.token_cache.put(self.tokenizer, digest, count)
+        return count
+
+    def _count_file_tokens(self, path: Path, digest: bytes) -> int:
+        """Token count of a large file body, counted in chunks on a cache miss.
+
+        Chunks are cut after the last newline so no token spans two chunks.
+        """
+        count = self.token_cache.get(self.tokenizer, digest)
+        if count is not None:
+            return count
+
+        count = 0
+        carry = b''
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(self.settings.chunk_size)
+                if not chunk:
+                    break
+                chunk = carry + chunk
+                cut = chunk.rfind(b'\n') + 1
+                if cut:
+                    count += self.tokenizer.count(chunk[:cut])
+                    carry = chunk[cut:]
+                else:
+                    carry = chunk
+        if carry:
+            count += self.tokenizer.count(carry)
+
+        self.token_cache.put(self.tokenizer, digest, count)
+        return count
+
+
+class CpuStage:
+    """Run transforms on the calling thread or on a pool of worker processes.
+
+    With ``workers`` > 0, each batch is pickled to a ProcessPoolExecutor
+    whose processes build their own Transformer (and tokenizer) once. Bodies
+    read by the I/O threads travel as pickled bytes; large files travel as
+    paths and are read by the worker, and unchanged bodies are not sent
+    back, so spliced files never pass through the pipe. The calling I/O
+    thread blocks until its batch is done, which keeps the scheduler's
+    in-flight limits meaningful.
+    """
+
+    def __init__(self, transformer: Transformer, workers: int = 0):
+        self.transformer = transformer
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_process_context(),
+                initializer=_init_worker,
+                initargs=(transformer.settings,),
+            )
+
+    def run(self, jobs: List[TransformJob]) -> List[TransformResult]:
+        """Transform a batch of jobs."""
+        if not jobs:
+            return []
+        if self._pool is None:
+            return self.transformer.run(jobs)
+        return self._pool.submit(_run_jobs, jobs).result()
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def _process_context() -> Any:
+    """Start workers without forking the threaded parent where possible."""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# Transformer of the current worker process, set by _init_worker
+_worker: Optional[Transformer] = None
+
+
+def _init_worker(settings: TransformSettings) -> None:
+    global _worker
+    _worker = Transformer(settings)
+
+
+def _run_jobs(jobs: List[TransformJob]) -> List[TransformResult]:
+    return _worker.run(jobs)
+
+
+def validate_utf8(data: bytes) -> None:
+    """Raise UnicodeDecodeError if data is not valid UTF-8."""
+    if not data.isascii():
+        codecs.utf_8_decode(data, 'strict', True)
+
+
+def normalize_newlines(data: bytes) -> bytes:
+    """Translate CRLF and lone CR to LF, matching text-mode reads."""
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return data
+
+
+def validate_utf8_file(path: Path, chunk_size: int, hasher: Optional[Any] = None) -> Tuple[bool, int]:
+    """Validate a file as UTF-8 chunk by chunk.
+
+    Returns whether the bytes can be spliced into the output verbatim
+    (False when the file contains carriage returns that text mode would
+    have translated) and the number of line breaks, which the output index
+    needs without reading the file again. Raises UnicodeDecodeError for
+    invalid UTF-8. A hasher, if given, is fed every chunk along the way.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    # Reuse one buffer for every chunk to keep allocations flat
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    verbatim = True
+    newlines = 0
+
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            chunk = buffer if n == len(buffer) else buffer[:n]
+            if verbatim and b'\r' in chunk:
+                verbatim = False
+            newlines += chunk.count(b'\n')
+            # Pure ASCII is valid UTF-8; only decode chunks that need it,
+            # or that complete a multi-byte sequence split across chunks
+            if not chunk.isascii() or decoder.getstate()[0]:
+                decoder.decode(chunk)
+            if hasher is not None:
+                hasher.update(view[:n])
+
+    decoder.decode(b'', final=True)
+    return verbatim, newlines
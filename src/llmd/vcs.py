@@ -0,0 +1,107 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+import os
+import subprocess
+
+# Read size for streamed git output
+_CHUNK_SIZE = 64 * 1024
+
+
+def _git(repo_path: Path, args: List[str]) -> Optional[bytes]:
+    """Output of a git command run in repo_path, or None if git is missing or fails."""
+    try:
+        result = subprocess.run(['git', '-C', str(repo_path)] + args, capture_output=True)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _paths(output: bytes) -> List[str]:
+    """Paths of NUL-separated ``-z`` output."""
+    return [path.decode('utf-8', 'surrogateescape') for path in output.split(b'\0') if path]
+
+
+def _git_or_raise(repo_path: Path, args: List[str], option: str, value: str) -> bytes:
+    """Output of a git command; failures raise ValueError naming the option that asked for it."""
+    try:
+        result = subprocess.run(['git', '-C', str(repo_path)] + args, capture_output=True)
+    except OSError as e:
+        raise ValueError(f"Invalid {option} '{value}': git is not available ({e}).")
+    if result.returncode != 0:
+        message = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise ValueError(f"Invalid {option} '{value}': {message[0] if message else 'git failed'}")
+    return result.stdout
+
+
+def changed_files(repo_path: Path, ref: str = 'HEAD', option: str = 'since') -> List[str]:
+    """Files changed since ref, relative to repo_path.
+    
+    These are the files changed since the merge base of ref and HEAD
+    (committed or not), plus untracked files that are not ignored. Deleted
+    files are left out. Nothing else in the repository is walked.
+    """
+    diff = _git_or_raise(repo_path, ['diff', '--name-only', '-z', '--relative', '--no-renames', '--diff-filter=d',
+                                     '--merge-base', ref, '--'], option, ref)
+    untracked = _git_or_raise(repo_path, ['ls-files', '--others', '--exclude-standard', '-z'], option, ref)
+    return sorted(set(_paths(diff)) | set(_paths(untracked)))
+
+
+def directory_siblings(repo_path: Path, rel_paths: Iterable[str]) -> List[str]:
+    """The files in the directories of the given files (not in subdirectories), relative to repo_path."""
+    siblings: Set[str] = set()
+    for directory in {os.path.dirname(rel_path) for rel_path in rel_paths}:
+        try:
+            with os.scandir(repo_path / directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        siblings.add(f"{directory}/{entry.name}" if directory else entry.name)
+        except OSError:
+            continue
+    return sorted(siblings)
+
+
+def modified_files(repo_path: Path) -> Set[str]:
+    """Tracked files with uncommitted changes, relative to repo_path."""
+    output = _git(repo_path, ['diff', 'HEAD', '--name-only', '-z', '--relative', '--no-renames'])
+    return set(_paths(output)) if output else set()
+
+
+def last_commit_times(repo_path: Path, rel_paths: Iterable[str]) -> Dict[str, int]:
+    """Commit time of the last commit touching each file, for files with one.
+
+    History is read newest first and streamed, so reading stops as soon as
+    every file has been seen; files changed recently cost the least.
+    Paths are relative to repo_path, with ``/`` separators.
+    """
+    wanted = set(rel_paths)
+    times: Dict[str, int] = {}
+    if not wanted:
+        return times
+    try:
+        process = subprocess.Popen(
+            ['git', '-C', str(repo_path), 'log', '--format=%x01%ct', '--name-only', '-z', '--relative', '--', '.'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return times
+    current = 0
+    pending = b''
+    try:
+        while len(times) < len(wanted):
+            chunk = process.stdout.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            *tokens, pending = (pending + chunk).split(b'\0')
+            for token in tokens:
+                if token.startswith(b'\x01'):
+                    current = int(token[1:])
+                    continue
+                path = token.lstrip(b'\n').decode('utf-8', 'surrogateescape')
+                if path in wanted and path not in times:
+                    times[path] = current
+    finally:
+        process.kill()
+        process.stdout.close()
+        process.wait()
+    return times
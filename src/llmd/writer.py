@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional, Union
+import errno
+import os
+import sys
+import tempfile
+
+# Errors that mean "this copy primitive is not usable here", as opposed to a
+# genuine I/O failure: try the next, more portable method instead
+_UNSUPPORTED_COPY_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+    errno.EOPNOTSUPP, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP),
+}
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class FileSpan:
+    """A byte range of a file that is copied into the output verbatim."""
+    path: Path
+    offset: int
+    length: int
+
+    def read(self) -> bytes:
+        """Read the range into memory (for callers that need the bytes)."""
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            return f.read(self.length)
+
+    def count_newlines(self) -> int:
+        """Count line breaks in the range, reading it a chunk at a time."""
+        count = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(_COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                count += chunk.count(b'\n')
+                remaining -= len(chunk)
+        return count
+
+
+class StreamWriter:
+    """Append bytes and file spans to an open binary file, counting bytes."""
+
+    def __init__(self, file: BinaryIO):
+        self._file: Optional[BinaryIO] = file
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> None:
+        """Append raw bytes to the output."""
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def write_text(self, text: str) -> None:
+        """Append UTF-8 encoded text to the output."""
+        self.write(text.encode('utf-8'))
+
+    def write_parts(self, parts: Iterable[Union[bytes, FileSpan]]) -> None:
+        """Append a sequence of literal bytes and file spans."""
+        for part in parts:
+            if isinstance(part, FileSpan):
+                self.splice(part)
+            else:
+                self.write(part)
+
+    def splice(self, span: FileSpan) -> None:
+        """Copy a byte range of another file into the output.
+
+        Uses ``os.copy_file_range`` or ``os.sendfile`` so the data never
+        passes through Python, falling back to a plain chunked copy.
+        """
+        with open(span.path, 'rb') as src:
+            self.copy_from(src, span.offset, span.length)
+
+    def copy_from(self, src: BinaryIO, offset: int, length: int) -> None:
+        """Copy a byte range of an open file (e.g. a spool file) into the output."""
+        # Everything buffered so far must land before the kernel appends
+        self._file.flush()
+        if hasattr(src, 'flush'):
+            src.flush()
+        self.bytes_written += _copy_range(src, self._file, offset, length)
+
+
+class AtomicFileWriter(StreamWriter):
+    """Stream bytes to a temporary file and atomically move it into place.
+
+    The temporary file lives next to the final output so the closing
+    ``os.replace`` never crosses a filesystem boundary. Readers of the output
+    path either see the previous file or the complete new one, never a
+    partially written document.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        fd, tmp_name = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+        self.tmp_path = Path(tmp_name)
+        super().__init__(os.fdopen(fd, 'wb'))
+
+    def commit(self) -> None:
+        """Close the temporary file and move it over the final output path."""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.chmod(self.tmp_path, self._target_mode())
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            self.tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _target_mode(self) -> int:
+        """Permissions the output would get from a plain ``write_text``."""
+        try:
+            return self.path.stat().st_mode & 0o777
+        except OSError:
+            # mkstemp creates 0600 files; mirror the umask-derived default instead
+            umask = os.umask(0)
+            os.umask(umask)
+            return 0o666 & ~umask
+
+    def __enter__(self) -> 'AtomicFileWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, length: int) -> int:
+    """Copy length bytes of src starting at offset to the current end of dst.
+
+    Returns the number of bytes copied, which is short only if the source
+    file shrank after it was sized.
+    """
+    copied = 0
+    src_fd = src.fileno()
+    dst_fd = dst.fileno()
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                n = os.copy_file_range(src_fd, dst_fd, length - copied, offset + copied)
+                if n == 0:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
+
+    # Linux sendfile accepts regular files as the destination; macOS does not
+    if sys.platform.startswith('linux') and hasattr(os, 'sendfile'):
+        try:
+            while copied < length:
+                n = os.sendfile(dst_fd, src_fd, offset + copied, length - copied)
+                if n == 0:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                raise
+
+    src.seek(offset + copied)
+    while copied < length:
+        chunk = src.read(min(_COPY_CHUNK_SIZE, length - copied))
+        if not chunk:
+            break
+        dst.write(chunk)
+        copied += len(chunk)
+    return copied
@@ -0,0 +1,107 @@
+from llmd.budget import (BYTES_PER_TOKEN, BudgetCandidate, BudgetEnforcer, calibrate_bytes_per_token, estimate_tokens,
+                         plan_budget, score_candidates)
+from llmd.tokenizer import HeuristicTokenizer
+
+
+def candidate(rel_path, tokens, mtime=0.0):
+    return BudgetCandidate(rel_path, size=tokens * 4, mtime=mtime, tokens=tokens)
+
+
+class TestScoring:
+    """Test file priority scores."""
+
+    def test_include_hits_rank_first(self):
+        """Test that INCLUDE matches outrank READMEs and small files."""
+        candidates = [candidate("README.md", 10), candidate("docs/spec.md", 5000), candidate("tiny.py", 1)]
+        score_candidates(candidates, ["docs/"])
+        assert candidates[1].score > candidates[0].score > candidates[2].score
+
+    def test_root_readme_beats_nested_readme(self):
+        """Test that shallower READMEs are preferred."""
+        candidates = [candidate("README.md", 100), candidate("pkg/README.md", 100)]
+        score_candidates(candidates)
+        assert candidates[0].score > candidates[1].score
+
+    def test_entry_points_beat_plain_files(self):
+        """Test that entry points rank above ordinary modules of the same size."""
+        candidates = [candidate("src/helpers.py", 100), candidate("src/__main__.py", 100)]
+        score_candidates(candidates)
+        assert candidates[1].score > candidates[0].score
+
+    def test_smaller_and_newer_files_preferred(self):
+        """Test the size and recency components."""
+        by_size = [candidate("a.py", 100), candidate("b.py", 10000)]
+        score_candidates(by_size)
+        assert by_size[0].score > by_size[1].score
+
+        by_age = [candidate("a.py", 100, mtime=1.0), candidate("b.py", 100, mtime=2.0)]
+        score_candidates(by_age)
+        assert by_age[1].score > by_age[0].score
+
+
+class TestPlanBudget:
+    """Test greedy selection under a token budget."""
+
+    def test_keeps_original_order(self):
+        """Test that selected indices stay in file order."""
+        candidates = [candidate("b.py", 10), candidate("README.md", 10), candidate("a.py", 10)]
+        score_candidates(candidates)
+        plan = plan_budget(candidates, 100)
+        assert plan.selected == [0, 1, 2]
+        assert plan.omitted == []
+        assert plan.planned_tokens == 30
+
+    def test_skips_files_that_do_not_fit(self):
+        """Test that a large file is skipped and smaller ones still fill the budget."""
+        candidates = [candidate("README.md", 50), candidate("big.py", 500), candidate("small.py", 40)]
+        score_candidates(candidates)
+        plan = plan_budget(candidates, 100)
+        assert plan.selected == [0, 2]
+        assert plan.omitted == [1]
+
+    def test_reserved_tokens_are_charged(self):
+        """Test that header and TOC costs reduce the space for files."""
+        candidates = [candidate("a.py", 60)]
+        assert plan_budget(candidates, 100, reserved=50).omitted == [0]
+
+    def test_estimate_rounds_up(self):
+        assert estimate_tokens(0) == 0
+        assert estimate_tokens(1) == 1
+        assert estimate_tokens(9) == 3
+        assert estimate_tokens(9, bytes_per_token=3) == 3
+        assert estimate_tokens(10, bytes_per_token=2.5) == 4
+
+    def test_calibration(self):
+        """Test that the ratio is measured by the tokenizer and never above the default."""
+        tokenizer = HeuristicTokenizer()
+        assert calibrate_bytes_per_token([], tokenizer) == BYTES_PER_TOKEN
+        assert calibrate_bytes_per_token([b"a(b, c);\n" * 10], tokenizer) == 1.125
+        assert calibrate_bytes_per_token([b"abcd " * 10], tokenizer) == BYTES_PER_TOKEN
+
+
+class TestBudgetEnforcer:
+    """Test keeping the plan within the budget on exact counts."""
+
+    def test_low_estimates_drop_the_lowest_priority_pending_file(self):
+        """Test that a file over its estimate pushes out the least important file still to come."""
+        candidates = [candidate("README.md", 30), candidate("a.py", 30), candidate("b.py", 30)]
+        candidates[1].score = 5.0
+        candidates[0].score, candidates[2].score = 10.0, 1.0
+        enforcer = BudgetEnforcer(candidates, plan_budget(candidates, 100))
+
+        assert enforcer.admit(0, 60)
+        assert enforcer.dropped == [2]
+        assert enforcer.admit(1, 30)
+        assert not enforcer.admit(2, 30)
+        assert enforcer.used == 90
+
+    def test_current_file_is_dropped_when_it_ranks_lowest(self):
+        """Test that the arriving file is left out if everything pending ranks higher."""
+        candidates = [candidate("a.py", 40), candidate("README.md", 40)]
+        score_candidates(candidates)
+        enforcer = BudgetEnforcer(candidates, plan_budget(candidates, 100, reserved=10))
+
+        assert not enforcer.admit(0, 60)
+        assert enforcer.admit(1, 80)
+        assert enforcer.dropped == [0]
+        assert enforcer.used <= 90
@@ -0,0 +1,144 @@
+import json
+import os
+from llmd.cache import SectionCache
+
+
+def stat_of(path):
+    return os.stat(path)
+
+
+class TestSectionCache:
+    """Test the on-disk section cache."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that a stored section is returned by a later run."""
+        source = tmp_path / "a.py"
+        source.write_text("print('a')\n")
+        cache_dir = tmp_path / "cache"
+
+        cache = SectionCache(cache_dir, "key")
+        assert cache.get("a.py", stat_of(source)) is None
+        cache.put("a.py", stat_of(source), 'bytes', b"## a.py\n...", b"\x01" * 16, b"\x02" * 16, {'heuristic': 7})
+        cache.save()
+        cache.close()
+
+        cache = SectionCache(cache_dir, "key")
+        cached = cache.get("a.py", stat_of(source))
+        assert cached.blob == b"## a.py\n..."
+        assert cached.kind == 'bytes'
+        assert cached.content_hash == b"\x01" * 16
+        assert cached.tokens == {'heuristic': 7}
+        assert (cache.hits, cache.misses) == (1, 0)
+        cache.close()
+
+    def test_changed_file_misses(self, tmp_path):
+        """Test that a different size or mtime invalidates the entry."""
+        source = tmp_path / "a.py"
+        source.write_text("one\n")
+        cache = SectionCache(tmp_path / "cache", "key")
+        cache.put("a.py", stat_of(source), 'bytes', b"section", None, None, {})
+        cache.save()
+        cache.close()
+
+        source.write_text("two!\n")
+        cache = SectionCache(tmp_path / "cache", "key")
+        assert cache.get("a.py", stat_of(source)) is None
+        cache.close()
+
+    def test_render_key_mismatch_discards_cache(self, tmp_path):
+        """Test that a cache written with other settings is ignored."""
+        source = tmp_path / "a.py"
+        source.write_text("x\n")
+        cache = SectionCache(tmp_path / "cache", "old")
+        cache.put("a.py", stat_of(source), 'bytes', b"section", None, None, {})
+        cache.save()
+        cache.close()
+
+        cache = SectionCache(tmp_path / "cache", "new")
+        assert cache.get("a.py", stat_of(source)) is None
+        cache.close()
+
+    def test_corrupt_index_starts_empty(self, tmp_path):
+        """Test that an unreadable index is treated as an empty cache."""
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        (cache_dir / "index.json").write_text("{not json")
+        source = tmp_path / "a.py"
+        source.write_text("x\n")
+
+        cache = SectionCache(cache_dir, "key")
+        assert cache.get("a.py", stat_of(source)) is None
+        cache.close()
+
+    def test_pack_is_compacted(self, tmp_path):
+        """Test that overwritten entries are dropped once they dominate the pack."""
+        source = tmp_path / "a.py"
+        source.write_text("x\n")
+        cache_dir = tmp_path / "cache"
+        for i in range(3):
+            cache = SectionCache(cache_dir, "key")
+            cache.put("a.py", stat_of(source), 'bytes', f"section {i}".encode() * 10, None, None, {})
+            cache.save()
+            cache.close()
+
+        assert (cache_dir / "sections.pack").stat().st_size == len(b"section 2" * 10)
+        cache = SectionCache(cache_dir, "key")
+        assert cache.get("a.py", stat_of(source)).blob == b"section 2" * 10
+        cache.close()
+
+    def test_cache_directory_is_git_ignored(self, tmp_path):
+        """Test that the cache keeps itself out of version control."""
+        source = tmp_path / "a.py"
+        source.write_text("x\n")
+        cache = SectionCache(tmp_path / "cache", "key")
+        cache.put("a.py", stat_of(source), 'bytes', b"section", None, None, {})
+        cache.save()
+        cache.close()
+
+        assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+        index = json.loads((tmp_path / "cache" / "index.json").read_text())
+        assert set(index["entries"]) == {"a.py"}
+
+    def test_runs_sharing_a_directory(self, tmp_path):
+        """Test that interleaved appends from two runs each record where their bytes are."""
+        sources = []
+        for name in ("a.py", "b.py", "c.py", "d.py"):
+            (tmp_path / name).write_text(name)
+            sources.append((name, stat_of(tmp_path / name)))
+        cache_dir = tmp_path / "cache"
+        first, second = SectionCache(cache_dir, "key"), SectionCache(cache_dir, "key")
+
+        for i, (name, st) in enumerate(sources):
+            (first if i % 2 == 0 else second).put(name, st, 'bytes', f"section {name}".encode() * (i + 1),
+                                                  None, None, {})
+        second.save()
+        reader = SectionCache(cache_dir, "key")
+        assert [reader.get(name, st).blob for name, st in sources[1::2]] == [b"section b.py" * 2,
+                                                                             b"section d.py" * 4]
+        reader.close()
+        first.save()
+        reader = SectionCache(cache_dir, "key")
+        assert [reader.get(name, st).blob for name, st in sources[::2]] == [b"section a.py", b"section c.py" * 3]
+        reader.close()
+
+    def test_index_is_not_saved_over_a_compacted_pack(self, tmp_path):
+        """Test that a run whose pack was compacted by another run keeps the other run's index."""
+        source = tmp_path / "a.py"
+        source.write_text("x\n")
+        cache_dir = tmp_path / "cache"
+        cache = SectionCache(cache_dir, "key")
+        cache.put("a.py", stat_of(source), 'bytes', b"old" * 10, None, None, {})
+        cache.save()
+        cache.close()
+
+        stale = SectionCache(cache_dir, "key")
+        stale.get("a.py", stat_of(source))
+        compacting = SectionCache(cache_dir, "key")
+        compacting.put("a.py", stat_of(source), 'bytes', b"new", None, None, {})
+        compacting.save()
+        stale.save()
+
+        reader = SectionCache(cache_dir, "key")
+        assert reader.get("a.py", stat_of(source)).blob == b"new"
+        for cache in (stale, compacting, reader):
+            cache.close()
@@ -0,0 +1,668 @@
+"""
+Tests for CLI options that tune output generation.
+
+These options do not change which files are selected, only how the
+context file is produced from them.
+"""
+
+import gzip
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+import pytest
+from click.testing import CliRunner
+from llmd.cli import main
+
+
+class TestReadOrderOption:
+    """Test the --read-order flag and read_order OPTIONS key."""
+    
+    def test_read_order_flag_accepted(self):
+        """Test that --read-order produces the same document."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            (repo_path / "b.py").write_text("print('b')" * 1000)
+            output = repo_path / "out" / "context.md"
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output), '--read-order', 'size'])
+            assert result.exit_code == 0
+            content = output.read_text()
+            assert content.index("## a.py") < content.index("## b.py")
+    
+    def test_invalid_read_order_flag_rejected(self):
+        """Test that unknown read orders are rejected by the CLI."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = runner.invoke(main, [temp_dir, '--read-order', 'random'])
+            assert result.exit_code != 0
+    
+    def test_invalid_read_order_option_rejected(self):
+        """Test that a bad read_order in llm.md is reported as a usage error."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            (repo_path / "llm.md").write_text("WHITELIST:\n*.py\n\nOPTIONS:\nread_order: random\n")
+            
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md")])
+            assert result.exit_code != 0
+            assert "read_order" in result.output
+
+
+class TestJobsOption:
+    """Test the --jobs flag and workers OPTIONS key."""
+    
+    def test_jobs_flag_sets_reader_threads(self):
+        """Test that --jobs is reported in verbose output."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '-j', '3', '-v'])
+            assert result.exit_code == 0
+            assert "Reader threads: 3" in result.output
+    
+    def test_workers_option_from_llm_md(self):
+        """Test that the workers OPTIONS key is honoured."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            (repo_path / "llm.md").write_text("WHITELIST:\n*.py\n\nOPTIONS:\nworkers: 5\n")
+            
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md"), '-v'])
+            assert result.exit_code == 0
+            assert "Reader threads: 5" in result.output
+    
+    def test_jobs_must_be_positive(self):
+        """Test that --jobs 0 is rejected."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = runner.invoke(main, [temp_dir, '-j', '0'])
+            assert result.exit_code != 0
+    
+    def test_auto_tune_flag(self):
+        """Test that --auto-tune reports the concurrency it settled on."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--auto-tune', '-v'])
+            assert result.exit_code == 0
+            assert "Auto-tuned read concurrency:" in result.output
+
+
+class TestTokenizerOption:
+    """Test the --tokenizer flag and tokenizer OPTIONS key."""
+    
+    def test_tokenizer_flag_reports_counts(self):
+        """Test that verbose output lists the total and the largest files."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n" * 20)
+            (repo_path / "b.py").write_text("print('b')\n")
+            output = repo_path / "out.md"
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output),
+                                          '--tokenizer', 'heuristic', '-v'])
+            assert result.exit_code == 0
+            assert "Total tokens:" in result.output
+            assert "Largest files by tokens:" in result.output
+            assert "Total tokens:" in output.read_text()
+    
+    def test_invalid_tokenizer_rejected(self):
+        """Test that an unknown tokenizer is reported as a usage error."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--tokenizer', 'missing.tiktoken'])
+            assert result.exit_code != 0
+            assert "Invalid tokenizer" in result.output
+
+
+class TestMaxTokensOption:
+    """Test the --max-tokens flag and max_tokens OPTIONS key."""
+    
+    def test_max_tokens_omits_files(self):
+        """Test that files over the budget are reported and listed in the TOC."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "README.md").write_text("# Demo\n")
+            (repo_path / "big.py").write_text("value = 1\n" * 5000)
+            output = repo_path / "out.md"
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-w', '*.md', '-o', str(output),
+                                          '--max-tokens', '500'])
+            assert result.exit_code == 0
+            assert "Omitted 1 files to fit the 500-token budget" in result.output
+            content = output.read_text()
+            assert "## README.md" in content
+            assert "- big.py" in content
+    
+    def test_max_tokens_option_in_config(self):
+        """Test that max_tokens in llm.md is honoured."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "big.py").write_text("value = 1\n" * 5000)
+            (repo_path / "llm.md").write_text("WHITELIST:\n*.py\n\nOPTIONS:\nmax_tokens: 300\n")
+            output = repo_path / "out.md"
+            
+            result = runner.invoke(main, [str(repo_path), '-o', str(output)])
+            assert result.exit_code == 0
+            assert "Omitted files: 1" in output.read_text()
+
+
+class TestShardSizeOption:
+    """Test the --shard-size flag."""
+    
+    def test_shard_size_writes_parts(self):
+        """Test that parts and an index are written next to the output."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            for i in range(4):
+                (repo_path / f"m{i}.py").write_text(f"v{i} = 1\n" * 300)
+            output = repo_path / "out" / "context.md"
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output), '--shard-size', '4KB'])
+            assert result.exit_code == 0
+            assert "Split into" in result.output
+            assert (output.parent / "context.part-001.md").exists()
+            assert "## Parts" in output.read_text()
+    
+    def test_invalid_shard_size_rejected(self):
+        """Test that an unparseable size is a usage error."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')")
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--shard-size', 'lots'])
+            assert result.exit_code != 0
+            assert "Invalid shard_size" in result.output
+
+
+class TestCacheOption:
+    """Test the --cache flag."""
+    
+    def test_cache_reports_hits_on_second_run(self):
+        """Test that a repeat run is served from the cache."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n")
+            (repo_path / "b.py").write_text("print('b')\n")
+            args = [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"), '--cache', '-v']
+            
+            first = runner.invoke(main, args)
+            second = runner.invoke(main, args)
+            assert first.exit_code == 0 and second.exit_code == 0
+            assert "Section cache: 0 hits, 2 misses" in first.output
+            assert "Section cache: 2 hits, 0 misses" in second.output
+            assert "## .llmd-cache" not in (repo_path / "out.md").read_text()
+
+
+class TestIncrementalOption:
+    """Test the --incremental flag."""
+    
+    def test_second_run_reuses_sections(self):
+        """Test that an unchanged repository is copied from the previous output."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n")
+            (repo_path / "b.py").write_text("print('b')\n")
+            args = [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"), '--incremental', '-v']
+            
+            first = runner.invoke(main, args)
+            second = runner.invoke(main, args)
+            assert first.exit_code == 0 and second.exit_code == 0
+            assert "Incremental: reused 0 of 2 sections" in first.output
+            assert "Incremental: reused 2 of 2 sections" in second.output
+            assert (repo_path / ".out.md.manifest.json").exists()
+    
+    def test_incremental_with_shard_size_is_usage_error(self):
+        """Test that --incremental and --shard-size are rejected together."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n")
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md"),
+                                          '--incremental', '--shard-size', '1MB'])
+            assert result.exit_code == 2
+            assert "cannot be combined with shard_size" in result.output
+
+
+class TestCpuWorkersOption:
+    """Test the --cpu-workers option."""
+    
+    def test_cpu_workers_reported(self):
+        """Test that the pool size is shown in verbose output."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n")
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md"),
+                                          '--cpu-workers', '2', '-v'])
+            assert result.exit_code == 0
+            assert "CPU worker processes: 2" in result.output
+            assert "print('a')" in (repo_path / "out.md").read_text()
+    
+    def test_invalid_cpu_workers_is_usage_error(self):
+        """Test that a bad value is reported as a usage error."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("print('a')\n")
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md"), '--cpu-workers', 'lots'])
+            assert result.exit_code == 2
+            assert "Invalid cpu_workers" in result.output
+
+
+class TestDedupeOption:
+    """Test the --dedupe flag."""
+    
+    def test_dedupe_reports_savings(self):
+        """Test that the number of duplicates and the savings are reported."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("value = 1\n" * 50)
+            (repo_path / "b.py").write_text("value = 1\n" * 50)
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--dedupe', '--tokenizer', 'heuristic'])
+            assert result.exit_code == 0
+            assert re.search(r"Deduplicated 1 identical files, saving [\d,]+ bytes, [\d,]+ tokens", result.output)
+            assert "[Identical to a.py - content omitted]" in (repo_path / "out.md").read_text()
+
+
+class TestNearDuplicatesOption:
+    """Test the --near-duplicates and --similarity options."""
+    
+    def test_near_duplicates_reported(self):
+        """Test that collapsed files and the savings are reported."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            base = "".join(f"VALUE_{i} = {i}\n" for i in range(80))
+            (repo_path / "a.py").write_text(base)
+            (repo_path / "b.py").write_text(base.replace("VALUE_3 = 3", "VALUE_3 = 33"))
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--similarity', '0.7'])
+            assert result.exit_code == 0
+            assert re.search(r"Collapsed 1 near-duplicate files into diffs, saving [\d,]+ bytes", result.output)
+            assert "+VALUE_3 = 33" in (repo_path / "out.md").read_text()
+
+
+class TestCompactOption:
+    """Test the --compact option."""
+    
+    def test_compact_reported(self):
+        """Test that compacted output and the savings per file are reported."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text('# License header\n"""Docs."""\n\n\n\nx = 1  # one\n')
+            (repo_path / "b.py").write_text("y = 2\n")
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--compact', '--tokenizer', 'heuristic', '--verbose'])
+            assert result.exit_code == 0
+            assert re.search(r"Compacted 1 files, saving [\d,]+ bytes, [\d,]+ tokens", result.output)
+            assert re.search(r"Most compacted files:\n +[\d,]+ bytes +[\d,]+ tokens  a\.py\n", result.output)
+            content = (repo_path / "out.md").read_text()
+            assert "```python\nx = 1\n\n```" in content
+            assert "License header" not in content
+
+
+class TestRedactOption:
+    """Test the --redact options."""
+    
+    def test_redactions_reported(self):
+        """Test that secrets are replaced and counted per file."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text('api_key = "abcdefgh1234"\npin = "pin: 4321"\n')
+            (repo_path / "b.py").write_text("y = 2\n")
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--redact-pattern', r'pin=pin: (\d+)', '--verbose'])
+            assert result.exit_code == 0
+            assert "Redacted 2 secrets in 1 files" in result.output
+            assert "Redacted files:\n    a.py: 1 password_assignment, 1 pin\n" in result.output
+            content = (repo_path / "out.md").read_text()
+            assert 'api_key = "[REDACTED:password_assignment]"\npin = "pin: [REDACTED:pin]"\n' in content
+    
+    def test_invalid_pattern(self):
+        """Test that a malformed pattern is a usage error."""
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [temp_dir, '--redact-pattern', 'pin=(', '-o', str(Path(temp_dir) / "o.md")])
+            assert result.exit_code == 2
+            assert "Invalid redact_patterns" in result.output
+
+
+class TestOutlineOption:
+    """Test the --outline and --outline-pattern options."""
+    
+    def test_outline_pattern(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text('def a():\n    """Doc."""\n    return 1\n')
+            (repo_path / "b.py").write_text('def b():\n    return 2\n')
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--outline-pattern', 'a.py', '--no-outline-docstrings'])
+            assert result.exit_code == 0
+            assert "Outlined 1 files" in result.output
+            content = (repo_path / "out.md").read_text()
+            assert "def a():\n    ...\n" in content
+            assert "return 2" in content
+
+
+class TestLargeFileOptions:
+    """Test the --max-file-size and --large-files options."""
+    
+    def test_excerpt_large_files(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "data.csv").write_text("".join(f"{i},{i * i}\n" for i in range(1, 5001)))
+            result = runner.invoke(main, [str(repo_path), '-w', '*.csv', '-o', str(repo_path / "out.md"),
+                                          '--max-file-size', '*.csv=4KB', '--large-files', 'excerpt',
+                                          '--excerpt-head', '1', '--excerpt-tail', '16B',
+                                          '--no-excerpt-line-numbers'])
+            assert result.exit_code == 0
+            content = (repo_path / "out.md").read_text()
+            assert re.search(r"\n1,1\n\[\.\.\. [\d,]+ bytes omitted \.\.\.\]\n5000,25000000\n```", content)
+    
+    def test_invalid_excerpt(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md"), '--excerpt-head', 'lots'])
+            assert result.exit_code != 0
+            assert "Invalid excerpt_head" in result.output
+
+
+class TestCompressOption:
+    """Test the --compress option and compressed output suffixes."""
+    
+    def test_compress_adds_suffix(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"),
+                                          '--compress', 'gzip', '--verbose'])
+            assert result.exit_code == 0
+            assert not (repo_path / "out.md").exists()
+            assert "```python\nx = 1\n" in gzip.decompress((repo_path / "out.md.gz").read_bytes()).decode()
+            assert re.search(r"Uncompressed size: [\d,]+ bytes", result.output)
+    
+    def test_suffix_conflicts_are_usage_errors(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [str(repo_path), '-o', str(repo_path / "out.md.xz"), '--incremental'])
+            assert result.exit_code == 2
+            assert "Invalid compress 'xz': it cannot be combined with incremental" in result.output
+
+
+class TestFormatOption:
+    """Test the --format option."""
+    
+    def test_jsonl_uses_default_suffix(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            with runner.isolated_filesystem(temp_dir=temp_dir):
+                result = runner.invoke(main, [str(repo_path), '-w', '*.py', '--format', 'jsonl'])
+                assert result.exit_code == 0
+                assert json.loads(Path("llm-context.jsonl").read_text())['content'] == "x = 1\n"
+    
+    def test_output_suffix_selects_format(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.xml")])
+            assert result.exit_code == 0
+            assert '<document path="a.py" language="python" size="6">x = 1\n</document>' in (
+                (repo_path / "out.xml").read_text())
+
+
+class TestIndexOption:
+    """Test the --index option."""
+    
+    def test_index_written(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(repo_path / "out.md"), '--index'])
+            assert result.exit_code == 0
+            assert "Section index: " in result.output
+            index = json.loads((repo_path / "out.index.json").read_text())
+            assert index['output'] == "out.md"
+            assert [entry['path'] for entry in index['sections']] == ["a.py"]
+
+
+class TestGeneratedOption:
+    """Test the --generated option and generated OPTIONS key."""
+    
+    def _repo(self, repo_path: Path) -> None:
+        (repo_path / ".gitattributes").write_text("*.pb.py linguist-generated\n")
+        (repo_path / "api.pb.py").write_text("x = 1\n")
+        (repo_path / "schema.py").write_text("# Code generated by sqlc. DO NOT EDIT.\ny = 2\n")
+        (repo_path / "main.py").write_text("z = 3\n")
+    
+    def test_stub(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            output = repo_path / "out.md"
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output), '--generated', 'stub'])
+            assert result.exit_code == 0
+            content = output.read_text()
+            assert "[api.pb.py](#apipbpy) (generated)" in content
+            assert "```python\n[Generated file (linguist-generated) - content omitted]\n```" in content
+            assert "[Generated file (marker) - content omitted]" in content
+            assert "x = 1" not in content and "y = 2" not in content
+            assert "z = 3" in content
+    
+    def test_drop_from_options(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            (repo_path / "llm.md").write_text("WHITELIST:\n*.py\n\nOPTIONS:\ngenerated: drop\n")
+            result = runner.invoke(main, [str(repo_path), '--dry-run'])
+            assert result.exit_code == 0
+            assert "+main.py" in result.output
+            assert "api.pb.py" not in result.output and "schema.py" not in result.output
+    
+    def test_include_by_default(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            output = repo_path / "out.md"
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output)])
+            assert result.exit_code == 0
+            assert "x = 1" in output.read_text()
+    
+    def test_invalid_option_rejected(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            (repo_path / "llm.md").write_text("WHITELIST:\n*.py\n\nOPTIONS:\ngenerated: hide\n")
+            result = runner.invoke(main, [str(repo_path)])
+            assert result.exit_code == 2
+            assert "Invalid generated 'hide'" in result.output
+
+
+class TestRepoMapOption:
+    """Test the --repo-map options."""
+    
+    def test_repo_map(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            (repo_path / "node_modules" / "pkg").mkdir(parents=True)
+            (repo_path / "node_modules" / "pkg" / "index.js").write_text("x")
+            (repo_path / "docs" / "api" / "v1").mkdir(parents=True)
+            (repo_path / "docs" / "api" / "v1" / "ref.md").write_text("# Ref\n")
+            output = repo_path / "out.md"
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '-o', str(output),
+                                          '--repo-map', '--repo-map-depth', '1'])
+            assert result.exit_code == 0
+            content = output.read_text()
+            assert "(not scanned: node_modules/)" in content
+            assert "  docs/api/v1/ 1 file, 6 B, ~2 tokens, excluded\n" in content
+
+
+class TestStableOption:
+    """Test the --stable option."""
+    
+    def test_runs_share_their_prefix(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            (repo_path / "a.py").write_text("x = 1\n")
+            output = repo_path / "out.md"
+            args = [str(repo_path), '-w', '*.py', '-o', str(output), '--stable']
+            assert runner.invoke(main, args).exit_code == 0
+            first = output.read_text()
+            assert runner.invoke(main, args).exit_code == 0
+            second = output.read_text()
+            body_end = first.index("\n---\n")
+            assert first[:body_end] == second[:body_end]
+            assert first.startswith(f"# LLM Context for {repo_path.name}\n\n## a.py\n")
+
+
+class TestChangedOptions:
+    """Test --since, --changed and --siblings."""
+    
+    def _commit(self, repo_path: Path, message: str) -> None:
+        subprocess.run(['git', '-C', str(repo_path), 'add', '.'], check=True, capture_output=True)
+        subprocess.run(['git', '-C', str(repo_path), '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                        'commit', '-qm', message], check=True, capture_output=True)
+    
+    def _repo(self, repo_path: Path) -> None:
+        subprocess.run(['git', 'init', '-q', str(repo_path)], check=True, capture_output=True)
+        (repo_path / "src").mkdir()
+        (repo_path / "src" / "a.py").write_text("a = 1\n")
+        (repo_path / "src" / "b.py").write_text("b = 1\n")
+        (repo_path / "docs.md").write_text("# Docs\n")
+        self._commit(repo_path, "base")
+        subprocess.run(['git', '-C', str(repo_path), 'checkout', '-qb', 'feature'], check=True, capture_output=True)
+        (repo_path / "src" / "a.py").write_text("a = 2\n")
+        (repo_path / "notes.txt").write_text("notes\n")
+        self._commit(repo_path, "feature")
+    
+    @pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+    def test_since_applies_rules(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '--since', 'HEAD~1', '--dry-run'])
+            assert result.exit_code == 0
+            assert "+src/a.py" in result.output
+            assert "b.py" not in result.output and "notes.txt" not in result.output
+            
+            result = runner.invoke(main, [str(repo_path), '-w', '*.py', '--since', 'HEAD~1', '--siblings',
+                                          '--dry-run'])
+            assert "+src/a.py" in result.output and "+src/b.py" in result.output
+    
+    @pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+    def test_changed(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            (repo_path / "src" / "b.py").write_text("b = 2\n")
+            result = runner.invoke(main, [str(repo_path), '--changed', '--dry-run'])
+            assert result.exit_code == 0
+            assert "+src/b.py" in result.output
+            assert "a.py" not in result.output
+    
+    @pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+    def test_unknown_ref_is_a_usage_error(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo_path = Path(temp_dir)
+            self._repo(repo_path)
+            result = runner.invoke(main, [str(repo_path), '--since', 'no-such-ref'])
+            assert result.exit_code == 2
+            assert "Invalid since 'no-such-ref'" in result.output
+    
+    def test_siblings_need_a_change_set(self):
+        runner = CliRunner()
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result = runner.invoke(main, [temp_dir, '--siblings'])
+            assert result.exit_code == 2
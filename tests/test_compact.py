@@ -0,0 +1,73 @@
+from llmd.compact import LANGUAGE_RULES, compact
+
+
+class TestPython:
+    """Test compacting Python sources."""
+
+    def test_comments_and_docstrings_are_removed(self):
+        source = (
+            b'# Copyright (c) Example Corp.\n'
+            b'# Licensed under the MIT license.\n'
+            b'"""Module docstring."""\n'
+            b'\n'
+            b'import os  # for paths\n'
+            b'\n'
+            b'\n'
+            b'\n'
+            b'def join(a, b):\n'
+            b'    """Join two paths.\n'
+            b'\n'
+            b'    Longer description.\n'
+            b'    """\n'
+            b'    return os.path.join(a, b)   \n'
+        )
+        assert compact(source, 'python') == (
+            b'import os\n'
+            b'\n'
+            b'def join(a, b):\n'
+            b'    return os.path.join(a, b)\n'
+        )
+
+    def test_docstring_only_body_gets_pass(self):
+        source = b'class Error(Exception):\n    """Raised on errors."""\n\nx = 1\n'
+        assert compact(source, 'python') == b'class Error(Exception):\n    pass\n\nx = 1\n'
+
+    def test_strings_are_kept(self):
+        """Test that comment markers and triple quotes inside strings survive."""
+        source = b'url = "http://example.com/#top"  # link\nquery = """\n# not a comment\n"""\n'
+        assert compact(source, 'python') == b'url = "http://example.com/#top"\nquery = """\n# not a comment\n"""\n'
+
+    def test_shebang_is_kept(self):
+        assert compact(b'#!/usr/bin/env python\n# comment\nmain()\n', 'python') == b'#!/usr/bin/env python\nmain()\n'
+
+
+class TestOtherLanguages:
+    """Test the rules of other languages."""
+
+    def test_c_like_comments(self):
+        source = (
+            b'/*\n * License header\n */\n'
+            b'const url = "http://x.org"; // trailing\n'
+            b'const re = \'/* not a comment */\';\n'
+        )
+        assert compact(source, 'javascript') == b'const url = "http://x.org";\nconst re = \'/* not a comment */\';\n'
+
+    def test_regex_literals_are_kept(self):
+        """Test that // and /* inside a JavaScript regex literal are not taken for comments."""
+        source = rb'const re = /\/\//g; const x = 1;' + b'\n'
+        assert compact(source, 'javascript') == source
+        source = b'if (/[/*]/.test(s)) return a / b; // note\nconst half = total / 2 // rounded down\n'
+        assert compact(source, 'typescript') == b'if (/[/*]/.test(s)) return a / b;\nconst half = total / 2\n'
+
+    def test_hash_languages_only_lose_whole_lines(self):
+        """Test that a # after code is kept where it may be part of a value."""
+        source = b'# config\ncolor: "#fff"\nkey: value # note\n'
+        assert compact(source, 'yaml') == b'color: "#fff"\nkey: value # note\n'
+
+    def test_markdown_keeps_trailing_spaces(self):
+        source = b'line one  \nline two\n<!-- hidden -->\n'
+        assert compact(source, 'markdown') == b'line one  \nline two\n'
+
+    def test_unknown_language_gets_whitespace_cleanup(self):
+        assert compact(b'a   \n\n\n\nb\n\n', 'text') == b'a\n\nb\n'
+        assert 'text' not in LANGUAGE_RULES
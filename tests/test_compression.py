@@ -0,0 +1,77 @@
+import gzip
+import io
+import lzma
+import os
+from pathlib import Path
+
+import pytest
+
+from llmd.compression import CompressedWriter, compression_for_path, parse_compression
+from llmd.writer import FileSpan, StreamWriter
+
+DECOMPRESS = {'gzip': gzip.decompress, 'xz': lzma.decompress}
+
+
+def compress(data: bytes, compression: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    with CompressedWriter(StreamWriter(buffer), compression, **kwargs) as writer:
+        writer.write(data)
+    assert writer.bytes_written == len(data)
+    return buffer.getvalue()
+
+
+class TestOptions:
+    """Test choosing a compression."""
+
+    def test_suffixes(self):
+        assert compression_for_path(Path("out/llm-context.md.gz")) == 'gzip'
+        assert compression_for_path(Path("llm-context.XZ")) == 'xz'
+        assert compression_for_path(Path("llm-context.zst")) == 'zstd'
+        assert compression_for_path(Path("llm-context.md")) is None
+
+    def test_parse(self):
+        assert parse_compression(True) == 'gzip'
+        assert parse_compression('XZ') == 'xz'
+        assert parse_compression(False) is None
+        assert parse_compression('none') is None
+        with pytest.raises(ValueError, match="Invalid compress 'bz2'"):
+            parse_compression('bz2')
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'xz'])
+class TestCompressedWriter:
+    """Test block-parallel compression."""
+
+    def test_blocks_decompress_as_one_stream(self, compression):
+        data = os.urandom(50_000) + b"repeated text " * 100_000
+
+        for threads in (1, 3):
+            assert DECOMPRESS[compression](compress(data, compression, block_size=64 * 1024, threads=threads)) == data
+
+    def test_output_does_not_depend_on_threads(self, compression):
+        data = b"".join(b"line %d\n" % i for i in range(200_000))
+
+        assert (compress(data, compression, block_size=100_000, threads=1)
+                == compress(data, compression, block_size=100_000, threads=4))
+
+    def test_empty_output(self, compression):
+        assert DECOMPRESS[compression](compress(b"", compression)) == b""
+
+    def test_spans_are_compressed(self, compression, tmp_path):
+        source = tmp_path / "source.txt"
+        source.write_bytes(b"0123456789" * 10_000)
+        buffer = io.BytesIO()
+
+        with CompressedWriter(StreamWriter(buffer), compression, block_size=4096) as writer:
+            writer.write(b"<")
+            writer.splice(FileSpan(source, 5, 50_000))
+            writer.write(b">")
+
+        assert DECOMPRESS[compression](buffer.getvalue()) == b"<" + (b"0123456789" * 10_000)[5:50_005] + b">"
+
+
+def test_gzip_blocks_keep_the_ratio():
+    """Blocks are primed with the previous block, so matches across them are kept."""
+    data = os.urandom(20_000) * 50
+
+    assert len(compress(data, 'gzip', block_size=16 * 1024)) < 2 * len(gzip.compress(data))
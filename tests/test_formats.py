@@ -0,0 +1,65 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from llmd.formats import JsonlFormat, XmlFormat, format_for_path, parse_output_format, xml_escape
+from llmd.writer import FileSpan, StreamWriter
+
+
+def write(record_format, fields, body) -> str:
+    buffer = io.BytesIO()
+    record_format.write_record(StreamWriter(buffer), fields, body)
+    return buffer.getvalue().decode('utf-8')
+
+
+class TestOptions:
+    """Test choosing an output format."""
+
+    def test_suffixes(self):
+        assert format_for_path(Path("out/context.jsonl")) == 'jsonl'
+        assert format_for_path(Path("context.XML")) == 'xml'
+        assert format_for_path(Path("context.jsonl.gz"), ['.gz']) == 'jsonl'
+        assert format_for_path(Path("context.md")) == 'markdown'
+        assert format_for_path(Path("context")) == 'markdown'
+
+    def test_parse(self):
+        assert parse_output_format('JSONL') == 'jsonl'
+        assert parse_output_format('md') == 'markdown'
+        with pytest.raises(ValueError, match="Invalid format 'yaml'"):
+            parse_output_format('yaml')
+
+
+class TestJsonl:
+    """Test JSON lines records."""
+
+    def test_record_is_one_json_line(self):
+        line = write(JsonlFormat(), {'path': 'a.py', 'tokens': None}, [b'x = "```"\n', b'\t\xe2\x80\xa8"\\'])
+
+        assert line.endswith('}\n') and line.count('\n') == 1
+        assert json.loads(line) == {'path': 'a.py', 'tokens': None, 'content': 'x = "```"\n\t\u2028"\\'}
+
+    def test_span_chunks_split_characters(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('llmd.formats._READ_CHUNK_SIZE', 3)
+        source = tmp_path / "source.txt"
+        source.write_bytes("é€😀".encode('utf-8') * 10)
+
+        line = write(JsonlFormat(), {}, [FileSpan(source, 0, source.stat().st_size)])
+
+        assert json.loads(line) == {'content': "é€😀" * 10}
+
+
+class TestXml:
+    """Test XML documents."""
+
+    def test_escaping(self):
+        assert xml_escape('<a href="x">&</a>') == '&lt;a href="x"&gt;&amp;&lt;/a&gt;'
+        assert xml_escape('"\n', quote=True) == '&quot;&#10;'
+        assert xml_escape('a\x00b\rc') == 'a\ufffdb&#13;c'
+
+    def test_document(self):
+        record = write(XmlFormat(), {'path': 'a "b".py', 'tokens': None, 'outline': True}, [b']]></document>'])
+
+        assert record == ('<document path="a &quot;b&quot;.py" outline="true">'
+                          ']]&gt;&lt;/document&gt;</document>\n')
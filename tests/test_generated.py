@@ -0,0 +1,89 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from llmd.generated import GeneratedFileDetector, GitAttributes, has_generated_marker, parse_generated_policy
+
+
+class TestMarkers:
+    """Test detection of generated-code markers."""
+
+    def test_comment_markers(self):
+        assert has_generated_marker(b"// Code generated by protoc-gen-go. DO NOT EDIT.\npackage pb\n")
+        assert has_generated_marker(b"#!/bin/sh\n# @generated by tool\n")
+        assert has_generated_marker(b"/*\n * This file is autogenerated: DO NOT EDIT\n */\n")
+        assert has_generated_marker(b"<!-- DO NOT EDIT -->\n<html></html>\n")
+
+    def test_markers_outside_comments_are_ignored(self):
+        assert not has_generated_marker(b"MARKERS = ('@generated', 'DO NOT EDIT')\n")
+        assert not has_generated_marker(b"print('hello')\n")
+
+    def test_invalid_policy(self):
+        assert parse_generated_policy("Stub") == 'stub'
+        with pytest.raises(ValueError, match="Invalid generated"):
+            parse_generated_policy("hide")
+
+
+class TestGitAttributes:
+    """Test .gitattributes rules."""
+
+    def test_attributes(self, tmp_path: Path):
+        (tmp_path / ".gitattributes").write_text(
+            "# generated code\n"
+            "*.pb.go linguist-generated\n"
+            "vendor/** linguist-vendored\n"
+            "package-lock.json -diff\n"
+            "*.min.js binary\n"
+            "keep.pb.go -linguist-generated\n"
+        )
+        attributes = GitAttributes(tmp_path)
+
+        assert attributes.reason("api/service.pb.go") == 'linguist-generated'
+        assert attributes.reason("vendor/lib/x.py") == 'linguist-vendored'
+        assert attributes.reason("package-lock.json") == '-diff'
+        assert attributes.reason("static/app.min.js") == '-diff'
+        assert attributes.reason("keep.pb.go") is None
+        assert attributes.reason("main.go") is None
+
+    def test_nested_file_overrides_root(self, tmp_path: Path):
+        (tmp_path / ".gitattributes").write_text("*.js linguist-generated=true\n")
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / ".gitattributes").write_text("app.js linguist-generated=false\n")
+        attributes = GitAttributes(tmp_path)
+
+        assert attributes.reason("src/app.js") is None
+        assert attributes.reason("src/other.js") == 'linguist-generated'
+        assert attributes.reason("lib.js") == 'linguist-generated'
+
+
+class TestDetector:
+    """Test the detector and its verdict cache."""
+
+    def test_verdicts_are_cached_by_inode_and_mtime(self, tmp_path: Path):
+        source = tmp_path / "gen.py"
+        source.write_text("# @generated\nx = 1\n")
+        cache = tmp_path / "cache" / "generated.json"
+
+        detector = GeneratedFileDetector(tmp_path, cache)
+        assert detector.reason(source, "gen.py") == 'marker'
+        assert detector.reads == 1
+        detector.save()
+
+        warm = GeneratedFileDetector(tmp_path, cache)
+        assert warm.reason(source, "gen.py") == 'marker'
+        assert warm.reads == 0
+
+        source.write_text("x = 2\n")
+        st = source.stat()
+        os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert warm.reason(source, "gen.py") is None
+        assert warm.reads == 1
+
+    def test_attributes_take_precedence(self, tmp_path: Path):
+        (tmp_path / ".gitattributes").write_text("*.py linguist-vendored\n")
+        (tmp_path / "a.py").write_text("# DO NOT EDIT\n")
+        detector = GeneratedFileDetector(tmp_path)
+
+        assert detector.reason(tmp_path / "a.py", "a.py") == 'linguist-vendored'
+        assert detector.reads == 0
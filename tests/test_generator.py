@@ -1,8 +1,21 @@
 import pytest
+import gzip
+import json
+import lzma
+import os
+import re
 from pathlib import Path
 import tempfile
+from xml.etree import ElementTree
 import shutil
-from llmd.generator import MarkdownGenerator
+from llmd.generator import FileSection, MarkdownGenerator
+from llmd.repomap import walk_inventory
+from llmd.writer import FileSpan
+
+
+def _without_timestamp(text):
+    """Drop the volatile 'Generated on' header line for comparisons."""
+    return [line for line in text.splitlines() if not line.startswith("Generated on:")]
 
 
 class TestMarkdownGenerator:
@@ -191,4 +204,1375 @@ class TestMarkdownGenerator:
         assert "```python" in result  # For main.py
         assert "```yaml" in result    # For config.yaml
         assert "# Content of main.py" in result
-        assert "# Content of config.yaml" in result
\ No newline at end of file
+        assert "# Content of config.yaml" in result
+
+
+class TestStreamingGeneration:
+    """Test streaming the document straight to the output file."""
+    
+    @pytest.fixture
+    def temp_repo(self):
+        """Create a temporary repository with enough files to exercise reordering."""
+        temp_dir = tempfile.mkdtemp()
+        repo_path = Path(temp_dir)
+        
+        for i in range(50):
+            file_path = repo_path / "src" / f"module_{i:02d}.py"
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            # Vary sizes so reads complete out of order
+            file_path.write_text(f"# module {i}\n" + "x = 1\n" * (i * 37 % 500))
+        
+        yield repo_path
+        
+        shutil.rmtree(temp_dir)
+    
+    def test_streamed_output_matches_in_memory_generation(self, temp_repo):
+        """Test that generate_to_file writes exactly what generate returns."""
+        generator = MarkdownGenerator()
+        generator.max_in_flight = 3
+        files = sorted((temp_repo / "src").iterdir())
+        output = temp_repo / "out" / "llm-context.md"
+        
+        expected = generator.generate(files, temp_repo)
+        written = generator.generate_to_file(files, temp_repo, output)
+        
+        content = output.read_bytes()
+        assert written == len(content)
+        # Timestamps may differ by a second between the two runs
+        assert _without_timestamp(content.decode('utf-8')) == _without_timestamp(expected)
+    
+    def test_sections_are_emitted_in_file_order(self, temp_repo):
+        """Test that the bounded reorder buffer preserves file order."""
+        generator = MarkdownGenerator()
+        generator.max_in_flight = 2
+        files = sorted((temp_repo / "src").iterdir())
+        
+        sections = generator._process_files_parallel(files, temp_repo)
+        
+        assert len(sections) == len(files)
+        for file, section in zip(files, sections):
+            assert section.startswith(f"## src/{file.name}\n")
+    
+    def test_no_temporary_files_left_behind(self, temp_repo):
+        """Test that the temporary file is renamed into place."""
+        generator = MarkdownGenerator()
+        output_dir = temp_repo / "out"
+        output = output_dir / "llm-context.md"
+        
+        generator.generate_to_file([temp_repo / "src" / "module_01.py"], temp_repo, output)
+        
+        assert [p.name for p in output_dir.iterdir()] == ["llm-context.md"]
+    
+    def test_failed_generation_keeps_previous_output(self, temp_repo, monkeypatch):
+        """Test that an error mid-stream leaves the existing output untouched."""
+        generator = MarkdownGenerator()
+        output_dir = temp_repo / "out"
+        output_dir.mkdir()
+        output = output_dir / "llm-context.md"
+        output.write_text("previous context")
+        
+        def explode(files, repo_path, stats=None):
+            yield FileSection("module_01.py", [b"## module_01.py"])
+            raise RuntimeError("disk full")
+        
+        monkeypatch.setattr(generator, "_iter_file_sections", explode)
+        
+        with pytest.raises(RuntimeError):
+            generator.generate_to_file([temp_repo / "src" / "module_01.py"], temp_repo, output)
+        
+        assert output.read_text() == "previous context"
+        assert [p.name for p in output_dir.iterdir()] == ["llm-context.md"]
+
+
+class TestZeroCopyOutput:
+    """Test the bytes-native path for large files."""
+    
+    @pytest.fixture
+    def temp_repo(self):
+        """Create a temporary repository."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+    
+    @pytest.fixture
+    def generator(self):
+        """Create a generator with small thresholds so tests stay fast."""
+        generator = MarkdownGenerator()
+        generator.zero_copy_threshold = 1000
+        generator.validate_chunk_size = 64
+        return generator
+    
+    def test_large_utf8_file_is_spliced_from_disk(self, temp_repo, generator):
+        """Test that a large valid file is referenced, not read into the section."""
+        body = "naïve café – ünïcödé\n" * 200
+        large = temp_repo / "large.txt"
+        large.write_text(body, encoding='utf-8')
+        
+        section = generator._generate_file_section_optimized(large, temp_repo)
+        
+        spans = [part for part in section.parts if isinstance(part, FileSpan)]
+        assert spans == [FileSpan(large, 0, large.stat().st_size)]
+    
+    def test_spliced_output_is_byte_identical(self, temp_repo, generator):
+        """Test that the streamed file contains the exact file bytes."""
+        body = "línea con acentos → ok\n" * 300
+        large = temp_repo / "large.md"
+        large.write_text(body, encoding='utf-8')
+        output = temp_repo / "out" / "context.md"
+        
+        generator.generate_to_file([large], temp_repo, output)
+        
+        expected_section = f"## large.md\n\n```markdown\n{body}\n```".encode('utf-8')
+        assert output.read_bytes().endswith(expected_section)
+        assert generator.generate([large], temp_repo).endswith(expected_section.decode('utf-8'))
+    
+    def test_large_file_with_crlf_is_normalized(self, temp_repo, generator):
+        """Test that carriage returns are translated like a text-mode read."""
+        large = temp_repo / "windows.txt"
+        large.write_bytes(b"line\r\n" * 500)
+        
+        section = generator._materialize(generator._generate_file_section_optimized(large, temp_repo).parts)
+        
+        assert b"\r" not in section
+        assert section.count(b"line\n") == 500
+    
+    def test_large_invalid_utf8_is_reported_as_binary(self, temp_repo, generator):
+        """Test that invalid UTF-8 anywhere in a large file is detected."""
+        large = temp_repo / "blob.txt"
+        large.write_bytes(b"a" * 5000 + b"\xff\xfe" + b"b" * 10)
+        
+        section = generator._materialize(generator._generate_file_section_optimized(large, temp_repo).parts)
+        
+        assert MarkdownGenerator.BINARY_NOTICE in section
+    
+    def test_multibyte_character_split_across_chunks(self, temp_repo, generator):
+        """Test that a character straddling a chunk boundary validates."""
+        # Place a 3-byte character so it spans the 64-byte chunk boundary
+        large = temp_repo / "split.txt"
+        large.write_bytes(b"a" * 63 + "€".encode('utf-8') + b"b" * 2000)
+        
+        section = generator._generate_file_section_optimized(large, temp_repo)
+        
+        assert any(isinstance(part, FileSpan) for part in section.parts)
+    
+    def test_truncated_multibyte_sequence_is_invalid(self, temp_repo, generator):
+        """Test that a dangling lead byte at a chunk boundary is rejected."""
+        large = temp_repo / "truncated.txt"
+        large.write_bytes(b"a" * 63 + b"\xe2" + b"b" * 2000)
+        
+        section = generator._materialize(generator._generate_file_section_optimized(large, temp_repo).parts)
+        
+        assert MarkdownGenerator.BINARY_NOTICE in section
+    
+    def test_small_file_with_crlf_matches_text_mode(self, temp_repo, generator):
+        """Test that small files keep the text-mode newline translation."""
+        small = temp_repo / "small.txt"
+        small.write_bytes(b"one\r\ntwo\rthree\n")
+        
+        result = generator.generate([small], temp_repo)
+        
+        assert "```text\none\ntwo\nthree\n\n```" in result
+
+
+class TestBatchedReads:
+    """Test grouping of small files into batched read units."""
+    
+    @pytest.fixture
+    def generator(self):
+        """Create a generator with a fixed worker count."""
+        generator = MarkdownGenerator()
+        generator.max_workers = 2
+        return generator
+    
+    def test_units_preserve_file_order(self, generator):
+        """Test that flattening the units gives back every index in order."""
+        sizes = [100, 200, 50_000, 300, 10, 9_000_000, 20, 30]
+        
+        units = generator._plan_read_units(sizes)
+        
+        assert [i for unit in units for i in unit] == list(range(len(sizes)))
+    
+    def test_large_files_are_read_alone(self, generator):
+        """Test that files above small_file_size get their own unit."""
+        sizes = [100, 100, 50_000, 100, 100]
+        
+        units = generator._plan_read_units(sizes)
+        
+        assert [2] in units
+        assert all(len(unit) == 1 for unit in units if 2 in unit)
+    
+    def test_many_small_files_are_batched(self, generator):
+        """Test that small files share executor tasks."""
+        sizes = [1000] * 10_000
+        
+        units = generator._plan_read_units(sizes)
+        
+        # 256KB target / 1000 bytes per file = 262, capped by max_batch_files
+        assert len(units[0]) == generator.max_batch_files
+        assert len(units) < len(sizes) / 100
+    
+    def test_batch_size_adapts_to_file_sizes(self, generator):
+        """Test that larger small files produce shorter batches."""
+        tiny = generator._plan_read_units([600] * 10_000)
+        bigger = generator._plan_read_units([4000] * 10_000)
+        
+        assert len(bigger[0]) < len(tiny[0])
+        assert len(bigger[0]) == generator.batch_target_bytes // 4000
+    
+    def test_small_repos_keep_workers_busy(self, generator):
+        """Test that a handful of files is spread over several units."""
+        units = generator._plan_read_units([100] * 20)
+        
+        # 2 workers x 4 units each
+        assert len(units) >= 7
+    
+    def test_batched_output_matches_unbatched(self, generator, tmp_path):
+        """Test that batching does not change the generated document."""
+        files = []
+        for i in range(40):
+            path = tmp_path / f"file_{i:02d}.txt"
+            path.write_text(f"content {i}\n" * (i + 1))
+            files.append(path)
+        (tmp_path / "file_07.txt").write_bytes(b"\xff\xfe invalid")
+        
+        batched = generator._process_files_parallel(files, tmp_path)
+        generator.small_file_size = -1
+        unbatched = generator._process_files_parallel(files, tmp_path)
+        
+        assert batched == unbatched
+        assert "[Binary or non-UTF-8 file - content omitted]" in batched[7]
+
+
+class TestReadOrder:
+    """Test pluggable read ordering."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create files of very different sizes."""
+        files = []
+        for i in range(30):
+            path = tmp_path / f"file_{i:02d}.txt"
+            path.write_text("line\n" * (2000 if i == 29 else i + 1))
+            files.append(path)
+        return files
+    
+    @pytest.mark.parametrize("order", ["path", "size", "inode", "extent", "auto"])
+    def test_output_order_is_unchanged(self, files, tmp_path, order):
+        """Test that every read order produces the same document."""
+        baseline = MarkdownGenerator({'read_order': 'path'})._process_files_parallel(files, tmp_path)
+        generator = MarkdownGenerator({'read_order': order})
+        generator.small_file_size = -1
+        
+        assert generator._process_files_parallel(files, tmp_path) == baseline
+    
+    def test_size_order_puts_largest_units_first(self, files, tmp_path):
+        """Test that LPT keys rank the biggest unit highest."""
+        generator = MarkdownGenerator({'read_order': 'size'})
+        stats = generator._stat_files(files)
+        units = [[i] for i in range(len(files))]
+        weights = [st.st_size for st in stats]
+        
+        keys = generator._read_order_keys(files, tmp_path, stats, units, weights, None)
+        
+        assert min(range(len(keys)), key=keys.__getitem__) == 29
+    
+    def test_path_order_uses_no_keys(self, files, tmp_path):
+        """Test that path order keeps plain in-order submission."""
+        generator = MarkdownGenerator({'read_order': 'path'})
+        stats = generator._stat_files(files)
+        
+        assert generator._read_order_keys(files, tmp_path, stats, [[0]], [1], None) is None
+    
+    def test_invalid_read_order_is_rejected(self):
+        """Test that unknown orders raise a clear error."""
+        with pytest.raises(ValueError, match="Invalid read_order"):
+            MarkdownGenerator({'read_order': 'random'})
+
+
+class TestWorkerSizing:
+    """Test worker pool sizing options."""
+    
+    def test_workers_option_sets_pool_size(self):
+        """Test that the workers option overrides CPU-based sizing."""
+        generator = MarkdownGenerator({'workers': 3})
+        
+        assert generator.max_workers == 3
+        assert generator.max_in_flight == 12
+    
+    @pytest.mark.parametrize("value", [0, -2, "many", True])
+    def test_invalid_workers_rejected(self, value):
+        """Test that nonsensical worker counts raise a clear error."""
+        with pytest.raises(ValueError, match="Invalid workers"):
+            MarkdownGenerator({'workers': value})
+    
+    def test_auto_tune_produces_same_output(self, tmp_path):
+        """Test that the auto-tuner only affects scheduling."""
+        files = []
+        for i in range(25):
+            path = tmp_path / f"file_{i:02d}.txt"
+            path.write_text(f"value {i}\n" * 50)
+            files.append(path)
+        
+        plain = MarkdownGenerator({'workers': 4})._process_files_parallel(files, tmp_path)
+        tuned = MarkdownGenerator({'workers': 4, 'auto_tune': True})
+        
+        assert tuned._process_files_parallel(files, tmp_path) == plain
+        assert tuned.concurrency is not None
+        assert 1 <= tuned.concurrency.limit <= 4
+
+
+class TestTokenCounting:
+    """Test per-file token counts in the header and TOC."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create a few files, two of them with identical content."""
+        (tmp_path / "a.py").write_text("def a():\n    return 1\n")
+        (tmp_path / "b.py").write_text("def a():\n    return 1\n")
+        (tmp_path / "c.md").write_text("# Title\n\nSome words here.\n")
+        return [tmp_path / "a.py", tmp_path / "b.py", tmp_path / "c.md"]
+    
+    def test_counts_reported_in_header_and_toc(self, tmp_path, files):
+        """Test that totals and per-file counts appear in the document."""
+        generator = MarkdownGenerator({'tokenizer': 'heuristic'})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert f"Total tokens: {generator.total_tokens:,} (heuristic estimate)" in content
+        for section in generator.sections:
+            assert f"[{section.rel_path}](#" in content
+            assert f"({section.tokens:,} tokens)" in content
+        assert generator.total_tokens == sum(section.tokens for section in generator.sections)
+    
+    def test_section_count_covers_rendered_text(self, tmp_path, files):
+        """Test that a section's count matches its rendered text.
+        
+        Heading, body and fence are counted separately, so a token that
+        would merge across a boundary may be counted twice.
+        """
+        generator = MarkdownGenerator({'tokenizer': 'heuristic'})
+        
+        sections = generator._process_files_parallel(files, tmp_path)
+        generator.generate(files, tmp_path)
+        
+        for text, section in zip(sections, generator.sections):
+            assert 0 <= section.tokens - generator.tokenizer.count_text(text) <= 2
+    
+    def test_identical_content_counted_once(self, tmp_path, files):
+        """Test that the token cache is keyed by content hash."""
+        generator = MarkdownGenerator({'tokenizer': 'heuristic', 'workers': 1})
+        
+        generator.generate(files, tmp_path)
+        
+        assert generator.sections[0].content_hash == generator.sections[1].content_hash
+        assert generator.token_cache.hits == 1
+    
+    def test_streamed_file_matches_generate(self, tmp_path, files):
+        """Test that the spooled write produces the same document."""
+        generator = MarkdownGenerator({'tokenizer': 'heuristic'})
+        output = tmp_path / "out" / "context.md"
+        
+        written = generator.generate_to_file(files, tmp_path, output)
+        
+        assert written == output.stat().st_size
+        assert _without_timestamp(output.read_text()) == _without_timestamp(generator.generate(files, tmp_path))
+        assert [p.name for p in output.parent.iterdir()] == ["context.md"]
+    
+    def test_large_spliced_file_is_counted(self, tmp_path):
+        """Test that files copied from disk are counted in chunks."""
+        generator = MarkdownGenerator({'tokenizer': 'heuristic'})
+        generator.zero_copy_threshold = 1000
+        generator.validate_chunk_size = 64
+        large = tmp_path / "large.txt"
+        large.write_text("alpha beta gamma delta\n" * 200)
+        
+        section = generator._generate_file_section_optimized(large, tmp_path)
+        
+        assert any(isinstance(part, FileSpan) for part in section.parts)
+        rendered = generator.tokenizer.count(generator._materialize(section.parts))
+        assert 0 <= section.tokens - rendered <= 2
+    
+    def test_without_tokenizer_toc_is_unchanged(self, tmp_path, files):
+        """Test that counts are only added when requested."""
+        content = MarkdownGenerator().generate(files, tmp_path)
+        
+        assert "Total tokens" not in content
+        assert "1. [a.py](#apy)\n" in content
+    
+    def test_invalid_tokenizer_is_rejected(self):
+        """Test that unknown tokenizer specs raise a clear error."""
+        with pytest.raises(ValueError, match="Invalid tokenizer"):
+            MarkdownGenerator({'tokenizer': 'no-such-vocab'})
+
+
+class TestTokenBudget:
+    """Test selecting files to fit max_tokens."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create a README, an entry point and a few modules of growing size."""
+        (tmp_path / "README.md").write_text("# Project\n\nRead me first.\n")
+        (tmp_path / "main.py").write_text("from lib import run\nrun()\n")
+        for i, size in enumerate([200, 2000, 20000]):
+            (tmp_path / f"lib_{i}.py").write_text("x = 1\n" * (size // 6))
+        return sorted(p for p in tmp_path.iterdir() if p.is_file())
+    
+    def test_low_priority_files_are_omitted(self, tmp_path, files):
+        """Test that the largest module is dropped and listed in the TOC."""
+        generator = MarkdownGenerator({'max_tokens': 2000})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert [f.name for f in generator.omitted] == ["lib_2.py"]
+        assert "## README.md" in content
+        assert "## main.py" in content
+        assert "## lib_2.py" not in content
+        assert "Omitted files: 1 (token budget: 2,000)" in content
+        assert "Omitted to fit the 2,000-token budget:\n\n- lib_2.py" in content
+        assert generator.total_tokens <= 2000
+    
+    def test_include_patterns_take_priority(self, tmp_path, files):
+        """Test that INCLUDE matches are kept before anything else."""
+        generator = MarkdownGenerator({'max_tokens': 14000}, include_patterns=["lib_2.py"])
+        
+        generator.generate(files, tmp_path)
+        
+        assert "lib_2.py" not in [f.name for f in generator.omitted]
+        assert "lib_1.py" in [f.name for f in generator.omitted]
+    
+    def test_everything_fits(self, tmp_path, files):
+        """Test that a generous budget changes nothing but the header."""
+        generator = MarkdownGenerator({'max_tokens': 1_000_000})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert generator.omitted == []
+        assert "Omitted" not in content
+        assert content.count("\n## ") == len(files) + 1
+    
+    def test_second_run_uses_exact_counts(self, tmp_path, files):
+        """Test that counts from a previous run replace size estimates."""
+        generator = MarkdownGenerator({'max_tokens': 5000})
+        generator.generate(files, tmp_path)
+        
+        stats = [f.stat() for f in files]
+        estimates = [generator._section_token_estimate(f.name, st) for f, st in zip(files, stats)]
+        
+        rendered = {section.rel_path: section.tokens for section in generator.sections}
+        for file, (tokens, exact) in zip(files, estimates):
+            if file.name in rendered:
+                assert exact and tokens == rendered[file.name]
+    
+    def test_streamed_output_matches(self, tmp_path, files):
+        """Test that generate_to_file applies the same selection."""
+        generator = MarkdownGenerator({'max_tokens': 2000})
+        output = tmp_path / "out" / "context.md"
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        assert _without_timestamp(output.read_text()) == _without_timestamp(generator.generate(files, tmp_path))
+    
+    @pytest.fixture
+    def sources(self, tmp_path):
+        """Copy this package's own modules, as realistic source files."""
+        package = Path(__file__).parent.parent / "src" / "llmd"
+        for source in package.glob("*.py"):
+            shutil.copy(source, tmp_path / source.name)
+        return sorted(tmp_path.glob("*.py"))
+    
+    @pytest.mark.parametrize("max_tokens", [5000, 20000, 100000])
+    def test_budget_holds_on_source_code(self, tmp_path, sources, max_tokens):
+        """Test that the counted tokens stay within the budget on real code."""
+        generator = MarkdownGenerator({'max_tokens': max_tokens})
+        
+        content = generator.generate(sources, tmp_path)
+        
+        assert generator.omitted
+        assert 0 < generator.total_tokens <= max_tokens
+        assert content.count("\n## ") == len(sources) - len(generator.omitted) + 1
+        for file in generator.omitted:
+            assert f"\n- {file.name}" in content
+    
+    def test_exact_counts_enforce_the_budget(self, tmp_path, sources, monkeypatch):
+        """Test that sections are dropped when the estimates turn out too low."""
+        generator = MarkdownGenerator({'max_tokens': 20000})
+        monkeypatch.setattr(generator, '_calibrate_estimates', lambda *args: 16.0)
+        output = tmp_path / "out" / "context.md"
+        
+        generator.generate_to_file(sources, tmp_path, output)
+        
+        content = output.read_text()
+        assert generator.total_tokens <= 20000
+        assert len(generator.sections) + len(generator.omitted) == len(sources)
+        assert len(generator.budget.selected) == len(generator.sections)
+        for file in generator.omitted:
+            assert f"## {file.name}" not in content
+            assert f"\n- {file.name}" in content
+    
+    @pytest.mark.parametrize("value", [0, -5, "lots", True])
+    def test_invalid_max_tokens_rejected(self, value):
+        """Test that nonsensical budgets raise a clear error."""
+        with pytest.raises(ValueError, match="Invalid max_tokens"):
+            MarkdownGenerator({'max_tokens': value})
+
+
+class TestShardedOutput:
+    """Test splitting the output into bounded parts."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create several medium files and one file larger than a part."""
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        for i in range(6):
+            (repo / f"mod_{i}.py").write_text(f"value_{i} = 1\n" * 200)
+        (repo / "big.py").write_text("".join(f"line_{i} = {i}\n" for i in range(2000)))
+        return sorted(repo.iterdir())
+    
+    def test_parts_respect_byte_limit(self, tmp_path, files):
+        """Test that every part fits and whole files are never split."""
+        generator = MarkdownGenerator({'shard_size': '8KB'})
+        output = tmp_path / "out" / "llm-context.md"
+        
+        total = generator.generate_to_file(files, files[0].parent, output)
+        
+        assert len(generator.parts) > 1
+        assert generator.parts[0] == output.parent / "llm-context.part-001.md"
+        assert all(part.stat().st_size <= 8 * 1024 for part in generator.parts)
+        assert total == output.stat().st_size + sum(part.stat().st_size for part in generator.parts)
+        
+        contents = [part.read_text() for part in generator.parts]
+        for i in range(6):
+            assert sum(content.count(f"## mod_{i}.py\n") for content in contents) == 1
+    
+    def test_each_part_has_header_and_toc(self, tmp_path, files):
+        """Test that parts are self-contained documents."""
+        generator = MarkdownGenerator({'shard_size': '8KB'})
+        output = tmp_path / "out" / "llm-context.md"
+        
+        generator.generate_to_file(files, files[0].parent, output)
+        
+        for index, part in enumerate(generator.parts, 1):
+            content = part.read_text()
+            assert content.startswith("# LLM Context for repo\n")
+            assert f"Part: {index} (index: [llm-context.md](llm-context.md))" in content
+            assert "## Table of Contents\n\n1. [" in content
+    
+    def test_oversized_file_is_split_losslessly(self, tmp_path, files):
+        """Test that a file larger than a part is split by lines and rejoins exactly."""
+        generator = MarkdownGenerator({'shard_size': '8KB'})
+        output = tmp_path / "out" / "llm-context.md"
+        
+        generator.generate_to_file(files, files[0].parent, output)
+        
+        text = "".join(part.read_text() for part in generator.parts)
+        pieces = re.findall(r"## big\.py \(part (\d+) of (\d+)\)\n\n```python\n(.*?)\n```", text, re.S)
+        assert len(pieces) > 1
+        assert [int(k) for k, _, _ in pieces] == list(range(1, len(pieces) + 1))
+        assert "\n".join(body for _, _, body in pieces) == files[0].read_text()
+    
+    def test_index_lists_every_part(self, tmp_path, files):
+        """Test the master index."""
+        generator = MarkdownGenerator({'shard_size': '8KB'})
+        output = tmp_path / "out" / "llm-context.md"
+        
+        generator.generate_to_file(files, files[0].parent, output)
+        
+        index = output.read_text()
+        assert f"Parts: {len(generator.parts)}" in index
+        assert "Total files: 7" in index
+        for part in generator.parts:
+            assert f"[{part.name}]({part.name})" in index
+        assert "   - mod_3.py" in index
+    
+    def test_token_limit(self, tmp_path, files):
+        """Test that a token-bounded shard size counts tokens."""
+        generator = MarkdownGenerator({'shard_size': '2000 tokens'})
+        output = tmp_path / "out" / "llm-context.md"
+        
+        generator.generate_to_file(files, files[0].parent, output)
+        
+        assert generator.tokenizer is not None
+        for part in generator.parts:
+            assert generator.tokenizer.count(part.read_bytes()) <= 2000
+    
+    def test_stale_parts_removed(self, tmp_path, files):
+        """Test that a rerun producing fewer parts deletes the extra ones."""
+        output = tmp_path / "out" / "llm-context.md"
+        MarkdownGenerator({'shard_size': '8KB'}).generate_to_file(files, files[0].parent, output)
+        
+        generator = MarkdownGenerator({'shard_size': '1MB'})
+        generator.generate_to_file(files, files[0].parent, output)
+        
+        assert len(generator.parts) == 1
+        assert sorted(p.name for p in output.parent.iterdir()) == ["llm-context.md", "llm-context.part-001.md"]
+    
+    def test_invalid_shard_size_rejected(self):
+        """Test that bad sizes raise a clear error."""
+        with pytest.raises(ValueError, match="Invalid shard_size"):
+            MarkdownGenerator({'shard_size': 'huge'})
+
+
+class TestSectionCacheIntegration:
+    """Test reusing rendered sections across runs."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create small files, a CRLF file and a file large enough to splice."""
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        for i in range(20):
+            (repo / f"mod_{i:02d}.py").write_text(f"value_{i} = {i}\n" * 10)
+        (repo / "windows.txt").write_bytes(b"line\r\n" * 5)
+        (repo / "blob.bin.txt").write_bytes(b"\xff\xfe\x00")
+        (repo / "large.txt").write_text("alpha beta\n" * 500)
+        return sorted(p for p in repo.iterdir() if p.is_file())
+    
+    def run(self, files, options):
+        generator = MarkdownGenerator(options)
+        generator.zero_copy_threshold = 1000
+        content = generator.generate(files, files[0].parent)
+        return generator, "\n".join(_without_timestamp(content))
+    
+    def test_warm_run_is_identical(self, files):
+        """Test that cached sections reproduce the uncached document."""
+        _, expected = self.run(files, {'tokenizer': 'heuristic'})
+        cold, cold_content = self.run(files, {'cache': True, 'tokenizer': 'heuristic'})
+        warm, warm_content = self.run(files, {'cache': True, 'tokenizer': 'heuristic'})
+        
+        assert cold_content == expected
+        assert warm_content == expected
+        assert (cold.cache_hits, cold.cache_misses) == (0, len(files))
+        assert (warm.cache_hits, warm.cache_misses) == (len(files), 0)
+        assert (files[0].parent / ".llmd-cache" / "index.json").exists()
+    
+    def test_changed_file_is_rerendered(self, files):
+        """Test that an edited file misses while the rest still hit."""
+        self.run(files, {'cache': True})
+        files[0].write_text("changed = True\n")
+        
+        generator, content = self.run(files, {'cache': True})
+        
+        assert (generator.cache_hits, generator.cache_misses) == (len(files) - 1, 1)
+        assert "changed = True" in content
+    
+    def test_verify_detects_same_stat_edit(self, files):
+        """Test that content verification catches edits that keep size and mtime."""
+        self.run(files, {'cache': True})
+        target = next(file for file in files if file.name == "mod_05.py")
+        st = target.stat()
+        original = target.read_text()
+        target.write_text(original.replace("value", "VALUE"))
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+        
+        _, trusting = self.run(files, {'cache': True})
+        _, verified = self.run(files, {'cache': True, 'cache_verify': True})
+        
+        assert "VALUE" not in trusting
+        assert "VALUE" in verified
+    
+    def test_new_tokenizer_recounts(self, files):
+        """Test that entries without counts for the current tokenizer are re-rendered."""
+        self.run(files, {'cache': True})
+        
+        generator, _ = self.run(files, {'cache': True, 'tokenizer': 'heuristic'})
+        
+        assert generator.cache_misses == len(files)
+        assert all(section.tokens is not None for section in generator.sections)
+    
+    def test_budget_uses_cached_counts(self, files):
+        """Test that token budget planning reads exact counts from the cache."""
+        self.run(files, {'cache': True, 'tokenizer': 'heuristic'})
+        generator = MarkdownGenerator({'cache': True, 'max_tokens': 100_000})
+        generator._open_cache(files[0].parent)
+        
+        rel_path = files[0].name
+        tokens, exact = generator._section_token_estimate(rel_path, files[0].stat())
+        generator._close_cache()
+        
+        assert exact
+        reference = MarkdownGenerator({'tokenizer': 'heuristic'})
+        reference.generate([files[0]], files[0].parent)
+        assert tokens == reference.sections[0].tokens
+
+
+class TestIncrementalRegeneration:
+    """Test --incremental regeneration from the section manifest."""
+    
+    @pytest.fixture
+    def repo(self, tmp_path):
+        """Create small files, a CRLF file, a binary file and a file large enough to splice."""
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        for i in range(20):
+            (repo / f"mod_{i:02d}.py").write_text(f"value_{i} = {i}\n" * 10)
+        (repo / "windows.txt").write_bytes(b"line\r\n" * 5)
+        (repo / "blob.bin.txt").write_bytes(b"\xff\xfe\x00")
+        (repo / "large.txt").write_text("alpha beta\n" * 500)
+        return repo
+    
+    def run(self, repo, output, options):
+        generator = MarkdownGenerator(options)
+        generator.zero_copy_threshold = 1000
+        files = sorted(p for p in repo.iterdir() if p.is_file())
+        generator.generate_to_file(files, repo, output)
+        return generator, "\n".join(_without_timestamp(output.read_text()))
+    
+    def edit(self, repo):
+        """Change, add and remove files."""
+        (repo / "mod_03.py").write_text("changed = True\n")
+        (repo / "large.txt").write_text("gamma delta\n" * 600)
+        (repo / "mod_07.py").unlink()
+        (repo / "mod_10a.py").write_text("added = 1\n")
+    
+    @pytest.mark.parametrize("options", [{}, {'tokenizer': 'heuristic'}])
+    def test_matches_full_regeneration(self, repo, tmp_path, options):
+        """Test that an incremental run equals a fresh full run byte for byte."""
+        output = tmp_path / "out" / "llm-context.md"
+        self.run(repo, output, {**options, 'incremental': True})
+        self.edit(repo)
+        
+        generator, incremental = self.run(repo, output, {**options, 'incremental': True})
+        _, full = self.run(repo, tmp_path / "full" / "llm-context.md", options)
+        
+        assert incremental == full
+        # mod_03.py, large.txt and mod_10a.py are rendered; everything else is copied
+        assert generator.reused_sections == len(generator.sections) - 3
+        assert "changed = True" in incremental and "added = 1" in incremental
+        assert "value_7 = 7" not in incremental
+    
+    @pytest.mark.parametrize("options", [{}, {'tokenizer': 'heuristic'}, {'stable': True, 'index': True}])
+    def test_same_length_edit_is_patched_in_place(self, repo, tmp_path, options):
+        """Test that sections that keep their length are written over the previous output."""
+        output = tmp_path / "out" / "llm-context.md"
+        self.run(repo, output, {**options, 'incremental': True})
+        inode = output.stat().st_ino
+        # large.txt was written last, so it also stays last in stable order
+        (repo / "large.txt").write_text("gamma beta\n" * 500)
+        
+        generator, incremental = self.run(repo, output, {**options, 'incremental': True})
+        _, full = self.run(repo, tmp_path / "full" / "llm-context.md", options)
+        
+        assert output.stat().st_ino == inode
+        assert incremental == full
+        assert generator.reused_sections == len(generator.sections) - 1
+        # The manifest describes the patched output, so the next run reuses everything
+        generator, _ = self.run(repo, output, {**options, 'incremental': True})
+        assert generator.reused_sections == len(generator.sections)
+    
+    def test_length_change_rewrites_output(self, repo, tmp_path):
+        """Test that a section that changes length makes the run write a new output."""
+        output = tmp_path / "llm-context.md"
+        self.run(repo, output, {'incremental': True})
+        inode = output.stat().st_ino
+        (repo / "mod_03.py").write_text("value_3 = 99\n" * 10)
+        
+        generator, incremental = self.run(repo, output, {'incremental': True})
+        _, full = self.run(repo, tmp_path / "full" / "llm-context.md", {})
+        
+        assert output.stat().st_ino != inode
+        assert incremental == full
+        assert generator.reused_sections == len(generator.sections) - 1
+    
+    def test_first_run_writes_manifest(self, repo, tmp_path):
+        """Test that the manifest records every rendered section."""
+        output = tmp_path / "llm-context.md"
+        generator, _ = self.run(repo, output, {'incremental': True})
+        
+        assert generator.reused_sections == 0
+        manifest = json.loads((tmp_path / ".llm-context.md.manifest.json").read_text())
+        assert len(manifest["entries"]) == len(generator.sections)
+        data = output.read_bytes()
+        offset, length = manifest["entries"]["mod_00.py"][:2]
+        assert data[offset:offset + length].startswith(b"## mod_00.py\n")
+    
+    def test_modified_output_invalidates_manifest(self, repo, tmp_path):
+        """Test that nothing is reused when the output was edited since the last run."""
+        output = tmp_path / "llm-context.md"
+        self.run(repo, output, {'incremental': True})
+        output.write_text(output.read_text().replace("value_1 ", "VALUE_1 "))
+        
+        generator, content = self.run(repo, output, {'incremental': True})
+        
+        assert generator.reused_sections == 0
+        assert "VALUE_1" not in content
+    
+    def test_tokenizer_change_invalidates_manifest(self, repo, tmp_path):
+        """Test that a manifest written with other settings is ignored."""
+        output = tmp_path / "llm-context.md"
+        self.run(repo, output, {'incremental': True})
+        
+        generator, _ = self.run(repo, output, {'incremental': True, 'tokenizer': 'heuristic'})
+        
+        assert generator.reused_sections == 0
+        assert all(section.tokens is not None for section in generator.sections)
+    
+    def test_rejects_shards(self):
+        """Test that incremental output cannot be sharded."""
+        with pytest.raises(ValueError, match="Invalid incremental option"):
+            MarkdownGenerator({'incremental': True, 'shard_size': '1MB'})
+
+
+class TestCpuWorkers:
+    """Test rendering with the process-pool CPU stage."""
+    
+    def test_output_matches_inline(self, tmp_path):
+        """Test that worker processes produce the same document."""
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        for i in range(30):
+            (repo / f"mod_{i:02d}.py").write_text(f"value_{i} = {i}\n" * 10)
+        (repo / "windows.txt").write_bytes(b"line\r\n" * 5)
+        (repo / "blob.txt").write_bytes(b"\xff\xfe\x00")
+        (repo / "large.txt").write_text("alpha beta\n" * 500)
+        files = sorted(repo.iterdir())
+        
+        documents = []
+        for cpu_workers in (0, 2):
+            generator = MarkdownGenerator({'tokenizer': 'heuristic', 'cpu_workers': cpu_workers})
+            generator.zero_copy_threshold = 1000
+            documents.append(_without_timestamp(generator.generate(files, repo)))
+        
+        assert documents[0] == documents[1]
+    
+    def test_auto_uses_usable_cpus(self):
+        """Test that 'auto' sizes the pool from the CPUs this process may use."""
+        from llmd.scheduler import available_cpus
+        assert MarkdownGenerator({'cpu_workers': 'auto'}).cpu_workers == available_cpus()
+    
+    @pytest.mark.parametrize("value", [-1, 'many', True])
+    def test_invalid_cpu_workers(self, value):
+        """Test that bad values are rejected."""
+        with pytest.raises(ValueError, match="Invalid cpu_workers"):
+            MarkdownGenerator({'cpu_workers': value})
+
+
+class TestDeduplication:
+    """Test emitting identical files once."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create two vendored copies of one file, plus distinct files."""
+        for directory in ("a", "b", "c"):
+            (tmp_path / directory).mkdir()
+        shared = "def helper():\n    return 42\n" * 20
+        (tmp_path / "a" / "util.py").write_text(shared)
+        (tmp_path / "b" / "util.py").write_text(shared)
+        (tmp_path / "c" / "util.py").write_text(shared.replace("\n", "\r\n"))
+        (tmp_path / "main.py").write_text("print('main')\n")
+        return sorted(p for p in tmp_path.rglob("*.py"))
+    
+    def test_later_copies_become_stubs(self, tmp_path, files):
+        """Test that only the first copy is emitted in full."""
+        generator = MarkdownGenerator({'dedupe': True})
+        
+        content = generator.generate(files, tmp_path)
+        
+        # a/util.py in full, c/util.py in full (CRLF), b/util.py as a stub
+        assert content.count("return 42") == 40
+        assert "## b/util.py\n\n```python\n[Identical to a/util.py - content omitted]\n```" in content
+        assert "2. [b/util.py](#butilpy) (identical to a/util.py)" in content
+        assert generator.duplicates == {"b/util.py": "a/util.py"}
+        assert generator.dedupe_saved_bytes > 400
+    
+    def test_files_differing_in_raw_bytes_are_kept(self, tmp_path, files):
+        """Test that files are matched by exact contents, not by rendered text."""
+        content = MarkdownGenerator({'dedupe': True}).generate(files, tmp_path)
+        
+        assert "## c/util.py\n\n```python\ndef helper" in content
+    
+    def test_saved_tokens_are_reported(self, tmp_path, files):
+        """Test that token savings match the difference in section counts."""
+        full = MarkdownGenerator({'tokenizer': 'heuristic'})
+        full.generate(files, tmp_path)
+        deduped = MarkdownGenerator({'tokenizer': 'heuristic', 'dedupe': True})
+        deduped.generate(files, tmp_path)
+        
+        assert deduped.dedupe_saved_tokens == full.total_tokens - deduped.total_tokens > 0
+    
+    def test_streamed_output_matches_generate(self, tmp_path, files):
+        """Test that the file output carries the same stubs and TOC."""
+        generator = MarkdownGenerator({'dedupe': True})
+        output = tmp_path / "out" / "context.md"
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        assert _without_timestamp(output.read_text()) == _without_timestamp(generator.generate(files, tmp_path))
+    
+    def test_without_dedupe_all_copies_are_emitted(self, tmp_path, files):
+        """Test that deduplication is opt-in."""
+        content = MarkdownGenerator().generate(files, tmp_path)
+        
+        assert content.count("return 42") == 60
+        assert "identical to" not in content
+
+
+class TestNearDuplicates:
+    """Test collapsing similar files into diffs."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        """Create three similar locale files and an unrelated one."""
+        locales = tmp_path / "locales"
+        locales.mkdir()
+        base = "".join(f'MESSAGE_{i} = "message number {i}"\n' for i in range(100))
+        (locales / "en.py").write_text(base)
+        (locales / "en_GB.py").write_text(base.replace('"message number 7"', '"message no. 7"'))
+        (locales / "en_US.py").write_text(base.replace('"message number 42"', '"msg 42"'))
+        (tmp_path / "main.py").write_text("".join(f"step_{i}()\n" for i in range(100)))
+        return sorted(p for p in tmp_path.rglob("*.py"))
+    
+    def test_similar_files_become_diffs(self, tmp_path, files):
+        """Test that later similar files are emitted as diffs against the first."""
+        generator = MarkdownGenerator({'near_duplicates': True})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert generator.near_duplicates == {"locales/en_GB.py": "locales/en.py", "locales/en_US.py": "locales/en.py"}
+        assert "## locales/en_GB.py\n\n```diff\n--- a/locales/en.py\n+++ b/locales/en_GB.py\n" in content
+        assert '+MESSAGE_7 = "message no. 7"' in content
+        assert "(diff against locales/en.py)" in content
+        assert content.count('MESSAGE_50 = "message number 50"') == 1
+        assert generator.near_duplicate_saved_bytes > 5000
+    
+    def test_unrelated_files_are_kept(self, tmp_path, files):
+        content = MarkdownGenerator({'near_duplicates': True}).generate(files, tmp_path)
+        
+        assert "## main.py\n\n```python\nstep_0()" in content
+    
+    def test_threshold_above_similarity_keeps_files(self, tmp_path, files):
+        """Test that a threshold of 1 only collapses files with identical shingles."""
+        generator = MarkdownGenerator({'near_duplicates': 1.0})
+        
+        generator.generate(files, tmp_path)
+        
+        assert generator.near_duplicates == {}
+    
+    def test_evicted_representative_is_rerendered(self, tmp_path, files):
+        """Test diffs when the representative's body is no longer in memory."""
+        generator = MarkdownGenerator({'near_duplicates': True, 'tokenizer': 'heuristic'})
+        generator.near_duplicate_memory = 0
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert len(generator.near_duplicates) == 2
+        assert '+MESSAGE_42 = "msg 42"' in content
+        assert generator.near_duplicate_saved_tokens > 0
+    
+    def test_matches_across_cache_and_worker_processes(self, tmp_path, files):
+        """Test that reused sections and worker processes give the same diffs."""
+        documents = []
+        for options in ({}, {'cache': True}, {'cache': True}, {'cpu_workers': 2}):
+            generator = MarkdownGenerator({'near_duplicates': True, **options})
+            documents.append(_without_timestamp(generator.generate(files, tmp_path)))
+        
+        assert all(document == documents[0] for document in documents)
+    
+    @pytest.mark.parametrize("value", [0, 1.5, 'yes'])
+    def test_invalid_threshold(self, value):
+        with pytest.raises(ValueError, match="Invalid near_duplicates"):
+            MarkdownGenerator({'near_duplicates': value})
+
+
+class TestCompact:
+    """Test language-aware compaction of file bodies."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "app.py").write_text('"""App."""\n\n\n\ndef run():  # entry\n    """Run it."""\n    return 1\n')
+        (tmp_path / "app.js").write_text('// Copyright\nconst a = "//";  /* note */\r\n')
+        (tmp_path / "notes.txt").write_text("keep   \n\n\n\nthis # too\n")
+        return sorted(tmp_path.iterdir())
+    
+    def test_bodies_are_compacted(self, tmp_path, files):
+        generator = MarkdownGenerator({'compact': True})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert "```python\ndef run():\n    return 1\n\n```" in content
+        assert '```javascript\nconst a = "//";\n\n```' in content
+        assert "```text\nkeep\n\nthis # too\n\n```" in content
+        assert generator.compact_saved_bytes == sum(section.compacted_bytes for section in generator.sections) > 0
+        assert generator.compact_saved_tokens is None
+    
+    def test_off_by_default(self, tmp_path, files):
+        content = MarkdownGenerator().generate(files, tmp_path)
+        
+        assert '"""Run it."""' in content
+    
+    def test_worker_processes_match_inline(self, tmp_path, files):
+        """Test that compaction in worker processes gives the same output and savings."""
+        inline = MarkdownGenerator({'compact': True, 'tokenizer': 'heuristic'})
+        pooled = MarkdownGenerator({'compact': True, 'tokenizer': 'heuristic', 'cpu_workers': 2})
+        
+        assert pooled.generate(files, tmp_path) == inline.generate(files, tmp_path)
+        assert pooled.compact_saved_tokens == inline.compact_saved_tokens > 0
+    
+    def test_render_key_includes_compact(self):
+        assert MarkdownGenerator({'compact': True})._render_key() != MarkdownGenerator()._render_key()
+
+
+class TestOutline:
+    """Test rendering source files as outlines."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "big.py").write_text('def run(x):\n    """Run."""\n    return x * 2\n')
+        (tmp_path / "small.py").write_text('def tiny():\n    return 1\n')
+        (tmp_path / "broken.py").write_text('def broken(:\n    pass\n')
+        (tmp_path / "notes.txt").write_text('def not_code():\n')
+        return sorted(p for p in tmp_path.rglob("*") if p.is_file())
+    
+    def test_supported_files_are_outlined(self, tmp_path, files):
+        generator = MarkdownGenerator({'outline': True})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert '```python\n# Outline: bodies omitted\ndef run(x):\n    """Run."""\n\n```' in content
+        assert "return 1" not in content
+        assert "def broken(:\n    pass" in content
+        assert "```text\ndef not_code():" in content
+        assert sorted(s.rel_path for s in generator.sections if s.outlined) == ["small.py", "src/big.py"]
+    
+    def test_patterns_select_files(self, tmp_path, files):
+        """Test that a comma-separated OPTIONS value limits outlining to matching files."""
+        content = MarkdownGenerator({'outline': 'src/**, other/*.go'}).generate(files, tmp_path)
+        
+        assert "return x * 2" not in content
+        assert "return 1" in content
+    
+    def test_invalid_outline(self):
+        with pytest.raises(ValueError, match="Invalid outline"):
+            MarkdownGenerator({'outline': 3})
+    
+    def test_outlines_persist_with_cache(self, tmp_path, files):
+        """Test that a touched but unchanged file reuses its outline from the cache directory."""
+        options = {'outline': True, 'cache': True, 'cache_dir': str(tmp_path / "cache")}
+        MarkdownGenerator(options).generate(files, tmp_path)
+        for file in files:
+            os.utime(file, ns=(1, 1))
+        
+        generator = MarkdownGenerator(options)
+        generator.generate(files, tmp_path)
+        
+        assert generator.cache_misses == len(files)
+        assert generator.outline_hits == 2
+        assert (tmp_path / "cache" / "outlines.json").exists()
+    
+    def test_worker_processes_match_inline(self, tmp_path, files):
+        inline = MarkdownGenerator({'outline': True, 'tokenizer': 'heuristic'})
+        pooled = MarkdownGenerator({'outline': True, 'tokenizer': 'heuristic', 'cpu_workers': 2})
+        
+        assert pooled.generate(files, tmp_path) == inline.generate(files, tmp_path)
+    
+    def test_render_key_includes_outline(self):
+        assert (MarkdownGenerator({'outline': True})._render_key()
+                != MarkdownGenerator({'outline': 'src/**'})._render_key()
+                != MarkdownGenerator()._render_key())
+
+
+class TestLargeFiles:
+    """Test the large-file policy."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "app.log").write_text("".join(f"event {i}\n" for i in range(1, 1001)))
+        (tmp_path / "main.py").write_text("".join(f"x_{i} = {i}\n" for i in range(1, 1001)))
+        return sorted(tmp_path.iterdir())
+    
+    def test_pattern_threshold_with_excerpt(self, tmp_path, files):
+        generator = MarkdownGenerator({'max_file_size': '*.log=1KB', 'large_files': 'excerpt',
+                                       'excerpt_head': 2, 'excerpt_tail': '1 lines'})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert "\n     1  event 1\n     2  event 2\n[... " in content
+        assert " bytes omitted ...]\n    -1  event 1000\n```" in content
+        assert "x_500 = 500" in content
+    
+    def test_omit_is_the_default_policy(self, tmp_path, files):
+        content = MarkdownGenerator({'max_file_size': '1KB'}).generate(files, tmp_path)
+        
+        assert content.count("[File too large - content omitted]") == 2
+    
+    def test_render_key_includes_policy(self):
+        assert (MarkdownGenerator({'large_files': 'excerpt'})._render_key()
+                != MarkdownGenerator({'max_file_size': '*.log=1KB'})._render_key()
+                != MarkdownGenerator()._render_key())
+    
+    def test_invalid_max_file_size(self):
+        with pytest.raises(ValueError, match="Invalid max_file_size"):
+            MarkdownGenerator({'max_file_size': 'huge'})
+
+
+class TestCompressedOutput:
+    """Test compressing the output as it is written."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        for i in range(20):
+            (tmp_path / f"f{i:02d}.py").write_text(f"value = {i}\n" * 2000)
+        return sorted(tmp_path.glob("*.py"))
+    
+    def test_suffix_selects_compression(self, tmp_path, files):
+        generator = MarkdownGenerator({'tokenizer': 'heuristic'})
+        
+        size = generator.generate_to_file(files, tmp_path, tmp_path / "out" / "context.md.gz")
+        
+        data = gzip.decompress((tmp_path / "out" / "context.md.gz").read_bytes())
+        assert size == (tmp_path / "out" / "context.md.gz").stat().st_size < len(data)
+        assert generator.uncompressed_bytes == len(data)
+        assert data.decode().endswith(MarkdownGenerator({'tokenizer': 'heuristic'}).generate(files, tmp_path)
+                                      .split("\n", 3)[3])
+    
+    def test_compress_option(self, tmp_path, files):
+        output = tmp_path / "out" / "context.md"
+        
+        MarkdownGenerator({'compress': 'xz'}).generate_to_file(files, tmp_path, output)
+        
+        assert lzma.decompress(output.read_bytes()).startswith(b"# LLM Context")
+    
+    def test_compression_can_be_disabled(self, tmp_path, files):
+        output = tmp_path / "out" / "context.md.gz"
+        
+        MarkdownGenerator({'compress': False}).generate_to_file(files, tmp_path, output)
+        
+        assert output.read_bytes().startswith(b"# LLM Context")
+    
+    def test_not_combined_with_incremental(self, tmp_path, files):
+        with pytest.raises(ValueError, match="Invalid compress 'gzip': it cannot be combined with incremental"):
+            MarkdownGenerator({'incremental': True}).generate_to_file(files, tmp_path, tmp_path / "out.md.gz")
+        with pytest.raises(ValueError, match="cannot be combined with shard_size"):
+            MarkdownGenerator({'compress': 'gzip', 'shard_size': '1MB'})
+    
+    def test_level_checked_per_codec(self, tmp_path, files):
+        """Test that levels a codec does not have are rejected with the options."""
+        with pytest.raises(ValueError, match="Invalid compress_level '12'. Expected 0-9 for gzip"):
+            MarkdownGenerator({'compress': 'gzip', 'compress_level': 12})
+        with pytest.raises(ValueError, match="Expected 0-9 for xz"):
+            MarkdownGenerator({'compress_level': 10}).generate_to_file(files, tmp_path, tmp_path / "out.md.xz")
+        with pytest.raises(ValueError, match="Expected a non-negative integer"):
+            MarkdownGenerator({'compress': 'gzip', 'compress_level': -1})
+        assert MarkdownGenerator({'compress_level': 19}).compress_level == 19
+
+
+class TestRecordFormats:
+    """Test JSON lines and XML output."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "a.py").write_text('fence = "```"\n')
+        (tmp_path / "b.txt").write_text("<b> & </b>\n")
+        (tmp_path / "c.txt").write_text("<b> & </b>\n")
+        (tmp_path / "large.txt").write_text("z" * 2_000_000)
+        return sorted(tmp_path.glob("*.*"))
+    
+    def test_jsonl_records(self, tmp_path, files):
+        generator = MarkdownGenerator({'format': 'jsonl', 'tokenizer': 'heuristic', 'dedupe': True})
+        
+        records = [json.loads(line) for line in generator.generate(files, tmp_path).splitlines()]
+        
+        assert [record['path'] for record in records] == ['a.py', 'b.txt', 'c.txt', 'large.txt']
+        assert records[0] == {'path': 'a.py', 'language': 'python', 'size': 14,
+                              'tokens': generator.tokenizer.count(b'fence = "```"\n'), 'content': 'fence = "```"\n'}
+        assert records[2]['duplicate_of'] == 'b.txt'
+        assert records[3]['content'] == "z" * 2_000_000
+    
+    def test_xml_documents(self, tmp_path, files):
+        output = tmp_path / "out" / "context.xml"
+        generator = MarkdownGenerator({'max_tokens': 2000})
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        root = ElementTree.parse(output).getroot()
+        assert root.tag == 'documents' and root.get('files') == '3'
+        assert [(element.tag, element.get('path')) for element in root] == [
+            ('document', 'a.py'), ('document', 'b.txt'), ('document', 'c.txt'), ('omitted', 'large.txt')
+        ]
+        assert root[1].text == "<b> & </b>\n"
+        assert generator.output_format == 'xml'
+    
+    def test_not_combined_with_shards(self):
+        with pytest.raises(ValueError, match="Invalid format 'jsonl': it cannot be combined with shard_size"):
+            MarkdownGenerator({'format': 'jsonl', 'shard_size': '1MB'})
+
+
+class TestOutputIndex:
+    """Test the section index written next to the output."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "a.py").write_text("x = 1\ny = 2\n")
+        (tmp_path / "b.txt").write_text("no newline")
+        (tmp_path / "large.txt").write_text("line\n" * 300_000)
+        return sorted(tmp_path.glob("*.*"))
+    
+    @pytest.mark.parametrize('options', [{}, {'tokenizer': 'heuristic'}, {'format': 'jsonl'}, {'format': 'xml'}])
+    def test_entries_locate_sections(self, tmp_path, files, options):
+        output = tmp_path / "out" / "context.out"
+        generator = MarkdownGenerator(dict(options, index=True))
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        assert generator.index_path == tmp_path / "out" / "context.index.json"
+        index = json.loads(generator.index_path.read_text())
+        data = output.read_bytes()
+        lines = data.split(b"\n")
+        assert [entry['path'] for entry in index['sections']] == ['a.py', 'b.txt', 'large.txt']
+        for entry in index['sections']:
+            section = data[entry['offset']:entry['offset'] + entry['length']]
+            first, last = entry['lines']
+            assert b"\n".join(lines[first - 1:last]) == section.rstrip(b"\n")
+            assert entry['path'].encode() in section
+            assert len(entry['content_hash']) == 32
+        assert (index['sections'][0]['tokens'] is not None) == ('tokenizer' in options)
+    
+    def test_sharded_output(self, tmp_path, files):
+        output = tmp_path / "out" / "context.md"
+        generator = MarkdownGenerator({'index': True, 'shard_size': '1MB'})
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        entries = json.loads(generator.index_path.read_text())['sections']
+        assert [entry['part'] for entry in entries][:2] == ['context.part-001.md'] * 2
+        for entry in entries:
+            data = (tmp_path / "out" / entry['part']).read_bytes()
+            section = data[entry['offset']:entry['offset'] + entry['length']]
+            assert section.startswith(f"## {entry.get('title', entry['path'])}\n".encode())
+            assert data.split(b"\n")[entry['lines'][1] - 1] == b"```"
+
+
+class TestRepoMap:
+    """Test the repository map section."""
+    
+    def test_map_precedes_toc(self, tmp_path):
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "a.py").write_text("x = 1\n")
+        (tmp_path / "docs").mkdir()
+        (tmp_path / "docs" / "guide.md").write_text("# Guide\n")
+        generator = MarkdownGenerator({'repo_map': True}, inventory=walk_inventory(tmp_path))
+        
+        content = generator.generate([tmp_path / "src" / "a.py"], tmp_path)
+        
+        assert content.index("## Repository Map") < content.index("## Table of Contents")
+        assert "  docs/ 1 file, 8 B, ~2 tokens, excluded\n" in content
+        assert "  src/ 1 file, 6 B, ~2 tokens\n" in content
+    
+    def test_map_without_inventory_uses_selected_files(self, tmp_path):
+        (tmp_path / "a.py").write_text("x = 1\n")
+        generator = MarkdownGenerator({'repo_map': True})
+        
+        content = generator.generate([tmp_path / "a.py"], tmp_path)
+        
+        assert f"```text\n{tmp_path.name}/ 1 file, 6 B, ~2 tokens\n```" in content
+    
+    def test_invalid_depth(self):
+        with pytest.raises(ValueError, match="Invalid repo_map_depth"):
+            MarkdownGenerator({'repo_map': True, 'repo_map_depth': 0})
+
+
+class TestStableOutput:
+    """Test output that keeps its start identical across runs."""
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        for name, mtime in (("a.py", 300), ("b.py", 100), ("c.py", 200)):
+            path = tmp_path / name
+            path.write_text(f"{name[0]} = 1\n")
+            os.utime(path, (mtime, mtime))
+        return sorted(tmp_path.glob("*.py"))
+    
+    def test_volatile_fields_follow_sections(self, tmp_path, files):
+        generator = MarkdownGenerator({'stable': True, 'tokenizer': 'heuristic'})
+        output = tmp_path / "out" / "context.md"
+        
+        generator.generate_to_file(files, tmp_path, output)
+        
+        content = output.read_text()
+        assert content.startswith(f"# LLM Context for {tmp_path.name}\n\n## b.py\n")
+        # Outside git, files are ordered by mtime
+        assert content.index("## b.py") < content.index("## c.py") < content.index("## a.py")
+        foot = content[content.index("## a.py"):]
+        assert "Generated on: " in foot and f"Repository: `{tmp_path}`" in foot
+        assert "Total tokens: " in foot
+        assert "## Table of Contents\n\n1. [b.py](#bpy) (" in foot
+    
+    def test_prefix_survives_an_edit(self, tmp_path, files):
+        generator = MarkdownGenerator({'stable': True})
+        before = generator.generate(files, tmp_path)
+        
+        (tmp_path / "b.py").write_text("b = 2\n")
+        after = generator.generate(files, tmp_path)
+        
+        # b.py is now the most recently changed file, so it moves to the end
+        prefix = f"# LLM Context for {tmp_path.name}\n\n## c.py\n\n```python\nc = 1\n\n```"
+        assert after.startswith(prefix + "\n\n## a.py")
+        assert after.index("## a.py") < after.index("## b.py") < after.index("---\n\nGenerated on:")
+        assert before.startswith(f"# LLM Context for {tmp_path.name}\n\n## b.py")
+    
+    def test_xml_has_no_timestamp(self, tmp_path, files):
+        generator = MarkdownGenerator({'stable': True, 'format': 'xml'})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert content.startswith(f'<?xml version="1.0" encoding="UTF-8"?>\n<documents repository="{tmp_path.name}">\n')
+
+
+class TestRedaction:
+    """Test replacing secrets in file bodies."""
+    
+    KEY = "AKIA" + "IOSFODNN7EXAMPLE"
+    
+    @pytest.fixture
+    def files(self, tmp_path):
+        (tmp_path / "settings.py").write_text(f'AWS_KEY = "{self.KEY}"\ndb_password = "hunter2hunter2"\n')
+        (tmp_path / "main.py").write_text("print('hi')\n")
+        (tmp_path / "app.log").write_text(f"start {self.KEY}\n" + "event\n" * 500)
+        return sorted(tmp_path.iterdir())
+    
+    def test_secrets_are_redacted_and_counted(self, tmp_path, files):
+        generator = MarkdownGenerator({'redact': True})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert self.KEY not in content
+        assert 'AWS_KEY = "[REDACTED:aws_access_key]"\ndb_password = "[REDACTED:password_assignment]"\n' in content
+        assert generator.redactions == {'app.log': {'aws_access_key': 1},
+                                        'settings.py': {'aws_access_key': 1, 'password_assignment': 1}}
+    
+    def test_off_by_default(self, tmp_path, files):
+        generator = MarkdownGenerator()
+        
+        assert self.KEY in generator.generate(files, tmp_path)
+        assert generator.redactions == {}
+    
+    def test_excerpts_are_redacted(self, tmp_path, files):
+        generator = MarkdownGenerator({'redact': True, 'max_file_size': '*.log=1KB', 'large_files': 'excerpt'})
+        
+        content = generator.generate(files, tmp_path)
+        
+        assert "start [REDACTED:aws_access_key]" in content
+        assert generator.redactions['app.log'] == {'aws_access_key': 1}
+    
+    def test_worker_processes_match_inline(self, tmp_path, files):
+        """Test that redaction in worker processes gives the same output and counts."""
+        inline = MarkdownGenerator({'redact': True})
+        pooled = MarkdownGenerator({'redact': True, 'cpu_workers': 2})
+        
+        assert pooled.generate(files, tmp_path) == inline.generate(files, tmp_path)
+        assert pooled.redactions == inline.redactions
+    
+    def test_records_count_redactions(self, tmp_path, files):
+        generator = MarkdownGenerator({'redact': True, 'format': 'jsonl'})
+        
+        records = [json.loads(line) for line in generator.generate(files, tmp_path).splitlines()]
+        
+        assert [record.get('redactions') for record in records] == [1, None, 2]
+    
+    def test_render_key_and_options(self):
+        assert (MarkdownGenerator({'redact': True})._render_key()
+                != MarkdownGenerator({'redact': True, 'redact_patterns': ['pin=pin: \\d+']})._render_key()
+                != MarkdownGenerator()._render_key())
+        with pytest.raises(ValueError, match="Invalid redact_patterns"):
+            MarkdownGenerator({'redact': True, 'redact_patterns': ['no-name']})
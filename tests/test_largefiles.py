@@ -0,0 +1,119 @@
+import io
+
+import pytest
+
+from llmd.largefiles import (
+    ExcerptLimit, LargeFilePolicy, parse_excerpt, parse_file_size, parse_size_rules
+)
+
+
+class CountingReader(io.BytesIO):
+    """A file that records how many bytes were read from it."""
+
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def numbered(count: int) -> bytes:
+    return b"".join(b"line %d\n" % i for i in range(1, count + 1))
+
+
+class TestParsing:
+    """Test parsing of sizes, rules and excerpt lengths."""
+
+    def test_file_sizes(self):
+        assert parse_file_size("10MB") == 10 * 1024 * 1024
+        assert parse_file_size("500 kb") == 500 * 1024
+        assert parse_file_size(1234) == 1234
+        with pytest.raises(ValueError, match="Invalid max_file_size"):
+            parse_file_size("big")
+
+    def test_size_rules(self):
+        assert parse_size_rules("10MB, *.log=1MB, fixtures/**=200KB") == (
+            10 * 1024 * 1024, [("*.log", 1024 * 1024), ("fixtures/**", 200 * 1024)]
+        )
+        assert parse_size_rules(["*.csv=1KB"]) == (None, [("*.csv", 1024)])
+
+    def test_excerpt_lengths(self):
+        assert parse_excerpt("200", 'excerpt_head') == ExcerptLimit(200, 'lines')
+        assert parse_excerpt("50 lines", 'excerpt_head') == ExcerptLimit(50, 'lines')
+        assert parse_excerpt("64KB", 'excerpt_head') == ExcerptLimit(64 * 1024, 'bytes')
+        with pytest.raises(ValueError, match="Invalid excerpt_tail"):
+            parse_excerpt("some", 'excerpt_tail')
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError, match="Invalid large_files"):
+            LargeFilePolicy.from_options({'large_files': 'truncate'})
+
+
+class TestThresholds:
+    """Test per-pattern thresholds."""
+
+    def test_last_matching_rule_wins(self):
+        policy = LargeFilePolicy.from_options({'max_file_size': "1MB, *.log=1KB, keep/*.log=1MB"})
+
+        assert policy.is_large("app.log", 2048)
+        assert not policy.is_large("keep/app.log", 2048)
+        assert not policy.is_large("app.py", 2048)
+        assert policy.min_threshold == 1024
+
+
+class TestExcerpt:
+    """Test reading head and tail excerpts."""
+
+    def test_lines_with_numbers(self):
+        data = numbered(100_000)
+        policy = LargeFilePolicy(policy='excerpt', head=ExcerptLimit(2, 'lines'), tail=ExcerptLimit(2, 'lines'))
+
+        excerpt = policy.excerpt(io.BytesIO(data), len(data)).decode()
+
+        omitted = len(data) - len(b"line 1\nline 2\n") - len(b"line 99999\nline 100000\n")
+        assert excerpt == (
+            "     1  line 1\n"
+            "     2  line 2\n"
+            f"[... {omitted:,} bytes omitted ...]\n"
+            "    -2  line 99999\n"
+            "    -1  line 100000"
+        )
+
+    def test_middle_is_not_read(self):
+        data = numbered(200_000)
+        reader = CountingReader(data)
+        policy = LargeFilePolicy(policy='excerpt')
+
+        policy.excerpt(reader, len(data))
+
+        assert reader.bytes_read < 256 * 1024 < len(data)
+
+    def test_bytes_are_cut_at_line_ends(self):
+        data = numbered(1000)
+        policy = LargeFilePolicy(policy='excerpt', head=ExcerptLimit(20, 'bytes'), tail=ExcerptLimit(20, 'bytes'),
+                                 line_numbers=False)
+
+        excerpt = policy.excerpt(io.BytesIO(data), len(data)).decode()
+
+        assert excerpt.startswith("line 1\nline 2\n[... ")
+        assert excerpt.endswith(" bytes omitted ...]\nline 999\nline 1000")
+
+    def test_characters_are_not_split(self):
+        data = "é".encode() * 10_000
+        policy = LargeFilePolicy(policy='excerpt', head=ExcerptLimit(11, 'bytes'), tail=ExcerptLimit(11, 'bytes'),
+                                 line_numbers=False)
+
+        assert policy.excerpt(io.BytesIO(data), len(data)).decode().startswith("ééééé\n[...")
+
+    def test_short_file_is_shown_whole(self):
+        data = b"a\r\nb\r\nc\r\n"
+        policy = LargeFilePolicy(policy='excerpt', head=ExcerptLimit(2, 'lines'), tail=ExcerptLimit(5, 'lines'))
+
+        assert policy.excerpt(io.BytesIO(data), len(data)) == b"     1  a\n     2  b\n     3  c"
+
+    def test_binary_file_has_no_excerpt(self):
+        data = b"\xff\xfe" * 1000
+        assert LargeFilePolicy(policy='excerpt').excerpt(io.BytesIO(data), len(data)) is None
@@ -0,0 +1,216 @@
+from llmd.outline import OUTLINE_NOTE, OutlineCache, outline
+
+
+PYTHON = b'''"""Shapes.
+
+Longer description.
+"""
+import math
+from typing import (
+    List,
+)
+
+__all__ = ['Circle']
+_registry = {}
+
+
+@register
+class Circle(Shape):
+    """A circle."""
+    radius: float = 1.0
+
+    def area(self,
+             scale: float = 1.0) -> float:  # note
+        """Area of the circle."""
+        return math.pi * self.radius ** 2 * scale
+
+    def grow(self): self.radius += 1
+
+
+def helper(values: List[int]) -> int:
+    total = sum(values)
+    return total
+
+
+if __name__ == '__main__':
+    helper([1])
+'''
+
+
+class TestPythonOutline:
+    """Test outlining Python with ast."""
+
+    def test_signatures_without_bodies(self):
+        assert outline(PYTHON, 'python') == (
+            f'# {OUTLINE_NOTE}\n'
+            '"""Shapes."""\n'
+            'import math\n'
+            'from typing import (\n'
+            '    List,\n'
+            ')\n'
+            "__all__ = ['Circle']\n"
+            '\n'
+            '@register\n'
+            'class Circle(Shape):\n'
+            '    """A circle."""\n'
+            '    radius: float = 1.0\n'
+            '    def area(self,\n'
+            '             scale: float = 1.0) -> float:\n'
+            '        """Area of the circle."""\n'
+            '    def grow(self):\n'
+            '        ...\n'
+            '\n'
+            'def helper(values: List[int]) -> int:\n'
+            '    ...\n'
+        ).encode()
+
+    def test_docstrings_can_be_left_out(self):
+        skeleton = outline(PYTHON, 'python', docstrings=False)
+
+        assert b'"""' not in skeleton
+        assert b'    def area(self,\n             scale: float = 1.0) -> float:\n        ...\n' in skeleton
+
+    def test_unparsable_source_has_no_outline(self):
+        assert outline(b'def broken(:\n', 'python') is None
+
+    def test_script_without_declarations_has_no_outline(self):
+        assert outline(b'print("hello")\n', 'python') is None
+
+
+class TestBraceOutline:
+    """Test the outlines of brace-delimited languages."""
+
+    def test_javascript(self):
+        source = b'''import {
+  a,
+  b,
+} from "./x";
+
+// comment with a brace {
+export const URL = "http://x/{id}";
+
+export default function App(props) {
+  if (props.x) { return null; }
+  return props.y;
+}
+
+export class Store extends Base {
+  items = [];
+  load(url, { retries = 3 } = {}) {
+    return fetch(url);
+  }
+}
+
+app.listen(3000);
+'''
+        assert outline(source, 'javascript') == (
+            f'// {OUTLINE_NOTE}\n'
+            'import {\n'
+            '  a,\n'
+            '  b,\n'
+            '} from "./x";\n'
+            'export const URL = "http://x/{id}";\n'
+            'export default function App(props) { ... }\n'
+            'export class Store extends Base {\n'
+            '  items = [];\n'
+            '  load(url, { retries = 3 } = {}) { ... }\n'
+            '}\n'
+        ).encode()
+
+    def test_go_keeps_struct_fields(self):
+        source = b'''package server
+
+import (
+\t"fmt"
+)
+
+type Server struct {
+\tAddr string
+}
+
+func (s *Server) Start() error {
+\tfmt.Println("}")
+\treturn nil
+}
+'''
+        assert outline(source, 'go') == (
+            f'// {OUTLINE_NOTE}\n'
+            'package server\n'
+            'import (\n'
+            '\t"fmt"\n'
+            ')\n'
+            'type Server struct {\n'
+            '\tAddr string\n'
+            '}\n'
+            'func (s *Server) Start() error { ... }\n'
+        ).encode()
+
+    def test_rust_lifetimes_are_not_strings(self):
+        source = b'''use std::fmt;
+
+impl<'a> Config<'a> {
+    pub fn new(name: &'a str) -> Self {
+        let brace = '{';
+        Config { name }
+    }
+}
+'''
+        assert outline(source, 'rust') == (
+            f'// {OUTLINE_NOTE}\n'
+            'use std::fmt;\n'
+            "impl<'a> Config<'a> {\n"
+            "    pub fn new(name: &'a str) -> Self { ... }\n"
+            '}\n'
+        ).encode()
+
+    def test_unsupported_language(self):
+        assert outline(b'int main() { return 0; }\n', 'c') is None
+
+
+class TestOutlineCache:
+    """Test the outline cache."""
+
+    def test_saved_outlines_are_loaded(self, tmp_path):
+        path = tmp_path / "outlines.json"
+        cache = OutlineCache(path)
+        cache.put('python', b'\x01' * 16, b'def f():\n    ...\n')
+        cache.save()
+
+        reloaded = OutlineCache(path)
+
+        assert reloaded.get('python', b'\x01' * 16) == b'def f():\n    ...\n'
+        assert reloaded.hits == 1
+
+    def test_other_settings_are_ignored(self, tmp_path):
+        path = tmp_path / "outlines.json"
+        cache = OutlineCache(path)
+        cache.put('python', b'\x01' * 16, b'x\n')
+        cache.save()
+
+        assert OutlineCache(path, docstrings=False).get('python', b'\x01' * 16) is None
+
+    def test_only_used_outlines_are_saved(self, tmp_path):
+        path = tmp_path / "outlines.json"
+        cache = OutlineCache(path)
+        cache.put('python', b'\x01' * 16, b'old\n')
+        cache.save()
+
+        second = OutlineCache(path)
+        second.put('python', b'\x02' * 16, b'new\n')
+        second.save()
+
+        assert OutlineCache(path).get('python', b'\x01' * 16) is None
+
+    def test_entries_are_per_language(self, tmp_path):
+        """Test that identical bytes under two languages keep their own outlines."""
+        path = tmp_path / "outlines.json"
+        cache = OutlineCache(path)
+        cache.put('python', b'\x01' * 16, b'def f():\n    ...\n')
+        assert cache.get('javascript', b'\x01' * 16) is None
+        cache.put('javascript', b'\x01' * 16, b'function f() { ... }\n')
+        cache.save()
+
+        reloaded = OutlineCache(path)
+
+        assert reloaded.get('python', b'\x01' * 16) == b'def f():\n    ...\n'
+        assert reloaded.get('javascript', b'\x01' * 16) == b'function f() { ... }\n'
@@ -429,6 +429,27 @@ OPTIONS:
             
         finally:
             config_path.unlink()
+    
+    def test_get_include_patterns(self):
+        """Test that INCLUDE patterns from the config and CLI are collected once each."""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False) as f:
+            f.write("""BLACKLIST:
+tests/
+
+INCLUDE:
+tests/fixtures/
+README.md
+""")
+            f.flush()
+            config_path = Path(f.name)
+        
+        try:
+            parser = LlmMdParser(config_path, cli_include=["README.md", "docs/*.md"])
+            
+            assert parser.get_include_patterns() == ["tests/fixtures/", "README.md", "docs/*.md"]
+            
+        finally:
+            config_path.unlink()
 
 
 # TDD Tests for Default Behavior (Task 1)
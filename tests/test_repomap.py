@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+from llmd.parser import GitignoreParser, LlmMdParser
+from llmd.repomap import RepoInventory, render_repo_map, walk_inventory
+from llmd.scanner import RepoScanner
+
+
+def map_lines(text: str) -> list:
+    return text.split("```text\n")[1].split("\n```")[0].splitlines()
+
+
+class TestRender:
+    """Test rendering of the repository map."""
+
+    def test_counts_sizes_and_selection(self):
+        inventory = RepoInventory({
+            "README.md": 100,
+            "src/app/main.py": 2048,
+            "src/app/util.py": 1024,
+            "tests/test_main.py": 400,
+        }, skipped=["node_modules"])
+
+        lines = map_lines(render_repo_map(inventory, {"README.md", "src/app/main.py"}, "repo"))
+
+        assert lines == [
+            "repo/ 4 files, 3.5 KB, ~893 tokens, 2 selected (not scanned: node_modules/)",
+            "  src/app/ 2 files, 3.0 KB, ~768 tokens, 1 selected",
+            "  tests/ 1 file, 400 B, ~100 tokens, excluded",
+        ]
+
+    def test_depth_and_collapse(self):
+        files = {f"d{i}/sub/deep/file.py": (i + 1) * 100 for i in range(5)}
+        files["d0/other.py"] = 10
+        inventory = RepoInventory(files)
+
+        lines = map_lines(render_repo_map(inventory, set(files), "repo", max_depth=1, collapse=2))
+
+        assert lines == [
+            "repo/ 6 files, 1.5 KB, ~378 tokens",
+            "  d3/sub/deep/ 1 file, 400 B, ~100 tokens",
+            "  d4/sub/deep/ 1 file, 500 B, ~125 tokens",
+            "  ... 3 more directories: 4 files, 610 B, ~153 tokens",
+        ]
+
+
+class TestInventory:
+    """Test collecting the inventory from the file system."""
+
+    def test_walk(self, tmp_path: Path):
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "a.py").write_text("x = 1\n")
+        (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+        (tmp_path / "node_modules" / "pkg" / "index.js").write_text("x")
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD").write_text("ref")
+
+        inventory = walk_inventory(tmp_path, {"node_modules"})
+
+        assert inventory.files == {"src/a.py": 6}
+        assert inventory.skipped == ["node_modules"]
+
+    @pytest.mark.parametrize("mode", [None, "BLACKLIST", "WHITELIST"])
+    def test_scanner_records_its_own_walk(self, tmp_path: Path, monkeypatch, mode):
+        """Test that the scanner's inventory comes from its scan, without walking again."""
+        for rel_path in ["src/a.py", "docs/guide.md", ".github/ci.yml", "node_modules/pkg/index.js",
+                         ".git/HEAD"]:
+            (tmp_path / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / rel_path).write_text("x = 1\n")
+        parser = LlmMdParser(None, cli_mode=mode, cli_patterns=["src/**"] if mode else None)
+        scanner = RepoScanner(tmp_path, GitignoreParser(tmp_path), parser, repo_map=True)
+
+        scanner.scan()
+        monkeypatch.setattr("llmd.scanner.walk_inventory", None)
+        inventory = scanner.inventory()
+
+        # Directories the scan skipped or pruned are still counted
+        assert inventory.files == {"src/a.py": 6, "docs/guide.md": 6, ".github/ci.yml": 6}
+        assert inventory.skipped == ["node_modules"]
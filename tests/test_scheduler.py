@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from llmd import scheduler as scheduler_module
+from llmd.scheduler import (
+    AdaptiveConcurrency, WindowedScheduler, available_cpus, cgroup_cpu_quota,
+    default_workers, is_rotational, physical_offset
+)
+
+
+class TestWindowedScheduler:
+    """Test bounded in-flight submission with in-order emission."""
+    
+    def test_results_are_yielded_in_item_order(self):
+        """Test that results come back in order even when tasks finish out of order."""
+        def work(i):
+            # Earlier items take longer so they complete last
+            time.sleep((20 - i) * 0.001)
+            return i
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=8, max_bytes=10**9)
+            results = [f.result() for f in scheduler.map(work, list(range(20)), [1] * 20)]
+        
+        assert results == list(range(20))
+    
+    def test_task_limit_is_respected(self):
+        """Test that no more than max_tasks results are ever outstanding."""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=3, max_bytes=10**9)
+            results = [f.result() for f in scheduler.map(lambda i: i, list(range(100)), [1] * 100)]
+        
+        assert results == list(range(100))
+        assert scheduler.peak_tasks <= 3
+    
+    def test_byte_limit_is_respected(self):
+        """Test that the byte budget caps how much work is in flight."""
+        weights = [40] * 50
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=100, max_bytes=100)
+            list(f.result() for f in scheduler.map(lambda i: i, list(range(50)), weights))
+        
+        assert scheduler.peak_bytes <= 100
+        assert scheduler.peak_tasks <= 2
+    
+    def test_oversized_item_still_runs(self):
+        """Test that an item larger than the byte budget does not stall the pipeline."""
+        weights = [10, 1000, 10]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=4, max_bytes=100)
+            results = [f.result() for f in scheduler.map(lambda i: i * 2, [0, 1, 2], weights)]
+        
+        assert results == [0, 2, 4]
+    
+    def test_consumer_backpressure(self):
+        """Test that nothing beyond the window is submitted while the consumer is idle."""
+        submitted = []
+        lock = threading.Lock()
+        
+        def work(i):
+            with lock:
+                submitted.append(i)
+            return i
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=5, max_bytes=10**9)
+            iterator = scheduler.map(work, list(range(100)), [1] * 100)
+            first = next(iterator)
+            assert first.result() == 0
+            time.sleep(0.05)
+            
+            # Only the initial window has been handed to the executor
+            assert len(submitted) <= 5
+            iterator.close()
+    
+    def test_exceptions_are_delivered_through_futures(self):
+        """Test that a failing task surfaces on its own future only."""
+        def work(i):
+            if i == 2:
+                raise ValueError("boom")
+            return i
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=4, max_bytes=10**9)
+            outcomes = []
+            for future in scheduler.map(work, list(range(5)), [1] * 5):
+                try:
+                    outcomes.append(future.result())
+                except ValueError:
+                    outcomes.append("error")
+        
+        assert outcomes == [0, 1, "error", 3, 4]
+    
+    def test_keys_reorder_submission_but_not_results(self):
+        """Test that priority keys change submission order only."""
+        executed = []
+        lock = threading.Lock()
+        
+        def work(i):
+            with lock:
+                executed.append(i)
+            return i
+        
+        weights = [1, 1, 1, 50, 1, 1, 90, 1]
+        keys = [-w for w in weights]
+        # A single worker runs tasks in submission order
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=3, max_bytes=10**9, lookahead=8)
+            results = [f.result() for f in scheduler.map(work, list(range(8)), weights, keys)]
+        
+        assert results == list(range(8))
+        # Item 0 is forced as the next result, then the largest items jump ahead
+        assert executed[:3] == [0, 6, 3]
+    
+    def test_lookahead_limits_reordering(self):
+        """Test that items beyond the lookahead are not submitted early."""
+        executed = []
+        lock = threading.Lock()
+        
+        def work(i):
+            with lock:
+                executed.append(i)
+            return i
+        
+        weights = [1] * 9 + [100]
+        keys = [-w for w in weights]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=2, max_bytes=10**9, lookahead=3)
+            results = [f.result() for f in scheduler.map(work, list(range(10)), weights, keys)]
+        
+        assert results == list(range(10))
+        # The big last item only becomes eligible within 3 of the head
+        assert executed.index(9) >= 6
+    
+    def test_head_item_is_never_starved(self):
+        """Test that the next result is submitted even when the window is full."""
+        weights = [1] + [100] * 20
+        keys = [-w for w in weights]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            scheduler = WindowedScheduler(executor, max_tasks=2, max_bytes=10**9, lookahead=20)
+            results = [f.result() for f in scheduler.map(lambda i: i, list(range(21)), weights, keys)]
+        
+        assert results == list(range(21))
+        assert scheduler.peak_tasks <= 3
+
+
+class TestReadOrderHelpers:
+    """Test the platform probes used for locality ordering."""
+    
+    def test_physical_offset_is_int_or_none(self, tmp_path):
+        """Test that FIEMAP probing never raises."""
+        path = tmp_path / "file.txt"
+        path.write_text("content")
+        
+        offset = physical_offset(path)
+        
+        assert offset is None or isinstance(offset, int)
+        assert physical_offset(tmp_path / "missing.txt") is None
+    
+    def test_is_rotational_returns_bool(self, tmp_path):
+        """Test that the rotational probe degrades gracefully."""
+        assert isinstance(is_rotational(tmp_path), bool)
+        assert is_rotational(tmp_path / "missing") is False
+
+
+class TestCgroupCpuQuota:
+    """Test cgroup v1/v2 CPU quota detection against fake filesystems."""
+    
+    def _write(self, path, text):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    
+    def test_cgroup_v2_quota(self, tmp_path):
+        """Test reading cpu.max for a unified hierarchy."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "0::/ci/job\n")
+        self._write(cgroup / "ci" / "job" / "cpu.max", "200000 100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) == 2.0
+    
+    def test_cgroup_v2_parent_limit_applies(self, tmp_path):
+        """Test that a tighter quota on a parent cgroup wins."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "0::/ci/job\n")
+        self._write(cgroup / "ci" / "job" / "cpu.max", "max 100000\n")
+        self._write(cgroup / "ci" / "cpu.max", "150000 100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) == 1.5
+    
+    def test_cgroup_v2_unlimited(self, tmp_path):
+        """Test that 'max' means no quota."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "0::/\n")
+        self._write(cgroup / "cpu.max", "max 100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) is None
+    
+    def test_cgroup_v1_quota(self, tmp_path):
+        """Test reading CFS quota and period for cgroup v1."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "4:memory:/docker/abc\n3:cpu,cpuacct:/docker/abc\n")
+        self._write(cgroup / "cpu,cpuacct" / "docker" / "abc" / "cpu.cfs_quota_us", "50000\n")
+        self._write(cgroup / "cpu,cpuacct" / "docker" / "abc" / "cpu.cfs_period_us", "100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) == 0.5
+    
+    def test_cgroup_v1_container_root_mount(self, tmp_path):
+        """Test the container case where the host cgroup path is not visible."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "3:cpu:/kubepods/pod1/ctr\n")
+        self._write(cgroup / "cpu" / "cpu.cfs_quota_us", "300000\n")
+        self._write(cgroup / "cpu" / "cpu.cfs_period_us", "100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) == 3.0
+    
+    def test_cgroup_v1_unlimited(self, tmp_path):
+        """Test that a -1 quota means no limit."""
+        proc, cgroup = tmp_path / "proc", tmp_path / "cgroup"
+        self._write(proc / "self" / "cgroup", "3:cpu:/\n")
+        self._write(cgroup / "cpu" / "cpu.cfs_quota_us", "-1\n")
+        self._write(cgroup / "cpu" / "cpu.cfs_period_us", "100000\n")
+        
+        assert cgroup_cpu_quota(proc, cgroup) is None
+    
+    def test_missing_proc_file(self, tmp_path):
+        """Test that non-Linux systems report no quota."""
+        assert cgroup_cpu_quota(tmp_path / "proc", tmp_path / "cgroup") is None
+    
+    def test_available_cpus_honours_quota(self, monkeypatch):
+        """Test that a 2-CPU quota caps a 96-core host."""
+        monkeypatch.setattr(os, "process_cpu_count", lambda: 96, raising=False)
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(96)), raising=False)
+        monkeypatch.setattr(scheduler_module, "cgroup_cpu_quota", lambda: 1.5)
+        
+        assert available_cpus() == 2
+        assert default_workers() == 8
+
+
+class TestAdaptiveConcurrency:
+    """Test the hill-climbing concurrency limit."""
+    
+    class Clock:
+        def __init__(self):
+            self.now = 0.0
+        
+        def __call__(self):
+            return self.now
+    
+    def test_limit_keeps_rising_while_throughput_improves(self):
+        """Test that improving throughput keeps ramping concurrency up."""
+        clock = self.Clock()
+        tuner = AdaptiveConcurrency(max_limit=32, initial=4, interval=1.0, clock=clock)
+        
+        for rate in (100, 200, 300):
+            clock.now += 1.0
+            tuner.record(rate)
+        
+        assert tuner.limit > 4
+        assert tuner.history == sorted(tuner.history)
+    
+    def test_limit_reverses_when_throughput_drops(self):
+        """Test that a throughput drop flips the direction."""
+        clock = self.Clock()
+        tuner = AdaptiveConcurrency(max_limit=32, initial=8, interval=1.0, clock=clock)
+        
+        clock.now += 1.0
+        tuner.record(1000)
+        peak = tuner.limit
+        clock.now += 1.0
+        tuner.record(500)
+        
+        assert tuner.limit < peak
+    
+    def test_limit_stays_within_bounds(self):
+        """Test that the limit never leaves [1, max_limit]."""
+        clock = self.Clock()
+        tuner = AdaptiveConcurrency(max_limit=3, initial=1, interval=1.0, clock=clock)
+        
+        for i in range(20):
+            clock.now += 1.0
+            tuner.record(100 * (i % 3 + 1))
+        
+        assert all(1 <= limit <= 3 for limit in tuner.history)
+    
+    def test_slots_limit_concurrent_work(self):
+        """Test that no more than limit workers hold a slot at once."""
+        tuner = AdaptiveConcurrency(max_limit=8, initial=2, interval=3600)
+        active = []
+        peak = []
+        lock = threading.Lock()
+        
+        def work(i):
+            with tuner.slot():
+                with lock:
+                    active.append(i)
+                    peak.append(len(active))
+                time.sleep(0.005)
+                with lock:
+                    active.remove(i)
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(work, range(32)))
+        
+        assert max(peak) <= 2
@@ -0,0 +1,41 @@
+import pytest
+from pathlib import Path
+from llmd.shards import ShardLimit, parse_shard_size, part_path, stale_parts
+
+
+class TestParseShardSize:
+    """Test shard size specs."""
+
+    @pytest.mark.parametrize("spec, expected", [
+        (4096, ShardLimit(4096, 'bytes')),
+        ("1000", ShardLimit(1000, 'bytes')),
+        ("500KB", ShardLimit(500 * 1024, 'bytes')),
+        ("2mb", ShardLimit(2 * 1024 * 1024, 'bytes')),
+        ("1.5M", ShardLimit(int(1.5 * 1024 * 1024), 'bytes')),
+        ("100k tokens", ShardLimit(100_000, 'tokens')),
+        ("32000t", ShardLimit(32_000, 'tokens')),
+    ])
+    def test_valid_specs(self, spec, expected):
+        assert parse_shard_size(spec) == expected
+
+    @pytest.mark.parametrize("spec", ["", "big", "0", "-5MB", "10 GB", True])
+    def test_invalid_specs(self, spec):
+        with pytest.raises(ValueError, match="Invalid shard_size"):
+            parse_shard_size(spec)
+
+
+class TestPartPaths:
+    """Test part file naming."""
+
+    def test_part_path(self):
+        assert part_path(Path("out/llm-context.md"), 3) == Path("out/llm-context.part-003.md")
+
+    def test_stale_parts(self, tmp_path):
+        """Test that only higher-numbered parts of the same output are stale."""
+        output = tmp_path / "llm-context.md"
+        for name in ["llm-context.part-001.md", "llm-context.part-002.md",
+                     "llm-context.part-003.md", "other.part-004.md"]:
+            (tmp_path / name).write_text("x")
+
+        assert [p.name for p in stale_parts(output, 1)] == ["llm-context.part-002.md", "llm-context.part-003.md"]
+        assert stale_parts(output, 3) == []
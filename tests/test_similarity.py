@@ -0,0 +1,71 @@
+from llmd.similarity import (
+    BodyCache, NearDuplicateIndex, SIGNATURE_SIZE, lsh_shape, minhash_signature, similarity, unified_diff
+)
+
+
+def locale(greeting: str, count: int = 200) -> bytes:
+    return b"".join(f'msg_{i} = "{greeting} {i}"\n'.encode() for i in range(count))
+
+
+class TestMinHash:
+    """Test MinHash signatures."""
+
+    def test_signature_size(self):
+        assert len(minhash_signature(locale("hello"))) == 8 * SIGNATURE_SIZE
+
+    def test_blank_text_has_no_signature(self):
+        assert minhash_signature(b"\n  \n\n") is None
+
+    def test_similar_texts_score_high(self):
+        """Test that a small edit keeps the estimate close to 1."""
+        original = locale("hello")
+        edited = original.replace(b'"hello 5"', b'"bonjour 5"')
+        assert similarity(minhash_signature(original), minhash_signature(edited)) > 0.9
+
+    def test_different_texts_score_low(self):
+        assert similarity(minhash_signature(locale("hello")), minhash_signature(locale("bye"))) < 0.2
+
+    def test_whitespace_changes_are_ignored(self):
+        """Test that reindented copies have the same signature."""
+        original = locale("hello")
+        indented = b"".join(b"    " + line for line in original.splitlines(keepends=True))
+        assert minhash_signature(original) == minhash_signature(indented)
+
+
+class TestNearDuplicateIndex:
+    """Test LSH lookups."""
+
+    def test_lsh_shape_threshold(self):
+        """Test that the band collision threshold stays below the requested one."""
+        for threshold in (0.5, 0.8, 0.95):
+            bands, rows = lsh_shape(SIGNATURE_SIZE, threshold)
+            assert bands * rows <= SIGNATURE_SIZE
+            assert (1 / bands) ** (1 / rows) <= threshold
+
+    def test_match_finds_first_similar_file(self):
+        index = NearDuplicateIndex(0.8)
+        index.add("en.py", minhash_signature(locale("hello")))
+        index.add("other.py", minhash_signature(locale("bye")))
+
+        edited = locale("hello").replace(b'"hello 7"', b'"hallo 7"')
+        name, score = index.match(minhash_signature(edited))
+        assert name == "en.py" and score >= 0.8
+        assert index.match(minhash_signature(locale("ciao"))) is None
+
+
+class TestHelpers:
+    """Test diffs and the body cache."""
+
+    def test_unified_diff(self):
+        diff = unified_diff(b"a\nb\nc\n", b"a\nB\nc\n", "x.py", "y.py").decode()
+        assert diff.splitlines() == ["--- a/x.py", "+++ b/y.py", "@@ -1,3 +1,3 @@", " a", "-b", "+B", " c"]
+        assert unified_diff(b"same\n", b"same\n", "x", "y") == b""
+
+    def test_body_cache_evicts_least_recent(self):
+        cache = BodyCache(10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")
+        cache.put("c", b"12345")
+        assert cache.get("a") == b"12345"
+        assert cache.get("b") is None
@@ -0,0 +1,125 @@
+import base64
+import pytest
+from pathlib import Path
+from llmd.tokenizer import (
+    BPETokenizer, HeuristicTokenizer, TokenCache, content_digest, get_tokenizer
+)
+
+
+def write_vocab(path: Path, merges) -> Path:
+    """Write a tiktoken-format vocabulary: every single byte plus merges."""
+    tokens = [bytes([b]) for b in range(256)] + [m.encode('utf-8') for m in merges]
+    path.write_text(''.join(f"{base64.b64encode(token).decode()} {rank}\n"
+                            for rank, token in enumerate(tokens)))
+    return path
+
+
+class TestHeuristicTokenizer:
+    """Test the byte-level token estimate."""
+
+    def test_empty_input(self):
+        """Test that nothing counts as zero tokens."""
+        assert HeuristicTokenizer().count(b"") == 0
+
+    def test_words_and_punctuation(self):
+        """Test that long words split into pieces and punctuation counts separately."""
+        tokenizer = HeuristicTokenizer()
+        assert tokenizer.count(b"def") == 1
+        assert tokenizer.count(b"function") == 2
+        assert tokenizer.count(b"f(x);") == 5
+
+    def test_count_text_matches_bytes(self):
+        """Test that str and bytes inputs agree, including non-ASCII text."""
+        tokenizer = HeuristicTokenizer()
+        text = "café = 'naïve'\n"
+        assert tokenizer.count_text(text) == tokenizer.count(text.encode('utf-8'))
+
+    def test_scales_with_content(self):
+        """Test that repeated content counts proportionally."""
+        tokenizer = HeuristicTokenizer()
+        line = b"    return value + 1\n"
+        assert tokenizer.count(line * 10) == tokenizer.count(line) * 10
+
+
+class TestBPETokenizer:
+    """Test exact counts from a local BPE vocabulary."""
+
+    def test_merges_follow_rank_order(self, tmp_path):
+        """Test that pieces merge down to vocabulary tokens."""
+        vocab = write_vocab(tmp_path / "tiny.tiktoken", ["he", "ll", "hell", "hello", " w", " wor", " world"])
+        tokenizer = BPETokenizer(vocab)
+
+        assert tokenizer.count(b"hello") == 1
+        assert tokenizer.count(b"hello world") == 2
+        assert tokenizer.count(b"help") == 3
+
+    def test_only_single_bytes(self, tmp_path):
+        """Test that without merges every byte is a token."""
+        tokenizer = BPETokenizer(write_vocab(tmp_path / "bytes.tiktoken", []))
+        assert tokenizer.count(b"abc") == 3
+        assert tokenizer.count("é".encode('utf-8')) == 2
+
+    def test_pretokenizer_keeps_every_character(self):
+        """Test that pre-tokenizing loses nothing, underscores included."""
+        text = "def __init__(self, foo_bar):\n    return my_var_1  # _private\r\n"
+        pieces = BPETokenizer._PRETOKENIZE.findall(text)
+        assert ''.join(pieces) == text
+        assert ' __' in pieces and '_bar' in pieces
+
+    def test_underscores_are_counted(self, tmp_path):
+        """Test that underscores in names are counted."""
+        tokenizer = BPETokenizer(write_vocab(tmp_path / "bytes.tiktoken", []))
+        assert tokenizer.count(b"foo_bar") == 7
+
+    def test_name_depends_on_vocabulary(self, tmp_path):
+        """Test that different vocabularies do not share cache entries."""
+        first = BPETokenizer(write_vocab(tmp_path / "a.tiktoken", ["ab"]))
+        second = BPETokenizer(write_vocab(tmp_path / "b.tiktoken", ["cd"]))
+        assert first.name != second.name
+        assert first.label == "a.tiktoken"
+
+    def test_invalid_vocabulary(self, tmp_path):
+        """Test that malformed vocabulary lines are reported."""
+        vocab = tmp_path / "broken.tiktoken"
+        vocab.write_text("not-a-valid-line\n")
+        with pytest.raises(ValueError, match="line 1"):
+            BPETokenizer(vocab)
+
+
+class TestTokenCache:
+    """Test token counts cached by content hash."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that lookups are counted."""
+        cache = TokenCache()
+        tokenizer = HeuristicTokenizer()
+        digest = content_digest(b"print('x')")
+
+        assert cache.get(tokenizer, digest) is None
+        cache.put(tokenizer, digest, 7)
+        assert cache.get(tokenizer, digest) == 7
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_entries_are_per_tokenizer(self, tmp_path):
+        """Test that a count from one tokenizer is not returned for another."""
+        cache = TokenCache()
+        digest = content_digest(b"abc")
+        cache.put(HeuristicTokenizer(), digest, 1)
+        bpe = BPETokenizer(write_vocab(tmp_path / "v.tiktoken", []))
+        assert cache.get(bpe, digest) is None
+
+
+class TestGetTokenizer:
+    """Test tokenizer specs."""
+
+    def test_heuristic(self):
+        assert isinstance(get_tokenizer("heuristic"), HeuristicTokenizer)
+
+    def test_vocabulary_path_with_prefix(self, tmp_path):
+        vocab = write_vocab(tmp_path / "v.tiktoken", [])
+        assert isinstance(get_tokenizer(f"bpe:{vocab}"), BPETokenizer)
+        assert isinstance(get_tokenizer(str(vocab)), BPETokenizer)
+
+    def test_unknown_spec(self):
+        with pytest.raises(ValueError, match="Invalid tokenizer"):
+            get_tokenizer("gpt-whatever")
@@ -0,0 +1,119 @@
+import pytest
+from llmd.tokenizer import content_digest
+from llmd.transforms import CpuStage, TransformJob, TransformResult, TransformSettings, Transformer
+
+
+@pytest.fixture
+def transformer():
+    return Transformer(TransformSettings(tokenizer='heuristic', hash_bodies=True, chunk_size=64))
+
+
+class TestTransformer:
+    """Test the CPU-bound rendering steps."""
+
+    def test_unchanged_body_is_not_returned(self, transformer):
+        """Test that a body needing no changes is only hashed and counted."""
+        result = transformer.transform(b"print('hi')\n")
+
+        assert result.body is None
+        assert result.content_hash == result.source_hash == content_digest(b"print('hi')\n")
+        assert result.tokens == transformer.tokenizer.count(b"print('hi')\n")
+
+    def test_newlines_are_normalized(self, transformer):
+        """Test that CRLF bodies are returned translated, hashed before and after."""
+        result = transformer.transform(b"a\r\nb\r")
+
+        assert result.body == b"a\nb\n"
+        assert result.content_hash == content_digest(b"a\nb\n")
+        assert result.source_hash == content_digest(b"a\r\nb\r")
+
+    def test_invalid_utf8_is_binary(self, transformer):
+        """Test that non-UTF-8 contents are flagged, keeping the source hash."""
+        result = transformer.transform(b"\xff\xfe")
+
+        assert result.binary
+        assert result.source_hash == content_digest(b"\xff\xfe")
+        assert result.tokens is None
+
+    def test_large_file_is_checked_by_path(self, transformer, tmp_path):
+        """Test that a verbatim file is validated and counted in chunks."""
+        path = tmp_path / "large.txt"
+        path.write_text("alpha beta\n" * 100)
+
+        result = transformer.transform_file(path)
+
+        assert result.body is None
+        assert result.content_hash == content_digest(path.read_bytes())
+        assert result.tokens == transformer.tokenizer.count(path.read_bytes())
+        assert result.newlines == 100
+
+    def test_large_file_with_crlf_is_read(self, transformer, tmp_path):
+        """Test that a file needing normalization comes back as a body."""
+        path = tmp_path / "windows.txt"
+        path.write_bytes(b"line\r\n" * 50)
+
+        assert transformer.transform_file(path).body == b"line\n" * 50
+
+    def test_read_errors_become_results(self, transformer, tmp_path):
+        """Test that a failing job does not fail the batch."""
+        results = transformer.run([TransformJob(b"ok\n"), TransformJob(tmp_path / "missing.txt")])
+
+        assert results[0].error is None
+        assert "missing.txt" in results[1].error
+
+    def test_compact_records_savings(self):
+        """Test that compaction reports the bytes and tokens it removed."""
+        transformer = Transformer(TransformSettings(tokenizer='heuristic', compact=True))
+        result = transformer.transform(b"# header comment\r\nx = 1  # note\r\n", 'python')
+
+        assert result.body == b"x = 1\n"
+        assert result.compacted_bytes == len(b"# header comment\nx = 1  # note\n") - len(b"x = 1\n")
+        assert result.compacted_tokens > 0
+
+    def test_compact_does_not_touch_notices(self):
+        """Test that measured notices are emitted as is."""
+        transformer = Transformer(TransformSettings(compact=True))
+
+        assert transformer.measure(b"[Binary file - content not displayed]  ").body is None
+
+    def test_redaction_keeps_source_hash(self):
+        """Test that redacted bodies are counted per signature and keep the hash of the file."""
+        transformer = Transformer(TransformSettings(hash_bodies=True, redact=True))
+        source = b'password = "hunter2hunter2"\n'
+
+        result = transformer.transform(source, 'python')
+
+        assert result.body == b'password = "[REDACTED:password_assignment]"\n'
+        assert result.redactions == {'password_assignment': 1}
+        assert result.source_hash == content_digest(source)
+        assert transformer.transform(b"x = 1\n").redactions is None
+
+    def test_large_file_with_secret_is_read(self, tmp_path):
+        """Test that a large file is only read whole when it contains a secret."""
+        transformer = Transformer(TransformSettings(chunk_size=64, redact=True))
+        clean, secret = tmp_path / "clean.txt", tmp_path / "secret.txt"
+        clean.write_text("alpha beta\n" * 100)
+        secret.write_text("alpha beta\n" * 50 + 'api_key = "abcdefgh12"\n')
+
+        assert transformer.transform_file(clean).body is None
+        assert transformer.transform_file(secret).body.endswith(b'api_key = "[REDACTED:password_assignment]"\n')
+
+
+class TestCpuStage:
+    """Test running transforms on worker processes."""
+
+    def test_process_pool_matches_inline(self, tmp_path):
+        """Test that worker processes produce the same results as the calling thread."""
+        settings = TransformSettings(tokenizer='heuristic', hash_bodies=True, chunk_size=64, compact=True)
+        path = tmp_path / "large.txt"
+        path.write_text("gamma delta\n" * 100)
+        jobs = [TransformJob(b"x = 1  # one\n", 'python')] + [TransformJob(data) for data in (b"a\r\nb\n", b"\xff", path)]
+
+        stage = CpuStage(Transformer(settings), workers=2)
+        try:
+            pooled = stage.run(jobs)
+        finally:
+            stage.close()
+
+        assert pooled == Transformer(settings).run(jobs)
+        assert all(isinstance(result, TransformResult) for result in pooled)
@@ -0,0 +1,80 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+import pytest
+
+from llmd.vcs import changed_files, directory_siblings, last_commit_times, modified_files
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason="git is not installed")
+
+
+def git(repo: Path, *args: str, date: Optional[str] = None) -> None:
+    env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date) if date else None
+    subprocess.run(['git', '-C', str(repo), '-c', 'user.name=Test', '-c', 'user.email=test@example.com', *args],
+                   check=True, capture_output=True, env=env)
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    git(tmp_path, 'init', '-q')
+    (tmp_path / "old.py").write_text("old\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "new file.py").write_text("new\n")
+    git(tmp_path, 'add', 'old.py')
+    git(tmp_path, 'commit', '-qm', 'old', date="2024-01-01T00:00:00+00:00")
+    git(tmp_path, 'add', '.')
+    git(tmp_path, 'commit', '-qm', 'new', date="2024-06-01T00:00:00+00:00")
+    return tmp_path
+
+
+class TestHistory:
+    """Test reading change times and uncommitted changes from git."""
+
+    def test_last_commit_times(self, repo: Path):
+        times = last_commit_times(repo, ["old.py", "sub/new file.py", "untracked.py"])
+
+        assert times == {"old.py": 1704067200, "sub/new file.py": 1717200000}
+
+    def test_paths_are_relative_to_a_subdirectory(self, repo: Path):
+        assert last_commit_times(repo / "sub", ["new file.py"]) == {"new file.py": 1717200000}
+
+    def test_modified_files(self, repo: Path):
+        (repo / "old.py").write_text("changed\n")
+
+        assert modified_files(repo) == {"old.py"}
+
+    def test_outside_git(self, tmp_path: Path):
+        assert last_commit_times(tmp_path, ["a.py"]) == {}
+        assert modified_files(tmp_path) == set()
+
+
+class TestChangedFiles:
+    """Test listing the files changed since a ref."""
+
+    def test_changes_since_ref(self, repo: Path):
+        git(repo, 'checkout', '-qb', 'feature')
+        (repo / "sub" / "added.py").write_text("added\n")
+        git(repo, 'add', '.')
+        git(repo, 'commit', '-qm', 'feature')
+        (repo / "old.py").write_text("changed\n")
+        (repo / "untracked.py").write_text("new\n")
+        (repo / ".gitignore").write_text("*.log\n")
+        (repo / "debug.log").write_text("ignored\n")
+        git(repo, 'rm', '-q', 'sub/new file.py')
+
+        assert changed_files(repo, 'HEAD~1') == [".gitignore", "old.py", "sub/added.py", "untracked.py"]
+        assert changed_files(repo) == [".gitignore", "old.py", "untracked.py"]
+
+    def test_unknown_ref(self, repo: Path):
+        with pytest.raises(ValueError, match="Invalid since 'nope'"):
+            changed_files(repo, 'nope')
+
+    def test_siblings(self, repo: Path):
+        (repo / "sub" / "deeper").mkdir()
+        (repo / "sub" / "deeper" / "x.py").write_text("x\n")
+        (repo / "sub" / "other.py").write_text("other\n")
+
+        assert directory_siblings(repo, ["sub/new file.py"]) == ["sub/new file.py", "sub/other.py"]
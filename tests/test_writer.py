@@ -0,0 +1,81 @@
+import errno
+import os
+import tempfile
+import shutil
+from pathlib import Path
+import pytest
+from llmd import writer as writer_module
+from llmd.writer import AtomicFileWriter, FileSpan
+
+
+class TestAtomicFileWriter:
+    """Test the atomic output writer and its splice support."""
+    
+    @pytest.fixture
+    def workdir(self):
+        """Create a temporary working directory."""
+        temp_dir = tempfile.mkdtemp()
+        yield Path(temp_dir)
+        shutil.rmtree(temp_dir)
+    
+    @pytest.fixture
+    def source(self, workdir):
+        """Create a source file to splice from."""
+        path = workdir / "source.txt"
+        path.write_bytes(b"0123456789" * 1000)
+        return path
+    
+    def test_splice_interleaves_with_buffered_writes(self, workdir, source):
+        """Test that spliced ranges land between the surrounding literal bytes."""
+        output = workdir / "out.md"
+        
+        with AtomicFileWriter(output) as w:
+            w.write(b"head:")
+            w.splice(FileSpan(source, 5, 10))
+            w.write(b":mid:")
+            w.write_parts([b"<", FileSpan(source, 0, 3), b">"])
+        
+        assert output.read_bytes() == b"head:5678901234:mid:<012>"
+        assert w.bytes_written == len(output.read_bytes())
+    
+    def test_splice_falls_back_to_chunked_copy(self, workdir, source, monkeypatch):
+        """Test the portable copy loop when kernel copy primitives are unavailable."""
+        def unsupported(*args, **kwargs):
+            raise OSError(errno.ENOSYS, "not supported")
+        
+        monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+        monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+        monkeypatch.setattr(writer_module, "_COPY_CHUNK_SIZE", 7)
+        output = workdir / "out.md"
+        
+        with AtomicFileWriter(output) as w:
+            w.write(b"[")
+            w.splice(FileSpan(source, 100, 95))
+            w.write(b"]")
+        
+        assert output.read_bytes() == b"[" + source.read_bytes()[100:195] + b"]"
+    
+    def test_splice_stops_at_end_of_shrunk_file(self, workdir, source):
+        """Test that a span longer than the file copies what is there."""
+        output = workdir / "out.md"
+        
+        with AtomicFileWriter(output) as w:
+            w.splice(FileSpan(source, 9995, 100))
+        
+        assert output.read_bytes() == b"56789"
+        assert w.bytes_written == 5
+    
+    def test_abort_removes_temporary_file(self, workdir):
+        """Test that an aborted write leaves no trace."""
+        output = workdir / "out.md"
+        
+        with pytest.raises(RuntimeError):
+            with AtomicFileWriter(output) as w:
+                w.write(b"partial")
+                raise RuntimeError("stop")
+        
+        assert list(workdir.iterdir()) == []
+    
+    def test_file_span_read(self, source):
+        """Test reading a span into memory."""
+        assert FileSpan(source, 10, 4).read() == b"0123"